@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+LSL Benchmark - Timing harness for the LSL validator
+Created for the Peril Dice Game project
+
+Usage:
+    python3 lsl_benchmark.py micro [dir]                   # Per-line rule matching cost, legacy vs combined
+    python3 lsl_benchmark.py generate OUT --files 500      # Write a synthetic LSL corpus to OUT
+    python3 lsl_benchmark.py run .                         # Benchmark every check and the CLI on the repo
+    python3 lsl_benchmark.py run . --synthetic small,large # ... plus generated corpora
+    python3 lsl_benchmark.py run . --save-baseline FILE    # Record results as the baseline
+    python3 lsl_benchmark.py run . --baseline FILE         # Fail if slower than the baseline
+"""
+
+import os
+import sys
+import re
+import glob
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lsl_validator import (
+    COMMENT, FORBIDDEN, FORBIDDEN_KEYWORDS, IDENT, IDENT_CLASS, LSL_TYPES, PREPROC, TYPE,
+    LexedSource, LSLValidator, file_stats, tokenize, validate_path,
+)
+
+VALIDATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lsl_validator.py')
+
+# Synthetic corpus presets: name -> (files, average lines per file)
+SYNTHETIC_PRESETS = {
+    'small': (10, 400),
+    'medium': (200, 1500),
+    'large': (2000, 1500),
+    'many': (10000, 300),
+    'giant': (1, 100000),
+}
+
+# Metrics compared against the baseline; True when higher is better
+BASELINE_METRICS = {
+    'lines_per_sec': True,
+    'cli_lines_per_sec': True,
+    'peak_rss_kb': False,
+    'latency_p95_ms': False,
+}
+
+DEFAULT_THRESHOLD = 0.2
+
+
+def legacy_line_scan(lines):
+    """Per-line matching as the validator did it before the combined rules.
+
+    Every line is stripped of strings and comments with re.sub, then runs
+    two f-string regexes per LSL type and one regex per forbidden keyword.
+    Returns the set of ('declaration', line, name) and ('forbidden', line,
+    keyword) findings.
+    """
+    findings = set()
+    in_comment = False
+    in_directive = False
+    for line_num, line in enumerate(lines, 1):
+        # Preprocessor lines, and those continued with a backslash, are not LSL code
+        if in_directive or line.lstrip().startswith('#'):
+            in_directive = line.rstrip().endswith('\\')
+            continue
+        line = re.sub(r'"(?:[^"\\]|\\.)*"', '""', line)
+        if in_comment:
+            if '*/' not in line:
+                continue
+            line = line[line.index('*/') + 2:]
+            in_comment = False
+        line = re.sub(r'/\*.*?\*/', ' ', line)
+        if '/*' in line:
+            line = line[:line.index('/*')]
+            in_comment = True
+        if '//' in line:
+            line = line[:line.index('//')]
+        for lsl_type in LSL_TYPES:
+            for name in re.findall(rf'for\s*\(\s*{lsl_type}\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*=', line):
+                findings.add(('declaration', line_num, name))
+            for name in re.findall(rf'\b{lsl_type}\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*[;=]', line):
+                findings.add(('declaration', line_num, name))
+        for keyword in FORBIDDEN_KEYWORDS:
+            if re.search(r'\b' + re.escape(keyword) + r'\b', line):
+                findings.add(('forbidden', line_num, keyword))
+    return findings
+
+
+def combined_scan(content):
+    """The same findings from one pass of the precompiled master token pattern
+    plus one lookup per identifier"""
+    findings = set()
+    get_class = IDENT_CLASS.get
+    tokens = [token for token in tokenize(content) if token.kind not in (COMMENT, PREPROC)]
+    last = len(tokens) - 1
+    for index, token in enumerate(tokens):
+        if token.kind != IDENT:
+            continue
+        kind = get_class(token.value)
+        if kind is FORBIDDEN:
+            findings.add(('forbidden', token.line, token.value))
+        elif kind is TYPE and index + 2 <= last and tokens[index + 1].kind == IDENT \
+                and tokens[index + 2].value in ('=', ';') and tokens[index + 1].line == token.line:
+            findings.add(('declaration', token.line, tokens[index + 1].value))
+    return findings
+
+
+def _best_of(func, arg, repeat):
+    """Best wall time of `repeat` calls, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run_micro(target, repeat=5):
+    """Compare per-line cost of legacy and combined matching over a directory.
+
+    Both sides must report the same findings for every file, or the
+    timings are not comparable and the run fails.
+    """
+    lsl_files = sorted(glob.glob(os.path.join(target, "*.lsl")))
+    if not lsl_files:
+        print(f"❌ No .lsl files found in {target}")
+        return 1
+
+    print(f"⏱️  Rule matching microbenchmark: {len(lsl_files)} files, best of {repeat}")
+    print("=" * 80)
+    print(f"{'File':<40}{'Lines':>7}{'Findings':>9}{'Legacy µs/line':>15}{'Combined µs/line':>18}")
+
+    mismatched = []
+    total_lines = 0
+    total_legacy = 0.0
+    total_combined = 0.0
+    for lsl_file in lsl_files:
+        with open(lsl_file, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        lines = content.split('\n')
+        findings = legacy_line_scan(lines)
+        if combined_scan(content) != findings:
+            mismatched.append(os.path.basename(lsl_file))
+
+        legacy = _best_of(legacy_line_scan, lines, repeat)
+        combined = _best_of(combined_scan, content, repeat)
+        total_lines += len(lines)
+        total_legacy += legacy
+        total_combined += combined
+
+        print(f"{os.path.basename(lsl_file):<40}{len(lines):>7}{len(findings):>9}"
+              f"{legacy / len(lines) * 1e6:>15.2f}{combined / len(lines) * 1e6:>18.2f}")
+
+    print("-" * 80)
+    print(f"{'TOTAL':<40}{total_lines:>7}{'':>9}"
+          f"{total_legacy / total_lines * 1e6:>15.2f}{total_combined / total_lines * 1e6:>18.2f}")
+    if mismatched:
+        print(f"\n❌ Legacy and combined findings differ in {', '.join(mismatched)} - timings are not comparable")
+        return 1
+    print(f"\n📉 Per-line cost: {total_legacy / total_combined:.1f}x lower with combined matching "
+          f"for the same findings")
+    return 0
+
+
+class CorpusGenerator:
+    """Deterministic synthetic LSL scripts built from the constructs our real scripts use.
+
+    Every script includes a shared constants header, uses #define / #if
+    DEBUG_LOGS, and mixes nested events and states, long link_message
+    dispatch chains, llMessageLinked fan-out, loops and large list literals.
+    """
+    HEADER_NAME = 'Bench_Constants.lsl'
+
+    def __init__(self, seed=1, messages=60):
+        self.rng = random.Random(seed)
+        self.messages = [f"MSG_BENCH_{index}" for index in range(messages)]
+
+    def header(self):
+        lines = ["// Synthetic benchmark constants (generated)",
+                 "#define DEBUG_LOGS 0",
+                 "#if DEBUG_LOGS",
+                 "#define dbg(msg) llOwnerSay(msg)",
+                 "#else",
+                 "#define dbg(msg) ;",
+                 "#endif",
+                 "#define SEND(num, str) llMessageLinked(LINK_SET, num, str, NULL_KEY)",
+                 "integer LINK_CONTROLLER = 1;",
+                 ""]
+        for index, name in enumerate(self.messages):
+            lines.append(f"#define {name} {5000 + index}")
+        return '\n'.join(lines) + '\n'
+
+    def script(self, number, target_lines):
+        """Source of one script of roughly `target_lines` lines"""
+        rng = self.rng
+        out = [f"// Synthetic benchmark script {number} (generated)",
+               f'#include "{self.HEADER_NAME}"',
+               f"#define LOCAL_CHANNEL_{number} (-77000 - {number})",
+               "",
+               "integer gCounter = 0;",
+               "integer gListenHandle;",
+               "string gName = \"bench\";",
+               "list gPlayers = [];"]
+        out.extend(self._list_literal("gTable", rng.randint(20, 120)))
+        out.append("")
+
+        # Helper functions fill the bulk of the file
+        # (the dispatch chain takes about 7 lines per 3 messages, the states ~40 more)
+        body_budget = target_lines - len(out) - len(self.messages) * 7 // 3 - 40
+        functions = []
+        while body_budget > 0:
+            name = f"helper{number}_{len(functions)}"
+            block = self._function(name)
+            functions.append(name)
+            out.extend(block)
+            body_budget -= len(block)
+
+        out.extend(self._default_state(number, functions))
+        out.extend(self._running_state(number))
+        return '\n'.join(out) + '\n'
+
+    def _list_literal(self, name, count):
+        lines = [f"list {name} = ["]
+        for index in range(0, count, 4):
+            items = ', '.join(f'"item{index + k}", {self.rng.randint(0, 999)}'
+                              for k in range(min(4, count - index)))
+            comma = ',' if index + 4 < count else ''
+            lines.append(f"    {items}{comma}")
+        lines.append("];")
+        return lines
+
+    def _function(self, name):
+        rng = self.rng
+        message = rng.choice(self.messages)
+        lines = [f"integer {name}(list data, string filter) {{",
+                 "    integer count = 0;",
+                 "    integer i;",
+                 "    for (i = 0; i < llGetListLength(data); i += 2) {",
+                 "        string entry = llList2String(data, i);",
+                 "        if (entry == filter) {",
+                 "            count++;",
+                 "        } else if (llSubStringIndex(entry, filter) != -1) {",
+                 "            integer j = 0;",
+                 "            while (j < 3) {",
+                 "                count += llList2Integer(data, i + 1);",
+                 "                j++;",
+                 "            }",
+                 "        }",
+                 "    }"]
+        if rng.random() < 0.5:
+            lines.extend(["    list parts = llParseString2List(filter, [\"|\"], []);",
+                          "    if (llGetListLength(parts) > 1) {",
+                          f"        SEND({message}, llDumpList2String(parts, \"~\"));",
+                          "    }"])
+        if rng.random() < 0.3:
+            lines.append('    dbg("helper done: " + (string)count);')
+        lines.extend(["    return count;", "}", ""])
+        return lines
+
+    def _default_state(self, number, functions):
+        out = ["default {",
+               "    state_entry() {",
+               f"        gListenHandle = llListen(LOCAL_CHANNEL_{number}, \"\", NULL_KEY, \"\");",
+               "        llSetTimerEvent(5.0);",
+               "    }",
+               "",
+               "    link_message(integer sender, integer num, string str, key id) {"]
+        # Long if/else dispatch chain over every message constant
+        for index, message in enumerate(self.messages):
+            keyword = "if" if index == 0 else "} else if"
+            out.append(f"        {keyword} (num == {message}) {{")
+            if functions and index % 3 == 0:
+                out.append(f"            gCounter += {self.rng.choice(functions)}(gTable, str);")
+            elif index % 3 == 1:
+                out.append("            list parts = llParseStringKeepNulls(str, [\"~\"], []);")
+                out.append("            gPlayers += [llList2String(parts, 0)];")
+            else:
+                reply = self.messages[(index + 1) % len(self.messages)]
+                out.append(f"            SEND({reply}, str + \"|\" + (string)gCounter);")
+        out.extend(["        }",
+                    "    }",
+                    "",
+                    "    listen(integer channel, string name, key id, string message) {",
+                    "        if (message == \"start\") {",
+                    "            state running;",
+                    "        }",
+                    "    }",
+                    "",
+                    "    timer() {",
+                    "        gCounter++;",
+                    "        dbg(\"tick\");",
+                    "    }",
+                    "}",
+                    ""])
+        return out
+
+    def _running_state(self, number):
+        message = self.rng.choice(self.messages)
+        return ["state running {",
+                "    state_entry() {",
+                f"        SEND({message}, gName);",
+                "    }",
+                "",
+                "    touch_start(integer total) {",
+                "        integer i;",
+                "        for (i = 0; i < total; i++) {",
+                "            key toucher = llDetectedKey(i);",
+                "            if (llListFindList(gPlayers, [toucher]) == -1) {",
+                "                gPlayers += [toucher];",
+                "            }",
+                "        }",
+                "        state default;",
+                "    }",
+                "}"]
+
+    def write(self, directory, files, lines):
+        """Write `files` scripts averaging `lines` lines plus the header; returns total lines"""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, self.HEADER_NAME), 'w', encoding='utf-8') as f:
+            f.write(self.header())
+        total = 0
+        for number in range(files):
+            # Vary sizes between half and one and a half times the average
+            size = lines if files == 1 else int(lines * self.rng.uniform(0.5, 1.5))
+            content = self.script(number, size)
+            total += content.count('\n')
+            with open(os.path.join(directory, f"Bench_Script_{number:05d}.lsl"), 'w', encoding='utf-8') as f:
+                f.write(content)
+        return total
+
+
+def run_generate(args):
+    """Write a synthetic corpus to disk"""
+    generator = CorpusGenerator(args.seed)
+    start = time.perf_counter()
+    total = generator.write(args.out, args.files, args.lines)
+    print(f"🧪 Generated {args.files} scripts ({total:,} lines) in {args.out} "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def measure_rules(lsl_files):
+    """Seconds spent lexing/preprocessing and in each rule over all files"""
+    validator = LSLValidator()
+    timings = {'lex': 0.0}
+    for rule in validator.rules:
+        timings[rule.__name__.lstrip('_')] = 0.0
+    for lsl_file in lsl_files:
+        with open(lsl_file, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        validator.errors, validator.warnings, validator.info = [], [], []
+        validator.stats = file_stats(content)
+        start = time.perf_counter()
+        source = LexedSource(content, validator.preprocessor, lsl_file)
+        timings['lex'] += time.perf_counter() - start
+        for rule in validator.rules:
+            start = time.perf_counter()
+            rule(source, lsl_file)
+            timings[rule.__name__.lstrip('_')] += time.perf_counter() - start
+    return timings
+
+
+def measure_latency(lsl_files):
+    """Per-file wall time in milliseconds of an uncached validate_path"""
+    latencies = []
+    for lsl_file in lsl_files:
+        start = time.perf_counter()
+        validate_path(lsl_file)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def measure_cli(target, jobs=1):
+    """(seconds, peak RSS in KB, exit code) of one uncached CLI run over `target`"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, VALIDATOR_PATH, '--no-cache', '-j', str(jobs), target],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # wait4 gives this child's own rusage, unlike RUSAGE_CHILDREN
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return time.perf_counter() - start, usage.ru_maxrss, process.returncode
+
+
+def benchmark_corpus(name, target, jobs=1):
+    """All measurements for one directory of scripts"""
+    lsl_files = sorted(glob.glob(os.path.join(target, "*.lsl")))
+    total_lines = 0
+    for lsl_file in lsl_files:
+        with open(lsl_file, 'rb') as f:
+            total_lines += f.read().count(b'\n') + 1
+
+    print(f"\n📁 {name}: {len(lsl_files)} files, {total_lines:,} lines")
+    rules = measure_rules(lsl_files)
+    latencies = measure_latency(lsl_files)
+    cli_seconds, peak_rss_kb, _ = measure_cli(target, jobs)
+
+    validate_seconds = sum(latencies) / 1000
+    result = {
+        'files': len(lsl_files),
+        'lines': total_lines,
+        'lines_per_sec': total_lines / validate_seconds if validate_seconds else 0.0,
+        'cli_seconds': cli_seconds,
+        'cli_lines_per_sec': total_lines / cli_seconds if cli_seconds else 0.0,
+        'peak_rss_kb': peak_rss_kb,
+        'latency_p50_ms': _percentile(latencies, 0.5),
+        'latency_p95_ms': _percentile(latencies, 0.95),
+        'latency_max_ms': max(latencies, default=0.0),
+        'rules': rules,
+    }
+
+    rule_total = sum(rules.values()) or 1.0
+    print(f"   {'Check':<24}{'Seconds':>10}{'Lines/sec':>14}{'Share':>8}")
+    for rule, seconds in rules.items():
+        rate = total_lines / seconds if seconds else 0.0
+        print(f"   {rule:<24}{seconds:>10.3f}{rate:>14,.0f}{seconds / rule_total:>8.0%}")
+    print(f"   In-process: {result['lines_per_sec']:,.0f} lines/sec, per-file latency "
+          f"p50 {result['latency_p50_ms']:.1f} ms, p95 {result['latency_p95_ms']:.1f} ms, "
+          f"max {result['latency_max_ms']:.1f} ms")
+    print(f"   CLI (-j {jobs}): {cli_seconds:.2f}s, {result['cli_lines_per_sec']:,.0f} lines/sec, "
+          f"peak RSS {peak_rss_kb / 1024:.1f} MB")
+    return result
+
+
+def compare_baseline(results, baseline, threshold):
+    """Print metric changes against `baseline`; returns the regressions found"""
+    regressions = []
+    print(f"\n📏 Baseline comparison (threshold {threshold:.0%})")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"   {name}: not in baseline")
+            continue
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            old, new = previous.get(metric), result[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            marker = "❌" if worse > threshold else "✅"
+            print(f"   {marker} {name:<22}{metric:<20}{old:>14,.1f} -> {new:>14,.1f} ({change:+.0%})")
+            if worse > threshold:
+                regressions.append((name, metric))
+    return regressions
+
+
+def run_suite(args):
+    """Benchmark the real scripts and synthetic corpora; returns the exit code"""
+    corpora = []
+    if args.target:
+        if not glob.glob(os.path.join(args.target, "*.lsl")):
+            print(f"❌ No .lsl files found in {args.target}")
+            return 1
+        corpora.append(('repo', args.target))
+
+    presets = [name for name in args.synthetic.split(',') if name] if args.synthetic else []
+    for preset in presets:
+        if preset not in SYNTHETIC_PRESETS:
+            print(f"❌ Unknown synthetic corpus '{preset}' (choose from {', '.join(SYNTHETIC_PRESETS)})")
+            return 1
+
+    print(f"⏱️  LSL validator benchmark suite")
+    print("=" * 80)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='lsl_bench_') as scratch:
+        for preset in presets:
+            files, lines = SYNTHETIC_PRESETS[preset]
+            directory = os.path.join(scratch, preset)
+            CorpusGenerator(args.seed).write(directory, files, lines)
+            corpora.append((f"synthetic:{preset}", directory))
+        for name, directory in corpora:
+            results[name] = benchmark_corpus(name, directory, args.jobs)
+
+    status = 0
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"\n❌ Cannot read baseline {args.baseline}: {e}")
+            return 1
+        regressions = compare_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} metric(s) regressed beyond {args.threshold:.0%}")
+            status = 1
+        else:
+            print("\n✅ No regressions against baseline")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline written to {args.save_baseline}")
+    return status
+
+
+def parse_args(argv):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(prog='lsl_benchmark.py',
+                                     description='Timing harness for the LSL validator')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    micro = commands.add_parser('micro', help='per-line rule matching cost, legacy vs combined')
+    micro.add_argument('target', nargs='?', default='.')
+
+    generate = commands.add_parser('generate', help='write a synthetic LSL corpus')
+    generate.add_argument('out', help='output directory')
+    generate.add_argument('--files', type=int, default=100, help='number of scripts (default: 100)')
+    generate.add_argument('--lines', type=int, default=1000,
+                          help='average lines per script (default: 1000)')
+    generate.add_argument('--seed', type=int, default=1)
+
+    run = commands.add_parser('run', help='benchmark every check and the CLI')
+    run.add_argument('target', nargs='?', default='.',
+                     help='directory of real scripts (default: .; empty string to skip)')
+    run.add_argument('--synthetic', default='', metavar='PRESETS',
+                     help=f"comma-separated generated corpora: {', '.join(SYNTHETIC_PRESETS)}")
+    run.add_argument('-j', '--jobs', type=int, default=1, help='worker processes for the CLI run')
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--baseline', metavar='FILE', help='compare against a stored baseline')
+    run.add_argument('--save-baseline', metavar='FILE', help='store these results as a baseline')
+    run.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, metavar='FRACTION',
+                     help=f'allowed slowdown before a metric counts as a regression '
+                          f'(default: {DEFAULT_THRESHOLD})')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.command == 'micro':
+        sys.exit(run_micro(args.target))
+    if args.command == 'generate':
+        sys.exit(run_generate(args))
+    sys.exit(run_suite(args))
+
+if __name__ == "__main__":
+    main()
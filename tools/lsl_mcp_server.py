@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+LSL MCP Server - Resident LSL validator speaking JSON-RPC 2.0 over stdio
+Created for the Peril Dice Game project
+
+Messages are newline-delimited JSON, as in the MCP stdio transport. Parsed
+headers, rule tables and the last result for every open buffer stay warm, so
+revalidating after a keystroke costs one pass over the edited script.
+
+Usage:
+    python3 lsl_mcp_server.py                  # Serve on stdin/stdout
+    python3 lsl_mcp_server.py -I ~/lsl/include # Extra directory for #include lookups
+
+Tools (MCP tools/call) and the equivalent plain JSON-RPC methods:
+    validate_lsl  / lsl/validate   {filename, text?, changes?, version?}
+    close_lsl     / lsl/close      {filename}
+
+`text` replaces the whole buffer; `changes` is a list of edits
+{range: {start: {line, character}, end: {line, character}}, text}
+with 0-based lines and characters counted in code points. With neither,
+the file is read from disk. A newer validate for the same file supersedes
+an older one; `notifications/cancelled` cancels by request id.
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lsl_validator import LSLValidator, diagnostic_record
+
+PROTOCOL_VERSION = '2024-11-05'
+SERVER_INFO = {'name': 'lsl-dev', 'version': '1.0'}
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+REQUEST_CANCELLED = -32800
+
+FILE_SCHEMA = {'type': 'string', 'description': 'Script path; #include is resolved next to it'}
+
+TOOLS = [
+    {'name': 'validate_lsl',
+     'description': 'Validate an LSL script buffer and return its diagnostics',
+     'inputSchema': {
+         'type': 'object',
+         'properties': {
+             'filename': FILE_SCHEMA,
+             'text': {'type': 'string', 'description': 'Full buffer text (replaces the stored buffer)'},
+             'changes': {'type': 'array', 'description': 'Incremental edits applied to the stored buffer',
+                         'items': {'type': 'object'}},
+             'version': {'type': 'integer', 'description': 'Editor buffer version, echoed back'},
+         },
+         'required': ['filename'],
+     }},
+    {'name': 'close_lsl',
+     'description': 'Forget a buffer and its cached result',
+     'inputSchema': {'type': 'object', 'properties': {'filename': FILE_SCHEMA},
+                     'required': ['filename']}},
+]
+
+
+class RequestError(Exception):
+    """Turned into a JSON-RPC error response"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class Cancelled(Exception):
+    """Raised between rules when a validation job has been superseded"""
+
+
+def object_param(value, name):
+    """`value` as a params object; JSON-RPC also allows arrays, which no method here takes"""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise RequestError(INVALID_PARAMS, f"'{name}' must be an object")
+    return value
+
+
+def offset_of(text, line_starts, position):
+    """Character offset of an LSP-style {line, character} position"""
+    line = position.get('line', 0)
+    if line >= len(line_starts):
+        return len(text)
+    start = line_starts[line]
+    end = line_starts[line + 1] - 1 if line + 1 < len(line_starts) else len(text)
+    return min(start + position.get('character', 0), end)
+
+
+def apply_changes(text, changes):
+    """`text` with incremental edits applied in order"""
+    for change in changes:
+        if 'range' not in change:
+            text = change['text']
+            continue
+        line_starts = [0]
+        line_starts.extend(index + 1 for index, char in enumerate(text) if char == '\n')
+        start = offset_of(text, line_starts, change['range']['start'])
+        end = offset_of(text, line_starts, change['range']['end'])
+        text = text[:start] + change['text'] + text[end:]
+    return text
+
+
+class Document:
+    """An open buffer and the last result computed for it"""
+    __slots__ = ('filename', 'text', 'version', 'result', 'result_text', 'header_stamps')
+
+    def __init__(self, filename, text, version=None):
+        self.filename = filename
+        self.text = text
+        self.version = version
+        self.result = None
+        self.result_text = None
+        self.header_stamps = None
+
+
+class Job:
+    """A queued validation request"""
+    __slots__ = ('request_id', 'filename', 'tool', 'cancelled')
+
+    def __init__(self, request_id, filename, tool):
+        self.request_id = request_id
+        self.filename = filename
+        self.tool = tool
+        self.cancelled = False
+
+
+class LSLServer:
+    """Reads requests on one thread and validates on another, newest request first per file"""
+
+    def __init__(self, include_path=(), memory_thresholds=(0.8, 0.9), output=None):
+        self.output = output or sys.stdout
+        self.include_path = tuple(include_path)
+        self.validator = LSLValidator(self.include_path, memory_thresholds)
+        self.last_source = None
+        self._lex = self.validator._lex
+        self.validator._lex = self._capture_source
+        self.validator.rules = [self._cancellable(rule) for rule in self.validator.rules]
+
+        self.documents = {}
+        self.pending = {}          # filename -> queued Job (at most one per file)
+        self.running = None
+        self.jobs_by_id = {}
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.closed = False
+
+    # --- Validation -------------------------------------------------------
+
+    def _capture_source(self, content, filepath):
+        self.last_source = self._lex(content, filepath)
+        return self.last_source
+
+    def _cancellable(self, rule):
+        def checked(source, filepath):
+            if self.running is not None and self.running.cancelled:
+                raise Cancelled()
+            rule(source, filepath)
+        return checked
+
+    def _header_stamps(self):
+        """(path, mtime_ns, size) of every header the last run used; None if any is missing"""
+        preprocessed = self.last_source.preprocessed
+        if any(rule == 'missing-include' for _, rule, _, _ in preprocessed.diagnostics):
+            return None  # An include did not resolve; retry it next time
+        stamps = []
+        for header in preprocessed.headers:
+            for path in sorted(header.paths):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    return None
+                stamps.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(stamps)
+
+    def _warm(self, document, text):
+        """True if the stored result still matches `text` and its headers"""
+        if document.result is None or document.result_text != text:
+            return False
+        if document.header_stamps is None:
+            return False
+        for path, mtime_ns, size in document.header_stamps:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return False
+            if (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+                return False
+        return True
+
+    def validate(self, document):
+        """Diagnostics payload for `document`, reusing the warm result when possible"""
+        # The reader thread may swap in newer text meanwhile; validate a snapshot
+        # and report the version that came with it
+        with self.condition:
+            text, version = document.text, document.version
+        if not self._warm(document, text):
+            validator = self.validator
+            validator.analyze(text, document.filename)
+            document.result = {
+                'filename': document.filename,
+                'errors': len(validator.errors),
+                'warnings': len(validator.warnings),
+                'diagnostics': [diagnostic_record(d) for d in
+                                validator.errors + validator.warnings + validator.info],
+                'stats': validator.stats,
+            }
+            document.result_text = text
+            document.header_stamps = self._header_stamps()
+        return dict(document.result, version=version)
+
+    # --- Documents --------------------------------------------------------
+
+    def update_document(self, params):
+        """Apply the text carried by a validate request; returns the Document"""
+        filename = params.get('filename')
+        if not isinstance(filename, str) or not filename:
+            raise RequestError(INVALID_PARAMS, "'filename' is required")
+        with self.condition:
+            document = self.documents.get(filename)
+        if 'text' in params:
+            text = params['text']
+        elif 'changes' in params:
+            if document is None:
+                raise RequestError(INVALID_PARAMS, f"No open buffer for {filename}; send 'text' first")
+            try:
+                text = apply_changes(document.text, params['changes'])
+            except (KeyError, TypeError, AttributeError) as e:
+                raise RequestError(INVALID_PARAMS, f"Malformed change: {e}")
+        elif document is None:
+            try:
+                with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
+                    text = f.read()
+            except OSError as e:
+                raise RequestError(INVALID_PARAMS, f"Cannot read {filename}: {e.strerror}")
+        else:
+            text = document.text
+        # Text and version change together, as the validation thread snapshots both
+        with self.condition:
+            if document is None:
+                document = self.documents[filename] = Document(filename, text)
+            document.text = text
+            if 'version' in params:
+                document.version = params['version']
+        return document
+
+    # --- Scheduling -------------------------------------------------------
+
+    def submit(self, request_id, filename, tool):
+        """Queue validation of `filename`, superseding older requests for it"""
+        job = Job(request_id, filename, tool)
+        with self.condition:
+            older = self.pending.pop(filename, None)
+            if older is not None:
+                self.jobs_by_id.pop(older.request_id, None)
+                self.send_error(older.request_id, REQUEST_CANCELLED, "Superseded by a newer request")
+            if self.running is not None and self.running.filename == filename:
+                self.running.cancelled = True
+            self.pending[filename] = job
+            self.jobs_by_id[request_id] = job
+            self.condition.notify()
+
+    def cancel(self, request_id):
+        """Drop or interrupt a request named by notifications/cancelled (no response is sent)"""
+        with self.condition:
+            job = self.jobs_by_id.pop(request_id, None)
+            if job is None:
+                return
+            job.cancelled = True
+            if self.pending.get(job.filename) is job:
+                del self.pending[job.filename]
+
+    def work(self):
+        """Validation thread: run queued jobs until the input closes"""
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                filename = next(iter(self.pending))
+                job = self.running = self.pending.pop(filename)
+                document = self.documents.get(filename)
+            try:
+                if document is None:
+                    raise RequestError(INVALID_PARAMS, f"{filename} was closed")
+                payload = self.validate(document)
+            except Cancelled:
+                payload = None
+            except RequestError as e:
+                self.finish(job, error=(e.code, str(e)))
+                continue
+            except Exception as e:
+                self.finish(job, error=(INTERNAL_ERROR, f"Validation failed: {e}"))
+                continue
+            if payload is None or job.cancelled:
+                self.finish(job, cancelled=True)
+            else:
+                self.finish(job, payload=payload)
+
+    def finish(self, job, payload=None, error=None, cancelled=False):
+        with self.condition:
+            self.running = None
+            explicitly_cancelled = self.jobs_by_id.pop(job.request_id, None) is None
+        if cancelled or error is not None:
+            if explicitly_cancelled:
+                return  # Cancelled by the client: MCP expects no response
+            code, message = error or (REQUEST_CANCELLED, "Superseded by a newer request")
+            self.send_error(job.request_id, code, message)
+        elif job.tool:
+            self.send_result(job.request_id, tool_result(payload))
+        else:
+            self.send_result(job.request_id, payload)
+
+    # --- Protocol ---------------------------------------------------------
+
+    def send(self, message):
+        with self.write_lock:
+            self.output.write(json.dumps(message, ensure_ascii=False) + '\n')
+            self.output.flush()
+
+    def send_result(self, request_id, result):
+        self.send({'jsonrpc': '2.0', 'id': request_id, 'result': result})
+
+    def send_error(self, request_id, code, message):
+        self.send({'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}})
+
+    def handle(self, message):
+        """Dispatch one decoded message; validation is answered by the worker"""
+        if not isinstance(message, dict) or message.get('jsonrpc') != '2.0' or 'method' not in message:
+            self.send_error(message.get('id') if isinstance(message, dict) else None,
+                            INVALID_REQUEST, "Not a JSON-RPC 2.0 request")
+            return
+        method = message['method']
+        params = message.get('params')
+        request_id = message.get('id')
+        is_notification = 'id' not in message
+
+        try:
+            params = object_param(params, 'params')
+            if method == 'notifications/cancelled':
+                self.cancel(params.get('requestId'))
+                return
+            if is_notification:
+                return  # notifications/initialized and friends need no reply
+            if method == 'initialize':
+                result = {'protocolVersion': params.get('protocolVersion', PROTOCOL_VERSION),
+                          'capabilities': {'tools': {}}, 'serverInfo': SERVER_INFO}
+            elif method == 'ping':
+                result = {}
+            elif method == 'tools/list':
+                result = {'tools': TOOLS}
+            elif method == 'tools/call':
+                name = params.get('name')
+                arguments = object_param(params.get('arguments'), 'arguments')
+                if name == 'validate_lsl':
+                    document = self.update_document(arguments)
+                    self.submit(request_id, document.filename, tool=True)
+                    return
+                if name == 'close_lsl':
+                    self.close_document(arguments)
+                    result = {'content': [{'type': 'text', 'text': 'closed'}]}
+                else:
+                    raise RequestError(INVALID_PARAMS, f"Unknown tool '{name}'")
+            elif method == 'lsl/validate':
+                document = self.update_document(params)
+                self.submit(request_id, document.filename, tool=False)
+                return
+            elif method == 'lsl/close':
+                self.close_document(params)
+                result = {}
+            else:
+                raise RequestError(METHOD_NOT_FOUND, f"Unknown method '{method}'")
+        except RequestError as e:
+            if not is_notification:
+                self.send_error(request_id, e.code, str(e))
+            return
+        self.send_result(request_id, result)
+
+    def close_document(self, params):
+        with self.condition:
+            self.documents.pop(params.get('filename'), None)
+
+    def serve(self, stream):
+        """Read newline-delimited JSON-RPC from `stream` until EOF"""
+        worker = threading.Thread(target=self.work, name='lsl-validate', daemon=True)
+        worker.start()
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self.send_error(None, PARSE_ERROR, "Invalid JSON")
+                continue
+            # Buffer updates are applied here, in arrival order
+            try:
+                self.handle(message)
+            except Exception as e:  # A bad message must not take the resident server down
+                request_id = message.get('id') if isinstance(message, dict) else None
+                self.send_error(request_id, INTERNAL_ERROR, f"Internal error: {e}")
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        worker.join()
+
+
+def tool_result(payload):
+    """MCP tools/call result: a readable summary plus the structured diagnostics"""
+    lines = [f"{os.path.basename(payload['filename'])}: {payload['errors']} errors, "
+             f"{payload['warnings']} warnings"]
+    for diagnostic in payload['diagnostics']:
+        if diagnostic['severity'] == 'info':
+            continue
+        where = f"Line {diagnostic['line']}: " if diagnostic['line'] is not None else ''
+        lines.append(f"{diagnostic['severity']}: {where}{diagnostic['message']} [{diagnostic['rule']}]")
+    return {'content': [{'type': 'text', 'text': '\n'.join(lines)}],
+            'structuredContent': payload,
+            'isError': False}
+
+
+def parse_args(argv):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(prog='lsl_mcp_server.py',
+                                     description='Resident LSL validator over JSON-RPC/stdio')
+    parser.add_argument('-I', '--include-path', action='append', default=[], metavar='DIR',
+                        help='directory searched for #include files (repeatable)')
+    parser.add_argument('--memory-warning', type=float, default=0.8, metavar='FRACTION')
+    parser.add_argument('--memory-critical', type=float, default=0.9, metavar='FRACTION')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    server = LSLServer(args.include_path, (args.memory_warning, args.memory_critical))
+    try:
+        server.serve(sys.stdin)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
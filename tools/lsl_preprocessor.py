@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+LSL Preprocessor - Size-optimizing build stage for Linden Scripting Language files
+Created for the Peril Dice Game project
+
+Resolves #include / #define / #if with the validator's preprocessor (so
+#if DEBUG_LOGS blocks vanish when the flag is 0), then strips comments and
+whitespace, drops unreferenced globals and functions, and shortens user
+identifiers. The result is what gets pasted in-world.
+
+Usage:
+    python3 lsl_preprocessor.py Game_Manager.lsl processed_Game_Manager.lsl
+    python3 lsl_preprocessor.py .                 # processed_*.lsl for every script, plus size report
+    python3 lsl_preprocessor.py --verify .        # Round-trip and validator cross-check, writing nothing
+    python3 lsl_preprocessor.py --no-rename FILE OUT  # Keep identifiers readable
+    python3 -m doctest lsl_preprocessor.py        # Self-test: every script in the repo verifies
+"""
+
+import os
+import sys
+import glob
+import argparse
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lsl_validator import (
+    BAD, COMMENT, IDENT, IDENT_CLASS, KEYWORD, TYPE, LSLValidator, Preprocessor, match_brackets,
+    tokenize,
+)
+
+PROCESSED_PREFIX = 'processed_'
+
+# Reserved or predefined names the validator's tables do not list
+RESERVED_NAMES = frozenset({
+    'event', 'quaternion', 'print', 'jump', 'state', 'default', 'return',
+    'TRUE', 'FALSE', 'PI', 'TWO_PI', 'PI_BY_TWO', 'DEG_TO_RAD', 'RAD_TO_DEG', 'SQRT2',
+    'NULL_KEY', 'EOF', 'ZERO_VECTOR', 'ZERO_ROTATION',
+})
+
+# Rules whose findings legitimately change when a script is minified: layout
+# ones, and symbol usage that shifts once headers are inlined and pruned
+MINIFY_CHANGED_RULES = frozenset({
+    'line-too-long', 'multiple-statements', 'unused-global', 'unused-function',
+})
+
+_NAME_START = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_NAME_REST = _NAME_START + '0123456789_'
+
+
+def short_names():
+    """a, b, ... Z, aa, ab, ... in order of length"""
+    for length in itertools.count(1):
+        for first in _NAME_START:
+            for rest in itertools.product(_NAME_REST, repeat=length - 1):
+                yield first + ''.join(rest)
+
+
+def _is_member(code, index):
+    """True for the component name in `vec.x`"""
+    return index > 0 and code[index - 1].value == '.'
+
+
+class Declaration:
+    """A top-level global or function and the token range it occupies"""
+    __slots__ = ('kind', 'name', 'start', 'end')
+
+    def __init__(self, kind, name, start, end):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.end = end
+
+
+def top_level_declarations(code):
+    """Globals and functions declared before and between state blocks"""
+    pairs = match_brackets(code)[0]
+    last = len(code) - 1
+    declarations = []
+    index = 0
+    count = len(code)
+    while index < count:
+        token = code[index]
+        value = token.value
+        if value == 'default' or (value == 'state' and index + 1 < count):
+            # State block: skip to its closing brace
+            while index < count and code[index].value != '{':
+                index += 1
+            if index >= count:
+                break
+            index = pairs.get(index, last) + 1
+            continue
+        if token.kind != IDENT:
+            index += 1
+            continue
+        start = index
+        if IDENT_CLASS.get(value) is TYPE and index + 1 < count and code[index + 1].kind == IDENT:
+            index += 1
+        name = code[index].value
+        following = code[index + 1].value if index + 1 < count else ''
+        if following == '(':
+            close = pairs.get(index + 1, last)
+            if close + 1 < count and code[close + 1].value == '{':
+                end = pairs.get(close + 1, last)
+                declarations.append(Declaration('function', name, start, end))
+                index = end + 1
+                continue
+        elif following in ('=', ';') and start != index:
+            end = index
+            while end < count and code[end].value != ';':
+                end += 1
+            declarations.append(Declaration('global', name, start, end))
+            index = end + 1
+            continue
+        index += 1
+    return declarations
+
+
+def drop_unreferenced(code):
+    """`code` without globals and functions nobody uses, and the names dropped"""
+    dropped = []
+    while True:
+        declarations = top_level_declarations(code)
+        uses = {}
+        for index, token in enumerate(code):
+            if token.kind == IDENT and not _is_member(code, index):
+                uses.setdefault(token.value, []).append(index)
+        unused = []
+        for declaration in declarations:
+            outside = [i for i in uses.get(declaration.name, ())
+                       if not declaration.start <= i <= declaration.end]
+            # Another declaration of the same name keeps both (LSL would reject it anyway)
+            same_name = sum(1 for other in declarations if other.name == declaration.name)
+            if not outside and same_name == 1:
+                unused.append(declaration)
+        if not unused:
+            return code, dropped
+        removed = set()
+        for declaration in unused:
+            removed.update(range(declaration.start, declaration.end + 1))
+            dropped.append((declaration.kind, declaration.name))
+        code = [token for index, token in enumerate(code) if index not in removed]
+
+
+def drop_empty_statements(code):
+    """`code` without stray ';' such as those left by `#define dbg(msg) ;`.
+
+    Only a ';' that directly follows another statement or a brace is dropped;
+    one that forms the body of an if/while/for or sits in a for header stays.
+    """
+    kept = []
+    parens = 0
+    for token in code:
+        value = token.value
+        if value == '(':
+            parens += 1
+        elif value == ')':
+            parens -= 1
+        elif value == ';' and not parens and kept and kept[-1].value in (';', '{', '}'):
+            continue
+        kept.append(token)
+    return kept
+
+
+def declared_names(code):
+    """Names the script itself declares: variables, parameters, functions, states and labels"""
+    names = set()
+    for index, token in enumerate(code):
+        if token.kind != IDENT:
+            continue
+        previous = code[index - 1] if index else None
+        if previous is None:
+            continue
+        if previous.kind == IDENT and IDENT_CLASS.get(previous.value) is TYPE:
+            names.add(token.value)
+        elif previous.value in ('state', '@', 'jump') and token.value != 'default':
+            names.add(token.value)
+    for declaration in top_level_declarations(code):
+        if declaration.kind == 'function':
+            names.add(declaration.name)
+    return {name for name in names
+            if IDENT_CLASS.get(name) is None and name not in RESERVED_NAMES}
+
+
+def rename_map(code):
+    """Bijective map from declared names to the shortest free names, most used first.
+
+    One name always maps to one new name, whatever scope it is declared in,
+    so shadowing and scoping are preserved exactly.
+    """
+    declared = declared_names(code)
+    counts = {}
+    # Declared names stay reserved too: one that cannot be shortened keeps itself
+    taken = set(RESERVED_NAMES) | set(IDENT_CLASS) | declared
+    for index, token in enumerate(code):
+        if token.kind != IDENT:
+            continue
+        if token.value in declared and not _is_member(code, index):
+            counts[token.value] = counts.get(token.value, 0) + 1
+        else:
+            taken.add(token.value)
+    mapping = {}
+    candidates = short_names()
+    for name in sorted(counts, key=lambda name: (-counts[name] * len(name), name)):
+        for candidate in candidates:
+            if candidate not in taken:
+                break
+        # Never lengthen a name
+        mapping[name] = candidate if len(candidate) < len(name) else name
+        taken.add(mapping[name])
+    return {old: new for old, new in mapping.items() if old != new}
+
+
+_pair_cache = {}
+
+
+def needs_space(left, right):
+    """True if `left` and `right` would lex differently when written together"""
+    if left[-1] in _NAME_REST and right[0] in _NAME_REST:
+        return True
+    key = (left, right)
+    result = _pair_cache.get(key)
+    if result is None:
+        result = [token.value for token in tokenize(left + right)] != [left, right]
+        if len(left) + len(right) <= 8:
+            _pair_cache[key] = result
+    return result
+
+
+def emit(code, mapping):
+    """Minimal source text for `code` with names replaced through `mapping`"""
+    out = []
+    previous = None
+    depth = 0
+    for index, token in enumerate(code):
+        value = token.value
+        if token.kind == IDENT and not _is_member(code, index):
+            value = mapping.get(value, value)
+        if previous is not None and previous != '\n' and needs_space(previous, value):
+            out.append(' ')
+        out.append(value)
+        previous = value
+        if value == '{':
+            depth += 1
+        elif value == '}':
+            depth -= 1
+        # One line per top-level declaration keeps compile errors locatable
+        if depth == 0 and value in (';', '}'):
+            out.append('\n')
+            previous = '\n'
+    return ''.join(out).rstrip('\n') + '\n'
+
+
+class MinifyResult:
+    """Output text and what the minifier changed in one script"""
+    __slots__ = ('source', 'text', 'code', 'kept', 'mapping', 'dropped', 'diagnostics')
+
+    def __init__(self, source, text, code, kept, mapping, dropped, diagnostics):
+        self.source = source
+        self.text = text
+        self.code = code
+        self.kept = kept
+        self.mapping = mapping
+        self.dropped = dropped
+        self.diagnostics = diagnostics
+
+
+class Minifier:
+    """Preprocess, prune and shorten LSL scripts"""
+
+    def __init__(self, include_path=(), rename=True, drop_unused=True):
+        self.preprocessor = Preprocessor(include_path, inline_includes=True)
+        self.rename = rename
+        self.drop_unused = drop_unused
+
+    def minify(self, content, filepath):
+        """MinifyResult for `content` read from `filepath`"""
+        result = self.preprocessor.process(tokenize(content), filepath)
+        code = [token for token in result.code if token.kind != COMMENT]
+        kept, dropped = drop_unreferenced(code) if self.drop_unused else (code, [])
+        kept = drop_empty_statements(kept)
+        mapping = rename_map(kept) if self.rename else {}
+        return MinifyResult(content, emit(kept, mapping), code, kept, mapping, dropped,
+                            result.diagnostics)
+
+
+def is_script(content):
+    """True if `content` has a default state (headers do not)"""
+    return any(token.kind == IDENT and token.value == 'default' for token in tokenize(content))
+
+
+def verify(result, filepath, include_path=()):
+    """Problems found re-reading the minified text; empty when it round-trips.
+
+    Every script in the repository verifies; a call nothing declares does not:
+
+    >>> root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+    >>> minifier = Minifier()
+    >>> failed = []
+    >>> for path in sorted(glob.glob(os.path.join(root, '*.lsl'))):
+    ...     with open(path, encoding='utf-8', errors='ignore') as f:
+    ...         content = f.read()
+    ...     if is_script(content) and verify(minifier.minify(content, path), path):
+    ...         failed.append(os.path.basename(path))
+    >>> failed
+    []
+    >>> verify(minifier.minify('default{state_entry(){helper();}}', 'x.lsl'), 'x.lsl')
+    ["Output uses undeclared function 'helper'"]
+    """
+    problems = []
+    tokens = [token for token in tokenize(result.text) if token.kind != COMMENT]
+    bad = [token for token in tokens if token.kind == BAD]
+    if bad:
+        problems.append(f"Output does not lex at line {bad[0].line}: {bad[0].value!r}")
+
+    # Undo the renaming: the token stream must be the pruned original exactly
+    inverse = {new: old for old, new in result.mapping.items()}
+    if len(inverse) != len(result.mapping):
+        problems.append("Renaming is not one-to-one")
+    restored = [inverse.get(token.value, token.value)
+                if token.kind == IDENT and not _is_member(tokens, index) else token.value
+                for index, token in enumerate(tokens)]
+    expected = [token.value for token in result.kept]
+    if restored != expected:
+        for index, (got, want) in enumerate(zip(restored, expected)):
+            if got != want:
+                problems.append(f"Token {index} differs after round trip: {got!r} != {want!r}")
+                break
+        else:
+            problems.append(f"Token count differs after round trip: {len(restored)} != {len(expected)}")
+
+    # Renamed identifiers must not capture anything that kept its name
+    untouched = {token.value for token in result.kept
+                 if token.kind == IDENT and token.value not in result.mapping}
+    captured = sorted(set(inverse) & untouched)
+    if captured:
+        problems.append(f"Short names collide with existing identifiers: {', '.join(captured)}")
+
+    # Nothing dropped may still be referenced
+    names = {token.value for token in result.kept if token.kind == IDENT}
+    for kind, name in result.dropped:
+        if name in names:
+            problems.append(f"Dropped {kind} '{name}' is still referenced")
+
+    # Every user function called and every variable used must be declared in the output;
+    # like the validator, ll* and ALL_CAPS names count as built in
+    declared = declared_names(tokens)
+    pairs = match_brackets(tokens)[0]
+    undeclared = set()
+    for index, token in enumerate(tokens):
+        name = token.value
+        if token.kind != IDENT or name in declared or name in IDENT_CLASS or name in RESERVED_NAMES \
+                or name.startswith('ll') or name.upper() == name or _is_member(tokens, index):
+            continue
+        if index + 1 < len(tokens) and tokens[index + 1].value == '(':
+            close = pairs.get(index + 1, len(tokens) - 1)
+            if close + 1 < len(tokens) and tokens[close + 1].value == '{':
+                continue    # A function or event handler header
+            undeclared.add(f"function '{inverse.get(name, name)}'")
+        else:
+            undeclared.add(f"variable '{inverse.get(name, name)}'")
+    if undeclared:
+        problems.append(f"Output uses undeclared {', '.join(sorted(undeclared))}")
+
+    # Independent oracle: the validator's own parse of both texts must agree
+    before, before_source = validator_view(result.source, filepath, include_path)
+    after, after_source = validator_view(result.text, filepath, include_path)
+    expected = symbol_outline(before_source, result.mapping, result.dropped)
+    actual = symbol_outline(after_source)
+    for part, want in expected.items():
+        got = actual[part]
+        if isinstance(want, dict):
+            # Header function bodies only exist in the inlined, minified text
+            got = {owner: callees for owner, callees in got.items() if owner in want}
+        if got != want:
+            problems.append(f"Validator sees different {part} after minifying: "
+                            f"{_outline_difference(want, got)}")
+    if len(after.errors) > len(before.errors):
+        problems.append(f"Validator errors rose from {len(before.errors)} to {len(after.errors)}: "
+                        f"{after.errors[0]}")
+    rules_before = rule_set(before)
+    rules_after = rule_set(after)
+    if rules_before != rules_after:
+        changes = [f"+{severity} {rule}" for severity, rule in sorted(rules_after - rules_before)]
+        changes += [f"-{severity} {rule}" for severity, rule in sorted(rules_before - rules_after)]
+        problems.append(f"Validator findings changed after minifying: {', '.join(changes)}")
+    return problems
+
+
+def validator_view(content, filepath, include_path=()):
+    """(LSLValidator after analysing `content`, the LexedSource it built its SymbolTable on)"""
+    validator = LSLValidator(include_path)
+    source = validator.analyze(content, filepath)
+    validator._symbol_table(source)
+    return validator, source
+
+
+def symbol_outline(source, mapping=None, dropped=()):
+    """Globals, functions, states, handlers, call graph and library calls of a script.
+
+    Names the validator sees declared go through `mapping` and `dropped`
+    declarations are left out, so the outline of a source script can be
+    compared with its minified form; anything else (events, ll* calls)
+    must come out unchanged. Header symbols count as the script's own,
+    since minifying inlines them.
+    """
+    table = source.symbols
+    functions = set(table.functions) | table.header_functions
+    declared = set(table.globals) | table.header_globals | functions | set(table.states)
+    mapping = {old: new for old, new in (mapping or {}).items() if old in declared}
+    gone = {name for _, name in dropped}
+
+    def rename(name):
+        state, dot, event = name.partition('.')
+        return f"{mapping.get(state, state)}.{event}" if dot else mapping.get(name, name)
+
+    def keep(names):
+        return {rename(name) for name in names if name not in gone}
+
+    return {
+        'globals': keep(set(table.globals) | table.header_globals),
+        'functions': keep(functions),
+        'states': keep(table.states),
+        'handlers': keep(table.handlers),
+        'calls': {rename(owner): keep(callees) for owner, callees in table.calls.items()
+                  if owner not in gone},
+        'library calls': {rename(owner) if owner else owner: names
+                          for owner, names in _library_calls(source, functions).items()
+                          if owner not in gone},
+    }
+
+
+def _library_calls(source, functions):
+    """{function or handler: names it calls that are not user functions}; '' holds
+    what sits outside any body, such as the event names of handlers"""
+    code = source.code
+    calls = {}
+    for index, token in enumerate(code[:-1]):
+        if token.kind == IDENT and code[index + 1].value == '(' and token.value not in functions \
+                and IDENT_CLASS.get(token.value) not in (KEYWORD, TYPE):
+            owner = source.symbols.owner_of(index) or ''
+            calls.setdefault(owner, set()).add(token.value)
+    return calls
+
+
+def _outline_difference(want, got):
+    """Short description of how two outline parts differ"""
+    if isinstance(want, dict):
+        for owner in sorted(set(want) | set(got)):
+            if want.get(owner) != got.get(owner):
+                return f"{owner}: {_outline_difference(want.get(owner, set()), got.get(owner, set()))}"
+        return "(none)"
+    missing = ', '.join(sorted(want - got)) or '-'
+    extra = ', '.join(sorted(got - want)) or '-'
+    return f"missing {missing}; unexpected {extra}"
+
+
+def rule_set(validator):
+    """(severity, rule) of every error and warning, less the rules minifying changes"""
+    return {(d.severity, d.rule) for d in validator.errors + validator.warnings
+            if d.rule not in MINIFY_CHANGED_RULES}
+
+
+def format_size_report(rows):
+    """Before/after table for (name, source bytes, output bytes, renamed, dropped) rows"""
+    lines = [f"\n📦 LSL Preprocessor Size Report (includes inlined)"]
+    lines.append("=" * 86)
+    lines.append(f"{'Script':<44}{'Source':>9}{'Output':>9}{'Saved':>8}{'Renamed':>9}{'Dropped':>9}")
+    total_before = total_after = 0
+    for name, before, after, renamed, dropped in rows:
+        saved = 1 - after / before if before else 0.0
+        lines.append(f"{name:<44}{before:>9,}{after:>9,}{saved:>8.0%}{renamed:>9}{dropped:>9}")
+        total_before += before
+        total_after += after
+    if len(rows) > 1:
+        lines.append("-" * 86)
+        saved = 1 - total_after / total_before if total_before else 0.0
+        lines.append(f"{'TOTAL':<44}{total_before:>9,}{total_after:>9,}{saved:>8.0%}")
+    return '\n'.join(lines)
+
+
+def process_file(minifier, source_path, output_path, check=False, include_path=()):
+    """Minify one script; returns (report row or None, problems)"""
+    with open(source_path, 'rb') as f:
+        raw = f.read()
+    content = raw.decode('utf-8', errors='ignore')
+    name = os.path.basename(source_path)
+    if not is_script(content):
+        print(f"⏭️  {name}: no default state (header), skipped")
+        return None, []
+    result = minifier.minify(content, source_path)
+    for severity, rule, line, message in result.diagnostics:
+        print(f"⚠️  {name} line {line}: {message}")
+    problems = verify(result, source_path, include_path) if check else []
+    if output_path is not None and not problems:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(result.text)
+    row = (name, len(raw), len(result.text.encode('utf-8')), len(result.mapping), len(result.dropped))
+    return row, problems
+
+
+def parse_args(argv):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        prog='lsl_preprocessor.py',
+        description='Size-optimizing preprocessor for LSL files')
+    parser.add_argument('source', help='LSL file, or a directory of .lsl files')
+    parser.add_argument('output', nargs='?',
+                        help=f'output file (default: {PROCESSED_PREFIX}<name> next to the source)')
+    parser.add_argument('-I', '--include-path', action='append', default=[], metavar='DIR',
+                        help='directory searched for #include files (repeatable)')
+    parser.add_argument('--no-rename', action='store_true', help='keep identifier names')
+    parser.add_argument('--keep-unused', action='store_true',
+                        help='keep globals and functions that nothing references')
+    parser.add_argument('--verify', action='store_true',
+                        help='round-trip check every output and cross-check it with the validator; '
+                             'with a directory, write nothing')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    minifier = Minifier(args.include_path, rename=not args.no_rename, drop_unused=not args.keep_unused)
+
+    if os.path.isdir(args.source):
+        sources = [path for path in sorted(glob.glob(os.path.join(args.source, "*.lsl")))
+                   if not os.path.basename(path).startswith(PROCESSED_PREFIX)]
+        jobs = [(path, None if args.verify else
+                 os.path.join(os.path.dirname(path), PROCESSED_PREFIX + os.path.basename(path)))
+                for path in sources]
+    elif os.path.isfile(args.source):
+        output = args.output or os.path.join(os.path.dirname(args.source),
+                                             PROCESSED_PREFIX + os.path.basename(args.source))
+        jobs = [(args.source, output)]
+    else:
+        print(f"❌ ERROR: {args.source} is not a file or directory")
+        sys.exit(1)
+
+    rows = []
+    failures = 0
+    for source_path, output_path in jobs:
+        row, problems = process_file(minifier, source_path, output_path, args.verify, args.include_path)
+        if row is not None:
+            rows.append(row)
+        for problem in problems:
+            print(f"❌ {os.path.basename(source_path)}: {problem}")
+        failures += bool(problems)
+
+    if rows:
+        print(format_size_report(rows))
+    if args.verify:
+        if failures:
+            print(f"\n❌ {failures} script(s) failed round-trip verification")
+            sys.exit(1)
+        print(f"\n✅ {len(rows)} script(s) round-trip verified")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1867 @@
+#!/usr/bin/env python3
+"""
+LSL Simulator - Offline event replay with per-handler cost accounting
+Created for the Peril Dice Game project
+
+Interprets a practical subset of LSL on top of the validator's lexer and
+preprocessor: integer/float/string/key/list/vector values, user functions,
+states, jumps, and link_message/timer/listen dispatch across a simulated
+linkset. ll* calls are stubbed and priced with configurable weights. A
+scenario replays a scripted or recorded sequence of events; the report
+shows, per handler, the operations executed, the list elements copied and
+the largest list and string built.
+
+Usage:
+    python3 lsl_simulator.py scenarios/peril_round.json        # Replay and print the cost table
+    python3 lsl_simulator.py SCENARIO --weights weights.json   # ll* cost weights ({"llSay": 2, "default": 1})
+    python3 lsl_simulator.py SCENARIO --format json            # Machine-readable costs
+    python3 lsl_simulator.py SCENARIO --save-baseline FILE     # Record the costs as the baseline
+    python3 lsl_simulator.py SCENARIO --baseline FILE          # Fail if a handler got costlier
+    python3 lsl_simulator.py SCENARIO --trace                  # Log every event, chat and link message
+
+Scenario files are JSON; script paths are relative to the scenario:
+    {"scripts": ["../../Game_Manager.lsl", {"path": "../../Main_Controller_Linkset.lsl", "link": 1}],
+     "links": {"1": "Controller"},
+     "events": [
+        {"event": "touch_start", "script": "Main_Controller_Linkset.lsl", "args": [1],
+         "detected": [{"key": "owner", "name": "Alice", "link": 1}]},
+        {"event": "link_message", "args": [1, "$MSG_RESET_ALL", "FULL_RESET", ""]},
+        {"event": "chat", "channel": "$DIALOG_CHANNEL", "message": "Start Game", "key": "owner"},
+        {"advance": 5.0},
+        {"repeat": 3, "events": [...]}
+     ]}
+"$NAME" arguments resolve against each receiving script's globals and
+#defines; the key "owner" stands for the object owner.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import random
+import hashlib
+import argparse
+from collections import deque
+from urllib.parse import quote, unquote
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lsl_validator import (
+    IDENT, LSL_TYPES, NUMBER, STRING, LexedSource, Preprocessor,
+)
+
+# Operations a single event may run before it is treated as an endless loop
+MAX_OPS_PER_EVENT = 2000000
+
+# Events processed after one scenario step before the linkset counts as flooding
+MAX_EVENTS_PER_STEP = 20000
+
+# User function nesting before the script dies like an in-world stack overflow
+MAX_CALL_DEPTH = 200
+
+# Open listeners per script (the in-world limit)
+MAX_LISTENS = 65
+
+# Cost of an ll* call not listed in the weights
+DEFAULT_WEIGHT = 1.0
+
+# Relative cost of ll* calls; the rest cost DEFAULT_WEIGHT
+DEFAULT_WEIGHTS = {
+    'llParseString2List': 4, 'llParseStringKeepNulls': 4, 'llCSV2List': 3, 'llList2CSV': 3,
+    'llDumpList2String': 3, 'llListSort': 5, 'llListFindList': 2, 'llListReplaceList': 2,
+    'llDeleteSubList': 2, 'llList2List': 2, 'llListInsertList': 2,
+    'llMessageLinked': 3, 'llSay': 2, 'llWhisper': 2, 'llShout': 2, 'llRegionSay': 2,
+    'llRegionSayTo': 2, 'llOwnerSay': 2, 'llDialog': 5, 'llTextBox': 5, 'llSetText': 3,
+    'llSetLinkPrimitiveParamsFast': 4, 'llSetPrimitiveParams': 4, 'llListen': 2,
+    'llMD5String': 3, 'llSHA1String': 3, 'llReadKeyValue': 5, 'llUpdateKeyValue': 5,
+    'llSleep': 0,
+}
+
+# Per-handler metrics compared against a baseline (lower is better)
+BASELINE_METRICS = ('ops', 'll_cost', 'list_copy')
+
+DEFAULT_THRESHOLD = 0.1
+
+# ll* functions whose result is a modified copy of a list argument
+LIST_COPYING = frozenset({
+    'llList2List', 'llDeleteSubList', 'llListReplaceList', 'llListInsertList', 'llListSort',
+    'llListRandomize',
+})
+
+ASSIGN_OPS = frozenset({'=', '+=', '-=', '*=', '/=', '%='})
+
+# Binary operators from the loosest to the tightest binding
+BINARY_LEVELS = (
+    ('||', '&&'), ('|',), ('^',), ('&',), ('==', '!='),
+    ('<', '<=', '>', '>='), ('<<', '>>'), ('+', '-'), ('*', '/', '%'),
+)
+
+# Vector components stop before the comparisons so '>' can close them
+VECTOR_LEVEL = 6
+
+
+class SimulationError(Exception):
+    """The scenario or a script cannot be simulated"""
+
+
+class ScriptError(Exception):
+    """An LSL run-time error; the script stops as it would in-world"""
+
+
+class _Return(Exception):
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.value = value
+
+
+class _StateChange(Exception):
+    __slots__ = ('state',)
+
+    def __init__(self, state):
+        self.state = state
+
+
+class _Jump(Exception):
+    __slots__ = ('label',)
+
+    def __init__(self, label):
+        self.label = label
+
+
+class _Reset(Exception):
+    pass
+
+
+class Key(str):
+    """LSL key: a string that is only true when it holds a non-null UUID"""
+    __slots__ = ()
+
+
+class Vector(tuple):
+    __slots__ = ()
+
+
+class Rotation(tuple):
+    __slots__ = ()
+
+
+NULL_KEY = Key('00000000-0000-0000-0000-000000000000')
+ZERO_VECTOR = Vector((0.0, 0.0, 0.0))
+ZERO_ROTATION = Rotation((0.0, 0.0, 0.0, 1.0))
+
+_UUID_RE = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+_INT_PREFIX_RE = re.compile(r'\s*([+-]?)(0[xX][0-9a-fA-F]+|\d+)')
+_FLOAT_PREFIX_RE = re.compile(r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+
+DEFAULTS = {
+    'integer': 0, 'float': 0.0, 'string': '', 'key': Key(''),
+    'vector': ZERO_VECTOR, 'rotation': ZERO_ROTATION, 'list': [],
+}
+
+CONSTANTS = {
+    'TRUE': 1, 'FALSE': 0, 'NULL_KEY': NULL_KEY, 'EOF': '\n\n\n',
+    'ZERO_VECTOR': ZERO_VECTOR, 'ZERO_ROTATION': ZERO_ROTATION,
+    'PI': math.pi, 'TWO_PI': 2 * math.pi, 'PI_BY_TWO': math.pi / 2,
+    'DEG_TO_RAD': math.pi / 180, 'RAD_TO_DEG': 180 / math.pi, 'SQRT2': math.sqrt(2),
+    'LINK_ROOT': 1, 'LINK_SET': -1, 'LINK_ALL_OTHERS': -2, 'LINK_ALL_CHILDREN': -3, 'LINK_THIS': -4,
+    'PUBLIC_CHANNEL': 0, 'DEBUG_CHANNEL': 0x7FFFFFFF, 'ALL_SIDES': -1,
+    'STRING_TRIM_HEAD': 1, 'STRING_TRIM_TAIL': 2, 'STRING_TRIM': 3,
+    'AGENT': 1, 'AGENT_BY_LEGACY_NAME': 1, 'ACTIVE': 2, 'PASSIVE': 4, 'SCRIPTED': 8,
+    'CHANGED_INVENTORY': 1, 'CHANGED_COLOR': 2, 'CHANGED_SHAPE': 4, 'CHANGED_SCALE': 8,
+    'CHANGED_TEXTURE': 16, 'CHANGED_LINK': 32, 'CHANGED_ALLOWED_DROP': 64, 'CHANGED_OWNER': 128,
+    'CHANGED_REGION': 256, 'CHANGED_TELEPORT': 512, 'CHANGED_REGION_START': 1024,
+    'TYPE_INVALID': 0, 'TYPE_INTEGER': 1, 'TYPE_FLOAT': 2, 'TYPE_STRING': 3, 'TYPE_KEY': 4,
+    'TYPE_VECTOR': 5, 'TYPE_ROTATION': 6,
+    'PERMISSION_DEBIT': 2, 'PERMISSION_TAKE_CONTROLS': 4, 'PERMISSION_TRIGGER_ANIMATION': 16,
+    'PERMISSION_ATTACH': 32, 'PERMISSION_CHANGE_LINKS': 128,
+    'XP_ERROR_NONE': 0,
+}
+
+# Result of ll* calls that have no model here, by the type they return
+STUB_RESULTS = {
+    'llGetDisplayName': 'Resident', 'llKey2Name': 'Resident', 'llGetUsername': 'resident',
+    'llGetObjectDesc': '', 'llGetInventoryName': '', 'llGetRegionName': 'Sandbox',
+    'llReadKeyValue': NULL_KEY, 'llUpdateKeyValue': NULL_KEY, 'llCreateKeyValue': NULL_KEY,
+    'llDeleteKeyValue': NULL_KEY, 'llRequestAgentData': NULL_KEY, 'llHTTPRequest': NULL_KEY,
+    'llRequestDisplayName': NULL_KEY, 'llRequestUsername': NULL_KEY, 'llGetNotecardLine': NULL_KEY,
+    'llGetPos': ZERO_VECTOR, 'llGetLocalPos': ZERO_VECTOR, 'llGetScale': Vector((1.0, 1.0, 1.0)),
+    'llGetRot': ZERO_ROTATION, 'llGetLocalRot': ZERO_ROTATION,
+    'llGetPrimitiveParams': [], 'llGetLinkPrimitiveParams': [], 'llGetObjectDetails': [],
+    'llGetInventoryNumber': 0, 'llAgentInExperience': 1, 'llGetAttached': 0,
+}
+
+
+def wrap32(value):
+    """Two's complement wrap of an LSL integer"""
+    return (value + 0x80000000) % 0x100000000 - 0x80000000
+
+
+def parse_number(text):
+    """Value of a NUMBER token"""
+    if text[:2].lower() == '0x':
+        return wrap32(int(text, 16))
+    if any(c in text for c in '.eE'):
+        return float(text)
+    return wrap32(int(text))
+
+
+def unescape(literal):
+    """Value of a STRING token; LSL turns \\t into four spaces and drops unknown escapes"""
+    out = []
+    index = 1
+    end = len(literal) - 1
+    while index < end:
+        char = literal[index]
+        if char == '\\' and index + 1 < end:
+            index += 1
+            char = literal[index]
+            out.append({'n': '\n', 't': '    '}.get(char, char))
+        else:
+            out.append(char)
+        index += 1
+    return ''.join(out)
+
+
+def lsl_string(value):
+    """(string) cast of any LSL value"""
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, float):
+        return f"{value:.6f}"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, Vector):
+        return '<' + ', '.join(f"{c:.5f}" for c in value) + '>'
+    if isinstance(value, Rotation):
+        return '<' + ', '.join(f"{c:.5f}" for c in value) + '>'
+    if isinstance(value, list):
+        return ''.join(lsl_string(element) for element in value)
+    return str(value)
+
+
+def lsl_integer(value):
+    """(integer) cast; strings parse a leading decimal or 0x number
+
+    >>> lsl_integer("010"), lsl_integer(" -08 players"), lsl_integer("0x1F"), lsl_integer("abc")
+    (10, -8, 31, 0)
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return wrap32(int(value)) if math.isfinite(value) else -0x80000000
+    if isinstance(value, str):
+        match = _INT_PREFIX_RE.match(value)
+        if match is None:
+            return 0
+        digits = match.group(2)
+        number = int(digits, 16) if digits[:2] in ('0x', '0X') else int(digits, 10)
+        return wrap32(-number if match.group(1) == '-' else number)
+    return 0
+
+
+def lsl_float(value):
+    """(float) cast"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _FLOAT_PREFIX_RE.match(value)
+        return float(match.group()) if match else 0.0
+    return 0.0
+
+
+def lsl_vector(value, size=3):
+    """(vector) / (rotation) cast of a "<x, y, z>" string"""
+    kind = Vector if size == 3 else Rotation
+    if isinstance(value, kind):
+        return value
+    if isinstance(value, str):
+        parts = value.strip().lstrip('<').rstrip('>').split(',')
+        if len(parts) == size:
+            return kind(lsl_float(part) for part in parts)
+    return ZERO_VECTOR if size == 3 else ZERO_ROTATION
+
+
+def cast(type_name, value):
+    """Explicit (type) cast"""
+    if type_name == 'integer':
+        return lsl_integer(value)
+    if type_name == 'float':
+        return lsl_float(value)
+    if type_name == 'string':
+        return lsl_string(value)
+    if type_name == 'key':
+        return Key(lsl_string(value))
+    if type_name == 'list':
+        return value if isinstance(value, list) else [value]
+    if type_name == 'vector':
+        return lsl_vector(value, 3)
+    return lsl_vector(value, 4)
+
+
+def coerce(type_name, value):
+    """Implicit conversion on assignment, parameter passing and return"""
+    if type_name == 'float' and isinstance(value, int):
+        return float(value)
+    if type_name == 'key' and isinstance(value, str) and not isinstance(value, Key):
+        return Key(value)
+    if type_name == 'string' and isinstance(value, Key):
+        return str(value)
+    return value
+
+
+def truth(value):
+    """LSL condition test"""
+    if isinstance(value, Key):
+        return value != NULL_KEY and _UUID_RE.match(value) is not None
+    if isinstance(value, (Vector, Rotation)):
+        return value != ZERO_VECTOR and value != ZERO_ROTATION
+    return bool(value)
+
+
+def same_element(a, b):
+    """List element equality as llListFindList sees it: type and value"""
+    return type(a) is type(b) and a == b
+
+
+class Var:
+    """A typed variable slot"""
+    __slots__ = ('type', 'value')
+
+    def __init__(self, type_name, value):
+        self.type = type_name
+        self.value = value
+
+
+class Function:
+    """A user function or event handler"""
+    __slots__ = ('name', 'type', 'params', 'body')
+
+    def __init__(self, name, type_name, params, body):
+        self.name = name
+        self.type = type_name
+        self.params = params      # [(type, name)]
+        self.body = body
+
+
+class Program:
+    """A parsed script: globals in declaration order, functions and states"""
+
+    def __init__(self, name):
+        self.name = name
+        self.globals = []         # (type, name, expression or None)
+        self.functions = {}
+        self.states = {}          # state -> {event: Function}
+        self.macros = {}
+
+
+class Parser:
+    """Recursive-descent parser from the validator's code tokens to tuples.
+
+    Statements and expressions become tuples tagged with their kind, e.g.
+    ('bin', '+', left, right, line); the interpreter dispatches on the tag.
+    """
+
+    def __init__(self, code, script):
+        self.code = code
+        self.script = script
+        self.index = 0
+
+    def error(self, message):
+        token = self.code[min(self.index, len(self.code) - 1)] if self.code else None
+        line = token.line if token is not None else '?'
+        raise SimulationError(f"{self.script}:{line}: {message}")
+
+    def peek(self, offset=0):
+        index = self.index + offset
+        return self.code[index].value if index < len(self.code) else ''
+
+    def take(self):
+        if self.index >= len(self.code):
+            self.error("unexpected end of file")
+        token = self.code[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, value):
+        if self.peek() != value:
+            self.error(f"expected '{value}', found '{self.peek() or 'end of file'}'")
+        return self.take()
+
+    def take_name(self):
+        token = self.take()
+        if token.kind != IDENT:
+            self.index -= 1
+            self.error(f"expected a name, found '{token.value}'")
+        return token.value
+
+    def is_type(self, offset=0):
+        index = self.index + offset
+        return index < len(self.code) and self.code[index].kind == IDENT and self.code[index].value in LSL_TYPES
+
+    def parse(self):
+        """Parse a whole script into a Program"""
+        program = Program(self.script)
+        while self.index < len(self.code):
+            value = self.peek()
+            if value == 'default':
+                self.take()
+                program.states['default'] = self.parse_state()
+            elif value == 'state':
+                self.take()
+                name = self.take_name()
+                program.states[name] = self.parse_state()
+            elif value == ';':
+                self.take()
+            elif self.is_type() and self.peek(2) == '(':
+                type_name = self.take().value
+                self.parse_function(program, type_name)
+            elif self.peek(1) == '(':
+                self.parse_function(program, None)
+            elif self.is_type():
+                type_name = self.take().value
+                name = self.take_name()
+                expression = None
+                if self.peek() == '=':
+                    self.take()
+                    expression = self.parse_expression()
+                self.expect(';')
+                program.globals.append((type_name, name, expression))
+            else:
+                self.error(f"unexpected '{value}' at the top level")
+        if 'default' not in program.states:
+            self.error("no default state")
+        return program
+
+    def parse_function(self, program, type_name):
+        name = self.take_name()
+        params = self.parse_params()
+        program.functions[name] = Function(name, type_name, params, self.parse_block())
+
+    def parse_params(self):
+        self.expect('(')
+        params = []
+        while self.peek() != ')':
+            if not self.is_type():
+                self.error(f"expected a parameter type, found '{self.peek()}'")
+            type_name = self.take().value
+            params.append((type_name, self.take_name()))
+            if self.peek() == ',':
+                self.take()
+        self.expect(')')
+        return params
+
+    def parse_state(self):
+        self.expect('{')
+        handlers = {}
+        while self.peek() != '}':
+            name = self.take_name()
+            params = self.parse_params()
+            handlers[name] = Function(name, None, params, self.parse_block())
+        self.expect('}')
+        return handlers
+
+    def parse_block(self):
+        self.expect('{')
+        statements = []
+        labels = {}
+        while self.peek() != '}':
+            statement = self.parse_statement()
+            if statement[0] == 'label':
+                labels[statement[1]] = len(statements)
+            statements.append(statement)
+        self.expect('}')
+        return ('block', statements, labels)
+
+    def parse_statement(self):
+        value = self.peek()
+        if value == '{':
+            return self.parse_block()
+        if value == ';':
+            self.take()
+            return ('nop',)
+        if self.is_type() and self.index + 1 < len(self.code) and self.code[self.index + 1].kind == IDENT:
+            type_name = self.take().value
+            name = self.take_name()
+            expression = None
+            if self.peek() == '=':
+                self.take()
+                expression = self.parse_expression()
+            self.expect(';')
+            return ('decl', type_name, name, expression)
+        if value == 'if':
+            self.take()
+            condition = self.parse_condition()
+            then = self.parse_statement()
+            otherwise = None
+            if self.peek() == 'else':
+                self.take()
+                otherwise = self.parse_statement()
+            return ('if', condition, then, otherwise)
+        if value == 'while':
+            self.take()
+            condition = self.parse_condition()
+            return ('while', condition, self.parse_statement())
+        if value == 'do':
+            self.take()
+            body = self.parse_statement()
+            self.expect('while')
+            condition = self.parse_condition()
+            self.expect(';')
+            return ('do', body, condition)
+        if value == 'for':
+            self.take()
+            self.expect('(')
+            initial = self.parse_expression_list(';')
+            self.expect(';')
+            condition = None if self.peek() == ';' else self.parse_expression()
+            self.expect(';')
+            steps = self.parse_expression_list(')')
+            self.expect(')')
+            return ('for', initial, condition, steps, self.parse_statement())
+        if value == 'return':
+            self.take()
+            expression = None if self.peek() == ';' else self.parse_expression()
+            self.expect(';')
+            return ('return', expression)
+        if value == 'state':
+            self.take()
+            name = self.take_name()
+            self.expect(';')
+            return ('state', name)
+        if value == 'jump':
+            self.take()
+            label = self.take_name()
+            self.expect(';')
+            return ('jump', label)
+        if value == '@':
+            self.take()
+            label = self.take_name()
+            if self.peek() == ';':
+                self.take()
+            return ('label', label)
+        expression = self.parse_expression()
+        self.expect(';')
+        return ('expr', expression)
+
+    def parse_condition(self):
+        self.expect('(')
+        condition = self.parse_expression()
+        self.expect(')')
+        return condition
+
+    def parse_expression_list(self, end):
+        expressions = []
+        while self.peek() != end:
+            expressions.append(self.parse_expression())
+            if self.peek() == ',':
+                self.take()
+            elif self.peek() != end:
+                self.error(f"expected ',' or '{end}', found '{self.peek()}'")
+        return expressions
+
+    def parse_expression(self):
+        left = self.parse_binary(0)
+        if self.peek() in ASSIGN_OPS:
+            if left[0] not in ('var', 'member'):
+                self.error("cannot assign to an expression")
+            token = self.take()
+            return ('assign', token.value, left, self.parse_expression(), token.line)
+        return left
+
+    def parse_binary(self, level):
+        if level == len(BINARY_LEVELS):
+            return self.parse_unary()
+        left = self.parse_binary(level + 1)
+        operators = BINARY_LEVELS[level]
+        while self.peek() in operators and self.code[self.index].kind != STRING:
+            token = self.take()
+            right = self.parse_binary(level + 1)
+            left = ('bin', token.value, left, right, token.line)
+        return left
+
+    def parse_unary(self):
+        value = self.peek()
+        if value in ('-', '!', '~'):
+            self.take()
+            operand = self.parse_unary()
+            if value == '-' and operand[0] == 'const' and isinstance(operand[1], (int, float)):
+                number = operand[1]
+                return ('const', wrap32(-number) if isinstance(number, int) else -number)
+            return ('un', value, operand)
+        if value in ('++', '--'):
+            self.take()
+            target = self.parse_unary()
+            if target[0] not in ('var', 'member'):
+                self.error(f"'{value}' needs a variable")
+            return ('pre', value, target)
+        if value == '(' and self.is_type(1) and self.peek(2) == ')':
+            type_name = self.peek(1)
+            self.index += 3
+            return ('cast', type_name, self.parse_unary())
+        return self.parse_postfix()
+
+    def parse_postfix(self):
+        node = self.parse_primary()
+        if self.peek() == '.':
+            self.take()
+            field = self.take_name()
+            if field not in ('x', 'y', 'z', 's'):
+                self.error(f"unknown component '.{field}'")
+            node = ('member', node, 'xyzs'.index(field))
+        if self.peek() in ('++', '--'):
+            if node[0] not in ('var', 'member'):
+                self.error(f"'{self.peek()}' needs a variable")
+            return ('post', self.take().value, node)
+        return node
+
+    def parse_primary(self):
+        token = self.take()
+        kind, value = token.kind, token.value
+        if kind == NUMBER:
+            return ('const', parse_number(value))
+        if kind == STRING:
+            return ('const', unescape(value))
+        if kind == IDENT:
+            if self.peek() == '(':
+                self.take()
+                args = self.parse_expression_list(')')
+                self.expect(')')
+                return ('call', value, args, token.line)
+            return ('var', value, token.line)
+        if value == '(':
+            node = self.parse_expression()
+            self.expect(')')
+            return node
+        if value == '[':
+            items = self.parse_expression_list(']')
+            self.expect(']')
+            return ('list', items)
+        if value == '<':
+            items = [self.parse_binary(VECTOR_LEVEL)]
+            while self.peek() == ',':
+                self.take()
+                items.append(self.parse_binary(VECTOR_LEVEL))
+            self.expect('>')
+            if len(items) not in (3, 4):
+                self.error("vectors have 3 components and rotations 4")
+            return ('vec', items)
+        self.index -= 1
+        self.error(f"unexpected '{value}'")
+
+
+def load_program(path, include_path=()):
+    """Preprocess (with headers inlined) and parse one script"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    name = os.path.basename(path)
+    source = LexedSource(content, Preprocessor(include_path, inline_includes=True), path)
+    for severity, _, line, message in source.preprocessed.diagnostics:
+        if severity == 'error':
+            raise SimulationError(f"{name}:{line}: {message}")
+    program = Parser(source.code, name).parse()
+    program.macros = source.preprocessed.macros
+    return program
+
+
+class HandlerCost:
+    """What one handler cost over the whole replay"""
+    __slots__ = ('calls', 'ops', 'll_calls', 'll_cost', 'list_copy', 'peak_list', 'peak_string')
+
+    def __init__(self):
+        self.calls = 0
+        self.ops = 0
+        self.ll_calls = 0
+        self.ll_cost = 0.0
+        self.list_copy = 0
+        self.peak_list = 0
+        self.peak_string = 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Script:
+    """One running script: globals, current state, listeners and its timer"""
+
+    def __init__(self, sim, program, link):
+        self.sim = sim
+        self.program = program
+        self.name = program.name
+        self.link = link
+        self.key = sim.new_key()
+        self.globals = {}
+        self.state = 'default'
+        self.scopes = []
+        self.depth = 0
+        self.listens = {}         # handle -> [channel, name, key, message, active]
+        self.next_handle = 1
+        self.timer_interval = 0.0
+        self.timer_due = None
+        self.time_base = 0.0
+        self.detected = ()
+        self.crashed = None
+        self.cost = HandlerCost()
+        self.event_ops = 0
+        self.evaluators = {
+            'var': self.eval_var, 'call': self.eval_call, 'bin': self.eval_binary,
+            'un': self.eval_unary, 'cast': self.eval_cast, 'assign': self.eval_assign,
+            'pre': self.eval_step, 'post': self.eval_step, 'list': self.eval_list,
+            'vec': self.eval_vector, 'member': self.eval_member,
+        }
+
+    # -- lifecycle -----------------------------------------------------
+
+    def reset(self):
+        """Fresh globals, default state and a queued state_entry"""
+        self.cost = HandlerCost()       # Initialisers are not charged to a handler
+        self.event_ops = 0
+        self.globals = {}
+        for type_name, name, expression in self.program.globals:
+            value = DEFAULTS[type_name] if expression is None else coerce(type_name, self.evaluate(expression))
+            self.globals[name] = Var(type_name, value)
+        self.state = 'default'
+        self.listens = {}
+        self.timer_interval = 0.0
+        self.timer_due = None
+        self.time_base = self.sim.clock
+        self.sim.drop_events(self)
+        self.sim.post(self, 'state_entry', [])
+
+    def change_state(self, target):
+        if target not in self.program.states:
+            raise SimulationError(f"{self.name}: no state '{target}'")
+        if target == self.state:
+            return
+        self.dispatch('state_exit', [])
+        self.state = target
+        self.listens = {}
+        self.sim.drop_events(self)
+        self.sim.post(self, 'state_entry', [])
+
+    def handles(self, event):
+        return self.crashed is None and event in self.program.states[self.state]
+
+    def dispatch(self, event, args, detected=()):
+        """Run the handler for `event` in the current state; False if there is none"""
+        if not self.handles(event):
+            return False
+        handler = self.program.states[self.state][event]
+        self.cost = self.sim.cost_for(self, f"{self.state}.{event}")
+        self.cost.calls += 1
+        self.event_ops = 0
+        self.detected = detected
+        scope = {}
+        for (type_name, name), value in zip(handler.params, args):
+            scope[name] = Var(type_name, coerce(type_name, value))
+        self.scopes = [scope]
+        try:
+            self.run_block(handler.body)
+        except _Return:
+            pass
+        except _StateChange as change:
+            if event != 'state_exit':
+                self.change_state(change.state)
+        except _Reset:
+            self.reset()
+        except ScriptError as e:
+            self.crashed = f"{e} in {self.state}.{event}"
+            self.sim.errors.append(f"{self.name}: {self.crashed}")
+        finally:
+            self.scopes = []
+            self.detected = ()
+        return True
+
+    # -- names ---------------------------------------------------------
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            var = scope.get(name)
+            if var is not None:
+                return var
+        return self.globals.get(name)
+
+    def resolve(self, name):
+        """Current value of a global, #define or LSL constant, or None"""
+        var = self.globals.get(name)
+        if var is not None:
+            return var.value
+        value = self.macro_value(name)
+        return CONSTANTS.get(name) if value is None else value
+
+    def macro_value(self, name):
+        """Value of an object-like #define, evaluated outside any handler"""
+        macro = self.program.macros.get(name)
+        if macro is None or macro.params is not None or not macro.body:
+            return None
+        saved = self.cost
+        self.cost = HandlerCost()
+        try:
+            return self.evaluate(Parser(list(macro.body), self.name).parse_expression())
+        finally:
+            self.cost = saved
+
+    # -- statements ----------------------------------------------------
+
+    def run_block(self, block):
+        statements, labels = block[1], block[2]
+        self.scopes.append({})
+        try:
+            index = 0
+            count = len(statements)
+            while index < count:
+                try:
+                    self.execute(statements[index])
+                except _Jump as jump:
+                    if jump.label not in labels:
+                        raise
+                    index = labels[jump.label]
+                index += 1
+        finally:
+            self.scopes.pop()
+
+    def execute(self, node):
+        kind = node[0]
+        if kind == 'expr':
+            self.evaluate(node[1])
+        elif kind == 'if':
+            if truth(self.evaluate(node[1])):
+                self.execute(node[2])
+            elif node[3] is not None:
+                self.execute(node[3])
+        elif kind == 'block':
+            self.run_block(node)
+        elif kind == 'decl':
+            type_name = node[1]
+            value = DEFAULTS[type_name] if node[3] is None else coerce(type_name, self.evaluate(node[3]))
+            self.scopes[-1][node[2]] = Var(type_name, value)
+            self.note(value)
+        elif kind == 'for':
+            for expression in node[1]:
+                self.evaluate(expression)
+            while node[2] is None or truth(self.evaluate(node[2])):
+                self.execute(node[4])
+                for expression in node[3]:
+                    self.evaluate(expression)
+        elif kind == 'while':
+            while truth(self.evaluate(node[1])):
+                self.execute(node[2])
+        elif kind == 'do':
+            self.execute(node[1])
+            while truth(self.evaluate(node[2])):
+                self.execute(node[1])
+        elif kind == 'return':
+            raise _Return(None if node[1] is None else self.evaluate(node[1]))
+        elif kind == 'state':
+            raise _StateChange(node[1])
+        elif kind == 'jump':
+            raise _Jump(node[1])
+
+    # -- expressions ---------------------------------------------------
+
+    def evaluate(self, node):
+        if node[0] == 'const':
+            return node[1]
+        self.cost.ops += 1
+        self.event_ops += 1
+        if self.event_ops > MAX_OPS_PER_EVENT:
+            raise ScriptError(f"more than {MAX_OPS_PER_EVENT:,} operations in one event (endless loop?)")
+        return self.evaluators[node[0]](node)
+
+    def note(self, value):
+        """Track the largest list and string a handler builds"""
+        if isinstance(value, list):
+            if len(value) > self.cost.peak_list:
+                self.cost.peak_list = len(value)
+        elif isinstance(value, str):
+            if len(value) > self.cost.peak_string:
+                self.cost.peak_string = len(value)
+
+    def eval_var(self, node):
+        var = self.lookup(node[1])
+        if var is not None:
+            return var.value
+        value = CONSTANTS.get(node[1])
+        if value is None:
+            value = self.macro_value(node[1])
+        if value is not None:
+            return value
+        if node[1].isupper():
+            self.sim.unknown_constants.add(node[1])
+            return 0
+        raise SimulationError(f"{self.name}:{node[2]}: '{node[1]}' is not defined")
+
+    def eval_list(self, node):
+        value = [self.evaluate(item) for item in node[1]]
+        for element in value:
+            if isinstance(element, list):
+                raise ScriptError("lists cannot contain lists")
+        return value
+
+    def eval_vector(self, node):
+        components = [lsl_float(self.evaluate(item)) for item in node[1]]
+        return Vector(components) if len(components) == 3 else Rotation(components)
+
+    def eval_member(self, node):
+        value = self.evaluate(node[1])
+        if not isinstance(value, (Vector, Rotation)) or node[2] >= len(value):
+            raise SimulationError(f"{self.name}: component access on a non-vector")
+        return value[node[2]]
+
+    def eval_cast(self, node):
+        value = cast(node[1], self.evaluate(node[2]))
+        self.note(value)
+        return value
+
+    def eval_unary(self, node):
+        value = self.evaluate(node[2])
+        op = node[1]
+        if op == '!':
+            return int(not truth(value))
+        if op == '~':
+            return wrap32(~value)
+        if isinstance(value, int):
+            return wrap32(-value)
+        if isinstance(value, (Vector, Rotation)):
+            return type(value)(-c for c in value)
+        return -value
+
+    def eval_binary(self, node):
+        # LSL evaluates the right operand first, and && / || never short-circuit
+        right = self.evaluate(node[3])
+        left = self.evaluate(node[2])
+        return self.binary(node[1], left, right)
+
+    def binary(self, op, left, right):
+        if op == '+':
+            if isinstance(left, list) or isinstance(right, list):
+                result = (left if isinstance(left, list) else [left]) + \
+                         (right if isinstance(right, list) else [right])
+                self.cost.list_copy += len(result)
+                self.note(result)
+                return result
+            if isinstance(left, str):
+                if not isinstance(right, str):
+                    raise SimulationError(f"{self.name}: cannot add {type(right).__name__} to a string")
+                result = left + right
+                self.note(result)
+                return result
+        if isinstance(left, (Vector, Rotation)) or isinstance(right, (Vector, Rotation)):
+            return self.vector_binary(op, left, right)
+        if op in ('==', '!='):
+            if isinstance(left, list) and isinstance(right, list):
+                # List comparison only looks at the lengths
+                difference = len(left) - len(right)
+                return int(difference == 0) if op == '==' else difference
+            equal = (str(left) == str(right)) if isinstance(left, str) else (left == right)
+            return int(equal) if op == '==' else int(not equal)
+        if op == '&&':
+            return int(truth(left) and truth(right))
+        if op == '||':
+            return int(truth(left) or truth(right))
+        if op == '<':
+            return int(left < right)
+        if op == '<=':
+            return int(left <= right)
+        if op == '>':
+            return int(left > right)
+        if op == '>=':
+            return int(left >= right)
+        integers = isinstance(left, int) and isinstance(right, int)
+        if op == '+':
+            return wrap32(left + right) if integers else left + right
+        if op == '-':
+            return wrap32(left - right) if integers else left - right
+        if op == '*':
+            return wrap32(left * right) if integers else left * right
+        if op == '/':
+            if right == 0:
+                raise ScriptError("Math Error: division by zero")
+            if integers:
+                quotient = abs(left) // abs(right)
+                return wrap32(quotient if (left < 0) == (right < 0) else -quotient)
+            return left / right
+        if op == '%':
+            if right == 0:
+                raise ScriptError("Math Error: modulo by zero")
+            return left - right * int(left / right) if integers else math.fmod(left, right)
+        if op == '&':
+            return left & right
+        if op == '|':
+            return left | right
+        if op == '^':
+            return left ^ right
+        if op == '<<':
+            return wrap32(left << (right & 31))
+        if op == '>>':
+            return left >> (right & 31)
+        raise SimulationError(f"{self.name}: unsupported operator '{op}'")
+
+    def vector_binary(self, op, left, right):
+        if isinstance(left, Vector) and isinstance(right, Vector):
+            if op == '+':
+                return Vector(a + b for a, b in zip(left, right))
+            if op == '-':
+                return Vector(a - b for a, b in zip(left, right))
+            if op == '*':
+                return float(sum(a * b for a, b in zip(left, right)))
+            if op == '==':
+                return int(left == right)
+            if op == '!=':
+                return int(left != right)
+        if isinstance(left, Vector) and isinstance(right, (int, float)):
+            if op == '*':
+                return Vector(c * right for c in left)
+            if op == '/':
+                if right == 0:
+                    raise ScriptError("Math Error: division by zero")
+                return Vector(c / right for c in left)
+        if isinstance(right, Vector) and isinstance(left, (int, float)) and op == '*':
+            return Vector(c * left for c in right)
+        if isinstance(left, Rotation) and isinstance(right, Rotation) and op in ('==', '!='):
+            return int((left == right) == (op == '=='))
+        raise SimulationError(f"{self.name}: unsupported vector/rotation operation '{op}'")
+
+    def store(self, target, value):
+        """Assign to a variable or vector component; returns the stored value"""
+        if target[0] == 'var':
+            var = self.lookup(target[1])
+            if var is None:
+                raise SimulationError(f"{self.name}:{target[2]}: '{target[1]}' is not defined")
+            var.value = coerce(var.type, value)
+            self.note(var.value)
+            return var.value
+        var = self.lookup(target[1][1])
+        components = list(var.value)
+        components[target[2]] = lsl_float(value)
+        var.value = type(var.value)(components)
+        return components[target[2]]
+
+    def eval_assign(self, node):
+        op, target = node[1], node[2]
+        value = self.evaluate(node[3])
+        if op != '=':
+            current = self.evaluate(target)
+            if op == '*=' and isinstance(current, int) and isinstance(value, float):
+                # integer *= float keeps an integer variable
+                value = lsl_integer(current * value)
+            else:
+                value = self.binary(op[0], current, value)
+        return self.store(target, value)
+
+    def eval_step(self, node):
+        target = node[2]
+        current = self.evaluate(target)
+        delta = 1 if node[1] == '++' else -1
+        updated = wrap32(current + delta) if isinstance(current, int) else current + delta
+        self.store(target, updated)
+        return updated if node[0] == 'pre' else current
+
+    def eval_call(self, node):
+        name = node[1]
+        args = [self.evaluate(arg) for arg in node[2]]
+        function = self.program.functions.get(name)
+        if function is not None:
+            return self.call(function, args)
+        return self.sim.library.call(self, name, args)
+
+    def call(self, function, args):
+        if self.depth >= MAX_CALL_DEPTH:
+            raise ScriptError("Stack-Heap Collision (call depth)")
+        scope = {}
+        for (type_name, name), value in zip(function.params, args):
+            scope[name] = Var(type_name, coerce(type_name, value))
+        saved = self.scopes
+        self.scopes = [scope]
+        self.depth += 1
+        value = None
+        try:
+            self.run_block(function.body)
+        except _Return as result:
+            value = result.value
+        finally:
+            self.scopes = saved
+            self.depth -= 1
+        if function.type is None:
+            return None
+        return coerce(function.type, DEFAULTS[function.type] if value is None else value)
+
+
+def _range(length, start, end):
+    """LSL start/end indices (negative from the end) as a Python slice or an exclusion"""
+    if start < 0:
+        start += length
+    if end < 0:
+        end += length
+    return start, end
+
+
+def _sublist(items, start, end):
+    """llList2List / llGetSubString range semantics (inclusive, inverted = exclusion)"""
+    length = len(items)
+    start, end = _range(length, start, end)
+    if start <= end:
+        if start >= length or end < 0:
+            return items[:0]
+        return items[max(start, 0):min(end, length - 1) + 1]
+    # Inverted range keeps both ends and drops the middle
+    return items[:max(end, -1) + 1] + items[max(start, 0):] if start < length else items[:max(end, -1) + 1]
+
+
+def _delete(items, start, end):
+    """llDeleteSubList / llDeleteSubString"""
+    length = len(items)
+    start, end = _range(length, start, end)
+    if start <= end:
+        if start >= length or end < 0:
+            return items
+        return items[:max(start, 0)] + items[min(end, length - 1) + 1:]
+    return items[max(end, -1) + 1:min(start, length)]
+
+
+def _parse_string(source, separators, spacers, keep_nulls):
+    """llParseString2List / llParseStringKeepNulls"""
+    separators = [s for s in map(lsl_string, separators) if s]
+    spacers = [s for s in map(lsl_string, spacers) if s]
+    result = []
+    current = 0
+    index = 0
+    length = len(source)
+    while index < length:
+        found = None
+        for text in separators:
+            if source.startswith(text, index):
+                found = (text, False)
+                break
+        if found is None:
+            for text in spacers:
+                if source.startswith(text, index):
+                    found = (text, True)
+                    break
+        if found is None:
+            index += 1
+            continue
+        piece = source[current:index]
+        if piece or keep_nulls:
+            result.append(piece)
+        if found[1]:
+            result.append(found[0])
+        index += len(found[0])
+        current = index
+    piece = source[current:]
+    if piece or keep_nulls:
+        result.append(piece)
+    return result
+
+
+class Library:
+    """Models of the ll* functions the Peril scripts use.
+
+    Each `ll*` method takes the calling Script and the argument list.
+    Anything without a method returns STUB_RESULTS or 0 and is listed in
+    the report as unmodelled.
+    """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.methods = {}
+
+    def call(self, script, name, args):
+        sim = self.sim
+        cost = script.cost
+        cost.ll_calls += 1
+        cost.ll_cost += sim.weights.get(name, sim.default_weight)
+        method = self.methods.get(name)
+        if method is None:
+            method = getattr(self, name, None) if name.startswith('ll') else None
+            if method is None:
+                if not name.startswith('ll'):
+                    raise SimulationError(f"{script.name}: call to undefined function '{name}'")
+                sim.unmodelled.add(name)
+                result = STUB_RESULTS.get(name, 0)
+                return list(result) if isinstance(result, list) else result
+            self.methods[name] = method
+        result = method(script, args)
+        if name in LIST_COPYING:
+            cost.list_copy += len(result)
+        script.note(result)
+        return result
+
+    # -- lists ---------------------------------------------------------
+
+    @staticmethod
+    def _element(items, index):
+        if index < 0:
+            index += len(items)
+        return items[index] if 0 <= index < len(items) else None
+
+    def llGetListLength(self, script, args):
+        return len(args[0])
+
+    def llList2String(self, script, args):
+        element = self._element(args[0], args[1])
+        return '' if element is None else lsl_string(element)
+
+    def llList2Integer(self, script, args):
+        element = self._element(args[0], args[1])
+        return 0 if element is None or isinstance(element, (Vector, Rotation)) else lsl_integer(element)
+
+    def llList2Float(self, script, args):
+        element = self._element(args[0], args[1])
+        return 0.0 if element is None or isinstance(element, (Vector, Rotation)) else lsl_float(element)
+
+    def llList2Key(self, script, args):
+        element = self._element(args[0], args[1])
+        return Key(element) if isinstance(element, str) else NULL_KEY
+
+    def llList2Vector(self, script, args):
+        element = self._element(args[0], args[1])
+        return element if isinstance(element, Vector) else lsl_vector(element) if isinstance(element, str) \
+            else ZERO_VECTOR
+
+    def llList2Rot(self, script, args):
+        element = self._element(args[0], args[1])
+        return element if isinstance(element, Rotation) else lsl_vector(element, 4) if isinstance(element, str) \
+            else ZERO_ROTATION
+
+    def llList2List(self, script, args):
+        return _sublist(args[0], args[1], args[2])
+
+    def llDeleteSubList(self, script, args):
+        return _delete(args[0], args[1], args[2])
+
+    def llListReplaceList(self, script, args):
+        items, replacement, start, end = args
+        start, end = _range(len(items), start, end)
+        if start > end:
+            return replacement + items[end + 1:start] if start < len(items) else replacement
+        start = max(start, 0)
+        return items[:start] + replacement + items[end + 1:]
+
+    def llListInsertList(self, script, args):
+        items, inserted, position = args
+        if position < 0:
+            position = max(position + len(items), 0)
+        return items[:position] + inserted + items[position:]
+
+    def llListFindList(self, script, args):
+        items, wanted = args
+        if not wanted:
+            return 0
+        size = len(wanted)
+        first = wanted[0]
+        for index in range(len(items) - size + 1):
+            if same_element(items[index], first) and \
+                    all(same_element(items[index + offset], wanted[offset]) for offset in range(1, size)):
+                return index
+        return -1
+
+    def llList2CSV(self, script, args):
+        return ', '.join(lsl_string(element) for element in args[0])
+
+    def llCSV2List(self, script, args):
+        text = args[0]
+        items = []
+        depth = 0
+        current = []
+        for char in text:
+            if char == '<':
+                depth += 1
+            elif char == '>' and depth:
+                depth -= 1
+            elif char == ',' and not depth:
+                items.append(''.join(current).strip())
+                current = []
+                continue
+            current.append(char)
+        if text:
+            items.append(''.join(current).strip())
+        return items
+
+    def llDumpList2String(self, script, args):
+        return lsl_string(args[1]).join(lsl_string(element) for element in args[0])
+
+    def llParseString2List(self, script, args):
+        return _parse_string(args[0], args[1], args[2], False)
+
+    def llParseStringKeepNulls(self, script, args):
+        return _parse_string(args[0], args[1], args[2], True)
+
+    def llListSort(self, script, args):
+        items, stride, ascending = args
+        stride = max(stride, 1)
+        if len(items) % stride:
+            return list(items)
+        groups = [items[i:i + stride] for i in range(0, len(items), stride)]
+        groups.sort(key=lambda group: (type(group[0]).__name__, group[0]), reverse=not ascending)
+        return [element for group in groups for element in group]
+
+    def llListRandomize(self, script, args):
+        items, stride = args
+        stride = max(stride, 1)
+        if len(items) % stride:
+            return list(items)
+        groups = [items[i:i + stride] for i in range(0, len(items), stride)]
+        self.sim.random.shuffle(groups)
+        return [element for group in groups for element in group]
+
+    def llGetListEntryType(self, script, args):
+        element = self._element(args[0], args[1])
+        for kind, code in ((Key, 4), (str, 3), (float, 2), (int, 1), (Vector, 5), (Rotation, 6)):
+            if isinstance(element, kind):
+                return code
+        return 0
+
+    # -- strings -------------------------------------------------------
+
+    def llStringLength(self, script, args):
+        return len(args[0])
+
+    def llGetSubString(self, script, args):
+        return _sublist(args[0], args[1], args[2])
+
+    def llDeleteSubString(self, script, args):
+        return _delete(args[0], args[1], args[2])
+
+    def llInsertString(self, script, args):
+        text, position, inserted = args
+        return text[:max(position, 0)] + inserted + text[max(position, 0):]
+
+    def llSubStringIndex(self, script, args):
+        return args[0].find(args[1])
+
+    def llToUpper(self, script, args):
+        return args[0].upper()
+
+    def llToLower(self, script, args):
+        return args[0].lower()
+
+    def llStringTrim(self, script, args):
+        text, mode = args
+        if mode & 1:
+            text = text.lstrip()
+        if mode & 2:
+            text = text.rstrip()
+        return text
+
+    def llReplaceSubString(self, script, args):
+        text, pattern, replacement, count = args
+        return text.replace(pattern, replacement, count if count > 0 else -1) if pattern else text
+
+    def llMD5String(self, script, args):
+        return hashlib.md5(f"{args[0]}:{args[1]}".encode('utf-8')).hexdigest()
+
+    def llSHA1String(self, script, args):
+        return hashlib.sha1(args[0].encode('utf-8')).hexdigest()
+
+    def llEscapeURL(self, script, args):
+        return quote(args[0], safe='')
+
+    def llUnescapeURL(self, script, args):
+        return unquote(args[0])
+
+    # -- math ----------------------------------------------------------
+
+    def llAbs(self, script, args):
+        return wrap32(abs(args[0]))
+
+    def llFabs(self, script, args):
+        return abs(float(args[0]))
+
+    def llFloor(self, script, args):
+        return lsl_integer(float(math.floor(args[0])))
+
+    def llCeil(self, script, args):
+        return lsl_integer(float(math.ceil(args[0])))
+
+    def llRound(self, script, args):
+        return lsl_integer(float(math.floor(args[0] + 0.5)))
+
+    def llFrand(self, script, args):
+        return self.sim.random.random() * args[0]
+
+    def llPow(self, script, args):
+        try:
+            return float(math.pow(args[0], args[1]))
+        except (ValueError, OverflowError):
+            return math.nan
+
+    def llSqrt(self, script, args):
+        return math.sqrt(args[0]) if args[0] >= 0 else math.nan
+
+    def llVecMag(self, script, args):
+        return math.sqrt(sum(c * c for c in args[0]))
+
+    def llVecDist(self, script, args):
+        return math.sqrt(sum((a - b) ** 2 for a, b in zip(args[0], args[1])))
+
+    # -- identity, time and memory ------------------------------------
+
+    def llGetOwner(self, script, args):
+        return self.sim.owner
+
+    def llGetKey(self, script, args):
+        return script.key
+
+    def llGenerateKey(self, script, args):
+        return self.sim.new_key()
+
+    def llGetScriptName(self, script, args):
+        return os.path.splitext(script.name)[0]
+
+    def llGetObjectName(self, script, args):
+        return self.sim.links.get(script.link, 'Object')
+
+    def llGetLinkNumber(self, script, args):
+        return script.link
+
+    def llGetNumberOfPrims(self, script, args):
+        return max([s.link for s in self.sim.scripts] + [int(n) for n in self.sim.links] + [1])
+
+    def llGetLinkName(self, script, args):
+        return self.sim.links.get(args[0], '')
+
+    def llGetLinkKey(self, script, args):
+        return self.sim.link_key(args[0])
+
+    def llGetUnixTime(self, script, args):
+        return int(self.sim.epoch + self.sim.clock)
+
+    def llGetTime(self, script, args):
+        return float(self.sim.clock - script.time_base)
+
+    def llResetTime(self, script, args):
+        script.time_base = self.sim.clock
+
+    def llGetAndResetTime(self, script, args):
+        elapsed = self.sim.clock - script.time_base
+        script.time_base = self.sim.clock
+        return float(elapsed)
+
+    def llGetFreeMemory(self, script, args):
+        return 32768
+
+    def llGetUsedMemory(self, script, args):
+        return 32768
+
+    def llGetMemoryLimit(self, script, args):
+        return 65536
+
+    # -- events --------------------------------------------------------
+
+    def llSetTimerEvent(self, script, args):
+        seconds = float(args[0])
+        script.timer_interval = seconds if seconds > 0 else 0.0
+        script.timer_due = self.sim.clock + seconds if seconds > 0 else None
+
+    def llSleep(self, script, args):
+        if args[0] > 0:
+            self.sim.clock += float(args[0])
+
+    def llResetScript(self, script, args):
+        raise _Reset()
+
+    def llDetectedKey(self, script, args):
+        return Key(self._detected(script, args[0]).get('key', NULL_KEY))
+
+    def llDetectedName(self, script, args):
+        return str(self._detected(script, args[0]).get('name', ''))
+
+    def llDetectedLinkNumber(self, script, args):
+        return int(self._detected(script, args[0]).get('link', script.link))
+
+    def llDetectedTouchFace(self, script, args):
+        return int(self._detected(script, args[0]).get('face', 0))
+
+    def _detected(self, script, index):
+        return script.detected[index] if 0 <= index < len(script.detected) else {}
+
+    # -- communication -------------------------------------------------
+
+    def llMessageLinked(self, script, args):
+        self.sim.link_message(script, args[0], args[1], lsl_string(args[2]), Key(lsl_string(args[3])))
+
+    def llSay(self, script, args):
+        self.sim.say(script, args[0], lsl_string(args[1]))
+
+    llWhisper = llShout = llRegionSay = llSay
+
+    def llRegionSayTo(self, script, args):
+        self.sim.say(script, args[1], lsl_string(args[2]), target=args[0])
+
+    def llOwnerSay(self, script, args):
+        self.sim.log(f"💬 {script.name} to owner: {args[0]}")
+
+    def llDialog(self, script, args):
+        buttons = ', '.join(lsl_string(button) for button in args[2])
+        self.sim.log(f"🗨️  {script.name} dialog on {args[3]}: [{buttons}]")
+
+    def llTextBox(self, script, args):
+        self.sim.log(f"🗨️  {script.name} text box on {args[2]}")
+
+    def llListen(self, script, args):
+        if len(script.listens) >= MAX_LISTENS:
+            raise ScriptError(f"Too many listens (more than {MAX_LISTENS} open)")
+        handle = script.next_handle
+        script.next_handle += 1
+        channel, name, key, message = args
+        script.listens[handle] = [channel, name, lsl_string(key), message, True]
+        return handle
+
+    def llListenRemove(self, script, args):
+        script.listens.pop(args[0], None)
+
+    def llListenControl(self, script, args):
+        listen = script.listens.get(args[0])
+        if listen is not None:
+            listen[4] = bool(args[1])
+
+
+class Simulation:
+    """A linkset of scripts sharing a clock, an owner and one event queue"""
+
+    def __init__(self, weights=None, seed=1, trace=False):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.default_weight = DEFAULT_WEIGHT
+        if weights:
+            weights = dict(weights)
+            self.default_weight = float(weights.pop('default', DEFAULT_WEIGHT))
+            self.weights.update(weights)
+        self.random = random.Random(seed)
+        self.library = Library(self)
+        self.scripts = []
+        self.links = {}           # link number -> prim name
+        self.link_keys = {}
+        self.clock = 0.0
+        self.epoch = 1700000000
+        self.queue = deque()
+        self.costs = {}           # (script, "state.event") -> HandlerCost
+        self.unmodelled = set()
+        self.unknown_constants = set()
+        self.errors = []
+        self.dispatched = 0
+        self.trace = trace
+        self.owner = self.new_key()
+
+    def new_key(self):
+        return Key('%08x-%04x-%04x-%04x-%012x' % (
+            self.random.getrandbits(32), self.random.getrandbits(16), self.random.getrandbits(16),
+            self.random.getrandbits(16), self.random.getrandbits(48)))
+
+    def link_key(self, link):
+        if link not in self.link_keys:
+            self.link_keys[link] = self.new_key()
+        return self.link_keys[link]
+
+    def log(self, message):
+        if self.trace:
+            print(f"   [{self.clock:8.2f}s] {message}")
+
+    def add_script(self, program, link=1):
+        script = Script(self, program, link)
+        self.scripts.append(script)
+        return script
+
+    def cost_for(self, script, handler):
+        key = (script.name, handler)
+        cost = self.costs.get(key)
+        if cost is None:
+            cost = self.costs[key] = HandlerCost()
+        return cost
+
+    def start(self):
+        """Reset every script (state_entry at t=0) and settle"""
+        for script in self.scripts:
+            script.reset()
+        self.settle()
+
+    # -- the event queue -----------------------------------------------
+
+    def post(self, script, event, args, detected=()):
+        self.queue.append((script, event, args, detected))
+
+    def drop_events(self, script):
+        if any(item[0] is script for item in self.queue):
+            self.queue = deque(item for item in self.queue if item[0] is not script)
+
+    def settle(self):
+        """Run queued events until the linkset is idle"""
+        handled = 0
+        while self.queue:
+            script, event, args, detected = self.queue.popleft()
+            if script.dispatch(event, args, detected):
+                self.dispatched += 1
+                handled += 1
+                if handled > MAX_EVENTS_PER_STEP:
+                    raise SimulationError(f"more than {MAX_EVENTS_PER_STEP:,} events without settling "
+                                          f"(last: {script.name} {event})")
+
+    def advance(self, seconds):
+        """Move the clock forward, firing timers as they come due"""
+        target = self.clock + seconds
+        while True:
+            due = [s for s in self.scripts if s.timer_due is not None and s.timer_due <= target
+                   and s.crashed is None]
+            if not due:
+                break
+            script = min(due, key=lambda s: s.timer_due)
+            self.clock = max(self.clock, script.timer_due)
+            script.timer_due = self.clock + script.timer_interval
+            self.log(f"⏰ {script.name} timer")
+            self.post(script, 'timer', [])
+            self.settle()
+        self.clock = max(self.clock, target)
+
+    # -- messages --------------------------------------------------------
+
+    def link_message(self, sender, target, num, text, key):
+        self.log(f"🔗 {sender.name} -> {target}: {num} {text[:60]!r}")
+        for script in self.scripts:
+            link = script.link
+            if (target == -1 or (target == -2 and link != sender.link) or (target == -3 and link > 1)
+                    or (target == -4 and link == sender.link) or target == link):
+                if script.handles('link_message'):
+                    self.post(script, 'link_message', [sender.link, num, text, key])
+
+    def say(self, sender, channel, message, target=None):
+        """Chat from a script to the listeners in the other prims"""
+        name = self.links.get(sender.link, 'Object')
+        key = self.link_key(sender.link)
+        self.log(f"📣 {sender.name} on {channel}: {message[:60]!r}")
+        for script in self.scripts:
+            if script.link == sender.link:
+                continue          # A prim does not hear its own chat
+            if target is not None and target != self.link_key(script.link):
+                continue
+            self.hear(script, channel, name, key, message)
+
+    def hear(self, script, channel, name, key, message):
+        if not script.handles('listen'):
+            return
+        for listen_channel, listen_name, listen_key, listen_message, active in script.listens.values():
+            if (active and listen_channel == channel and listen_name in ('', name)
+                    and listen_key in ('', NULL_KEY, key) and listen_message in ('', message)):
+                self.post(script, 'listen', [channel, name, Key(key), message])
+                return
+
+    # -- scenarios -------------------------------------------------------
+
+    def targets(self, name):
+        if name is None:
+            return list(self.scripts)
+        found = [s for s in self.scripts if s.name == name or os.path.splitext(s.name)[0] == name]
+        if not found:
+            raise SimulationError(f"scenario names unknown script '{name}'")
+        return found
+
+    def argument(self, script, value):
+        """Scenario argument: "$NAME" resolves in `script`, "owner" is the owner key"""
+        if isinstance(value, str) and value.startswith('$'):
+            resolved = script.resolve(value[1:])
+            if resolved is None:
+                raise SimulationError(f"{script.name}: cannot resolve {value}")
+            return resolved
+        if value == 'owner':
+            return self.owner
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    def run(self, steps):
+        """Replay a list of scenario steps"""
+        for step in steps:
+            if 'repeat' in step:
+                for _ in range(int(step['repeat'])):
+                    self.run(step.get('events', []))
+                continue
+            if 'advance' in step:
+                self.advance(float(step['advance']))
+                continue
+            event = step.get('event')
+            if event is None:
+                raise SimulationError(f"scenario step without 'event': {step}")
+            if event == 'chat':
+                self.chat(step)
+            else:
+                detected = [{k: self.argument(self.scripts[0], v) for k, v in d.items()}
+                            for d in step.get('detected', [])]
+                for script in self.targets(step.get('script')):
+                    if script.handles(event):
+                        args = [self.argument(script, value) for value in step.get('args', [])]
+                        self.log(f"▶️  {script.name} {event} {args}")
+                        self.post(script, event, args, detected)
+            self.settle()
+
+    def chat(self, step):
+        """An avatar (or object) speaking; "$NAME" channels resolve per listening script"""
+        name = step.get('name', 'Resident')
+        key = lsl_string(self.argument(self.scripts[0], step.get('key', self.owner)))
+        message = step.get('message', '')
+        self.log(f"🗣️  {name} on {step.get('channel')}: {message!r}")
+        for script in self.targets(step.get('script')):
+            channel = step.get('channel', 0)
+            if isinstance(channel, str) and channel.startswith('$'):
+                channel = script.resolve(channel[1:])
+                if channel is None:
+                    continue
+            self.hear(script, channel, name, key, message)
+
+
+def load_scenario(path):
+    """Read a scenario file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        scenario = json.load(f)
+    if not isinstance(scenario, dict) or not scenario.get('scripts'):
+        raise SimulationError(f"{path}: scenario needs a 'scripts' list")
+    return scenario
+
+
+def simulate(scenario, base_dir='.', weights=None, include_path=(), trace=False):
+    """Load the scenario's scripts, replay its events and return the Simulation"""
+    sim = Simulation(weights, scenario.get('seed', 1), trace)
+    sim.links = {int(number): name for number, name in scenario.get('links', {}).items()}
+    include_path = tuple(include_path) + tuple(os.path.join(base_dir, d) for d in scenario.get('include_path', ()))
+    for entry in scenario['scripts']:
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        path = os.path.join(base_dir, entry['path'])
+        sim.add_script(load_program(path, include_path), int(entry.get('link', 1)))
+    sim.start()
+    sim.run(scenario.get('events', []))
+    return sim
+
+
+def format_report(sim, title):
+    """Per-handler cost table"""
+    handlers = sorted(sim.costs.items(), key=lambda item: (-item[1].ops, item[0]))
+    report = [f"\n🎲 SIMULATION: {title} - {len(sim.scripts)} scripts, {sim.dispatched:,} events, "
+              f"{sim.clock:,.1f}s simulated"]
+    report.append("=" * 112)
+    report.append(f"{'Handler':<52}{'Calls':>7}{'Ops':>11}{'ll cost':>10}{'List copy':>11}"
+                  f"{'Peak list':>11}{'Peak str':>10}")
+    for (script, handler), cost in handlers:
+        label = f"{os.path.splitext(script)[0]} {handler}"
+        report.append(f"{label[:51]:<52}{cost.calls:>7,}{cost.ops:>11,}{cost.ll_cost:>10,.0f}"
+                      f"{cost.list_copy:>11,}{cost.peak_list:>11,}{cost.peak_string:>10,}")
+    totals = HandlerCost()
+    for cost in sim.costs.values():
+        totals.calls += cost.calls
+        totals.ops += cost.ops
+        totals.ll_cost += cost.ll_cost
+        totals.list_copy += cost.list_copy
+        totals.peak_list = max(totals.peak_list, cost.peak_list)
+        totals.peak_string = max(totals.peak_string, cost.peak_string)
+    report.append("-" * 112)
+    report.append(f"{'Total':<52}{totals.calls:>7,}{totals.ops:>11,}{totals.ll_cost:>10,.0f}"
+                  f"{totals.list_copy:>11,}{totals.peak_list:>11,}{totals.peak_string:>10,}")
+    if sim.errors:
+        report.append("\n❌ SCRIPT ERRORS:")
+        report.extend(f"   {error}" for error in sim.errors)
+    if sim.unmodelled:
+        report.append(f"\nℹ️  ll* calls stubbed without a model: {', '.join(sorted(sim.unmodelled))}")
+    if sim.unknown_constants:
+        report.append(f"ℹ️  Unknown constants read as 0: {', '.join(sorted(sim.unknown_constants))}")
+    return '\n'.join(report)
+
+
+def cost_records(sim):
+    """{"Script.lsl state.event": metrics} for JSON output and baselines"""
+    return {f"{script} {handler}": cost.to_dict() for (script, handler), cost in sorted(sim.costs.items())}
+
+
+def compare_baseline(records, baseline, threshold):
+    """Print per-handler changes against `baseline`; returns the regressions found"""
+    regressions = []
+    print(f"\n📏 Baseline comparison (threshold {threshold:.0%})")
+    for name in sorted(records):
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"   🆕 {name}: not in baseline")
+            continue
+        for metric in BASELINE_METRICS:
+            old, new = previous.get(metric, 0), records[name][metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            if abs(change) < 0.005:
+                continue
+            marker = "❌" if change > threshold else "✅"
+            print(f"   {marker} {name[:50]:<50} {metric:<10}{old:>12,.0f} -> {new:>12,.0f} ({change:+.0%})")
+            if change > threshold:
+                regressions.append((name, metric))
+    for name in sorted(set(baseline) - set(records)):
+        print(f"   ➖ {name}: no longer called")
+    return regressions
+
+
+def run(args):
+    """Replay a scenario and report; returns the exit code"""
+    try:
+        scenario = load_scenario(args.scenario)
+        weights = None
+        if args.weights:
+            with open(args.weights, 'r', encoding='utf-8') as f:
+                weights = json.load(f)
+        if args.trace:
+            print(f"📜 Trace of {args.scenario}")
+        sim = simulate(scenario, os.path.dirname(os.path.abspath(args.scenario)), weights,
+                       args.include_path, args.trace)
+    except (OSError, ValueError, SimulationError) as e:
+        print(f"❌ ERROR: {e}")
+        return 1
+
+    records = cost_records(sim)
+    if args.format == 'json':
+        print(json.dumps({'scenario': args.scenario, 'events': sim.dispatched, 'clock': sim.clock,
+                          'errors': sim.errors, 'unmodelled': sorted(sim.unmodelled),
+                          'unknown_constants': sorted(sim.unknown_constants),
+                          'handlers': records}, indent=2))
+    else:
+        print(format_report(sim, os.path.basename(args.scenario)))
+
+    status = 1 if sim.errors else 0
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"\n❌ Cannot read baseline {args.baseline}: {e}")
+            return 1
+        regressions = compare_baseline(records, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} handler metric(s) grew beyond {args.threshold:.0%}")
+            status = 1
+        else:
+            print("\n✅ No regressions against baseline")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline written to {args.save_baseline}")
+    return status
+
+
+def parse_args(argv):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(prog='lsl_simulator.py',
+                                     description='Offline LSL event replay with per-handler costs')
+    parser.add_argument('scenario', help='scenario JSON file')
+    parser.add_argument('--weights', metavar='FILE', help='JSON map of ll* function -> cost weight')
+    parser.add_argument('-I', '--include-path', action='append', default=[], metavar='DIR',
+                        help='directory searched for #include files (repeatable)')
+    parser.add_argument('--format', choices=('text', 'json'), default='text')
+    parser.add_argument('--trace', action='store_true', help='log every event, chat and link message')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against stored handler costs')
+    parser.add_argument('--save-baseline', metavar='FILE', help='store these handler costs as a baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, metavar='FRACTION',
+                        help=f'allowed growth before a handler metric counts as a regression '
+                             f'(default: {DEFAULT_THRESHOLD})')
+    return parser.parse_args(argv)
+
+
+def main():
+    sys.exit(run(parse_args(sys.argv[1:])))
+
+if __name__ == "__main__":
+    main()
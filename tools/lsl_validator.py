@@ -7,83 +7,1401 @@ Usage:
     python3 lsl_validator.py filename.lsl      # Validate single file
     python3 lsl_validator.py .                 # Validate all .lsl files in directory
     python3 lsl_validator.py /path/to/dir      # Validate all .lsl files in specified directory
+    python3 lsl_validator.py -j 8 .            # Validate a directory across 8 worker processes
+    python3 lsl_validator.py --no-cache .      # Ignore cached results in .lsl_validator_cache/
+    python3 lsl_validator.py -I ~/lsl/include . # Extra directory for #include lookups
+    python3 lsl_validator.py --link-graph .    # Cross-script link_message traffic report
+    python3 lsl_validator.py --literals .      # Duplicate string/list literals and reclaimable memory
+    python3 lsl_validator.py --watch .         # Revalidate on save (inotify, or --poll)
+    python3 lsl_validator.py --format sarif .  # Machine-readable output (json = NDJSON per file)
+    python3 lsl_validator.py --profile .       # Per-rule timing table (--profile-out for pstats)
+    python3 lsl_validator.py --since origin/main .  # Only scripts changed since a git ref (--changed-lines)
+
+Library:
+    from lsl_validator import validate_source
+    result = validate_source(buffer_text, filename='Game_Manager.lsl')
 """
 
 import os
 import sys
 import re
 import glob
+import time
+import bisect
+import json
+import struct
+import select
+import hashlib
+import argparse
+import cProfile
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
-class LSLValidator:
+# Only the inotify watcher needs ctypes; --watch falls back to polling without it
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+# Token kinds produced by the lexer
+IDENT = 'ident'
+NUMBER = 'number'
+STRING = 'string'
+OP = 'op'
+COMMENT = 'comment'
+PREPROC = 'preproc'
+BAD = 'bad'
+
+# LSL control-flow keywords (never variables)
+LSL_KEYWORDS = frozenset({
+    'if', 'else', 'for', 'while', 'do', 'return', 'jump', 'state', 'default', 'print',
+})
+
+# Common LSL functions and constants for basic validation
+LSL_FUNCTIONS = frozenset({
+    # State management
+    'default', 'state_entry', 'state_exit', 'on_rez',
+    # Events
+    'touch_start', 'touch_end', 'listen', 'timer', 'link_message',
+    'collision_start', 'collision', 'collision_end', 'http_response',
+    'sensor', 'no_sensor', 'control', 'land_collision_start', 'land_collision', 
+    'land_collision_end', 'at_target', 'not_at_target', 'at_rot_target', 
+    'not_at_rot_target', 'money', 'email', 'run_time_permissions', 'changed', 
+    'attach', 'dataserver', 'moving_start', 'moving_end', 'transaction_result', 
+    'path_update', 'remote_data',
+    # String functions
+    'llStringLength', 'llGetSubString', 'llSubStringIndex', 'llToUpper', 'llToLower',
+    'llMD5String', 'llSHA1String', 'llEscapeURL', 'llUnescapeURL',
+    # List functions  
+    'llGetListLength', 'llList2String', 'llList2Integer', 'llList2Float', 'llList2Key',
+    'llList2Vector', 'llList2Rot', 'llDeleteSubList', 'llListReplaceList',
+    'llListFindList', 'llListInsertList', 'llCSV2List', 'llList2CSV',
+    'llParseString2List', 'llDumpList2String', 'llParseStringKeepNulls',
+    # Communication
+    'llSay', 'llWhisper', 'llShout', 'llRegionSay', 'llOwnerSay',
+    'llListen', 'llListenRemove', 'llDialog', 'llMessageLinked',
+    # Object functions
+    'llSetText', 'llSetTexture', 'llGetTexture', 'llSetAlpha', 'llGetAlpha',
+    'llSetColor', 'llGetColor', 'llSetScale', 'llGetScale',
+    'llSetPos', 'llGetPos', 'llSetRot', 'llGetRot',
+    # Avatar functions
+    'llKey2Name', 'llGetDisplayName', 'llRequestDisplayName',
+    'llGetOwner', 'llDetectedKey', 'llDetectedName', 'llGetAgentSize',
+    # Time functions
+    'llGetUnixTime', 'llGetTimestamp', 'llSleep', 'llSetTimerEvent',
+    # Memory functions
+    'llGetUsedMemory', 'llGetFreeMemory', 'llResetScript',
+    # Math functions
+    'llAbs', 'llCeil', 'llFloor', 'llRound', 'llSqrt', 'llPow',
+    'llSin', 'llCos', 'llTan', 'llAsin', 'llAcos', 'llAtan2',
+    'llFrand', 'llGenerateKey',
+    # Type conversion
+    '(string)', '(integer)', '(float)', '(key)', '(vector)', '(rotation)',
+})
+
+LSL_CONSTANTS = frozenset({
+    'TRUE', 'FALSE', 'NULL_KEY', 'EOF', 'ZERO_VECTOR', 'ZERO_ROTATION',
+    'PI', 'PI_BY_TWO', 'TWO_PI', 'DEG_TO_RAD', 'RAD_TO_DEG',
+    'LINK_ROOT', 'LINK_SET', 'LINK_ALL_OTHERS', 'LINK_ALL_CHILDREN', 'LINK_THIS',
+})
+
+# Keywords that are definitely forbidden in LSL (conservative list)
+FORBIDDEN_KEYWORDS = frozenset({
+    'break', 'continue', 'switch', 'case', 'goto', 
+    'class', 'struct', 'enum', 'union', 'namespace'
+})
+
+# LSL data types
+LSL_TYPES = frozenset({
+    'integer', 'float', 'string', 'key', 'vector', 'rotation', 'list'
+})
+
+# Identifier classes. Every rule table is merged into one lookup so each
+# identifier token is classified with a single dict probe instead of a scan
+# over several sets (or, before the tokenizer, one regex per keyword/type).
+TYPE = 'type'
+KEYWORD = 'keyword'
+FORBIDDEN = 'forbidden'
+BUILTIN = 'builtin'
+
+IDENT_CLASS = dict.fromkeys(LSL_FUNCTIONS | LSL_CONSTANTS, BUILTIN)
+IDENT_CLASS.update(dict.fromkeys(FORBIDDEN_KEYWORDS, FORBIDDEN))
+IDENT_CLASS.update(dict.fromkeys(LSL_KEYWORDS, KEYWORD))
+IDENT_CLASS.update(dict.fromkeys(LSL_TYPES, TYPE))
+
+# One master pattern; alternatives are ordered so that comments and strings win
+# over the operators that start them.
+_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<preproc>\#(?:\\\r?\n|[^\n])*)
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>\+\+|--|\+=|-=|\*=|/=|%=|==|!=|<=|>=|&&|\|\||<<|>>|[-+*/%=<>!~&|^(){}\[\];,.@])
+  | (?P<bad>/\*.*|"(?:[^"\\\n]|\\.)*|.)
+''', re.VERBOSE | re.DOTALL)
+
+
+class Token:
+    """A single lexical token with its 1-based line and 0-based column.
+
+    `macro` names the macro whose expansion produced the token, if any.
+    """
+    __slots__ = ('kind', 'value', 'line', 'col', 'macro')
+
+    def __init__(self, kind, value, line, col, macro=None):
+        self.kind = kind
+        self.value = value
+        self.line = line
+        self.col = col
+        self.macro = macro
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r}, {self.line}:{self.col})"
+
+
+def tokenize(content):
+    """Split LSL source into tokens in a single pass.
+
+    Handles line and block comments, strings with escapes, preprocessor
+    lines (including backslash continuations), numbers, identifiers and
+    operators. Whitespace is dropped; everything else keeps its position.
+    """
+    tokens = []
+    append = tokens.append
+    line = 1
+    line_start = 0
+    for match in _TOKEN_RE.finditer(content):
+        kind = match.lastgroup
+        value = match.group()
+        start = match.start()
+        if kind != 'ws':
+            append(Token(kind, value, line, start - line_start))
+        newlines = value.count('\n')
+        if newlines:
+            line += newlines
+            line_start = start + value.rindex('\n') + 1
+    return tokens
+
+
+def match_brackets(code):
+    """(pairs, unmatched openers, unmatched closers) for the brackets in `code`.
+
+    `pairs` maps the index of each matched bracket to its partner's, both ways.
+    """
+    pairs = {}
+    unmatched_open = []
+    unmatched_close = []
+    stack = []
+    for index, token in enumerate(code):
+        if token.kind != OP:
+            continue
+        value = token.value
+        if value in LexedSource.OPENERS:
+            stack.append(index)
+        elif value in LexedSource.CLOSERS:
+            opener = LexedSource.CLOSERS[value]
+            # Recover from a mismatched bracket by unwinding to its opener
+            depth = len(stack) - 1
+            while depth >= 0 and code[stack[depth]].value != opener:
+                depth -= 1
+            if depth < 0:
+                unmatched_close.append(index)
+                continue
+            while len(stack) > depth + 1:
+                unmatched_open.append(stack.pop())
+            open_index = stack.pop()
+            pairs[open_index] = index
+            pairs[index] = open_index
+    unmatched_open.extend(stack)
+    return pairs, unmatched_open, unmatched_close
+
+
+class LexedSource:
+    """Token stream for one file, built once and shared by every rule"""
+
+    OPENERS = {'{': '}', '(': ')', '[': ']'}
+    CLOSERS = {'}': '{', ')': '(', ']': '['}
+
+    def __init__(self, content, preprocessor=None, filepath=''):
+        self.content = content
+        self.lines = content.split('\n')
+        self.tokens = tokenize(content)
+        if preprocessor is not None:
+            # Code after #include/#define/#if processing, at original positions
+            self.preprocessed = preprocessor.process(self.tokens, filepath)
+            self.code = self.preprocessed.code
+        else:
+            # Code tokens only: comments and preprocessor lines are not LSL code
+            self.preprocessed = PreprocessResult()
+            self.code = [t for t in self.tokens if t.kind not in (COMMENT, PREPROC)]
+        # Kind of the first token starting on each line
+        self.line_first = {}
+        for token in self.tokens:
+            self.line_first.setdefault(token.line, token.kind)
+        self._match_brackets()
+        # Built on demand by the rules that need scopes
+        self.symbols = None
+
+    def _match_brackets(self):
+        """Pair every bracket in the code stream by index"""
+        self.pairs, self.unmatched_open, self.unmatched_close = match_brackets(self.code)
+
+    def value_at(self, index):
+        """Return the value of code token `index`, or '' when out of range"""
+        if 0 <= index < len(self.code):
+            return self.code[index].value
+        return ''
+
+    def statement_end(self, index):
+        """Index of the token ending the statement that starts at `index`"""
+        code = self.code
+        last = len(code) - 1
+        value = self.value_at(index)
+        if value == '{':
+            return self.pairs.get(index, last)
+        if value in ('if', 'for', 'while') and self.value_at(index + 1) == '(':
+            close = self.pairs.get(index + 1, last)
+            end = self.statement_end(close + 1)
+            if value == 'if' and self.value_at(end + 1) == 'else':
+                end = self.statement_end(end + 2)
+            return end
+        if value == 'do':
+            return self.statement_end(self.statement_end(index + 1) + 1)
+        while index <= last:
+            token = code[index]
+            if token.kind == OP:
+                if token.value in self.OPENERS:
+                    if index not in self.pairs:
+                        return last
+                    index = self.pairs[index]
+                elif token.value == ';':
+                    return index
+            index += 1
+        return last
+
+    def body_range(self, index):
+        """(start, end) indices of the statement or block starting at `index`"""
+        return index, self.statement_end(index)
+
+
+def call_arguments(source, open_index):
+    """Top-level argument token lists of the call whose '(' is at `open_index`"""
+    close = source.pairs.get(open_index)
+    if close is None:
+        return []
+    args = [[]]
+    index = open_index + 1
+    while index < close:
+        token = source.code[index]
+        if token.value in ('(', '[', '{') and index in source.pairs:
+            args[-1].extend(source.code[index:source.pairs[index] + 1])
+            index = source.pairs[index] + 1
+            continue
+        if token.value == ',':
+            args.append([])
+        else:
+            args[-1].append(token)
+        index += 1
+    return args
+
+
+def collect_global_symbols(code):
+    """Global variables and user functions declared at the top level of `code`.
+
+    Returns (globals, functions, redeclared) where `globals` maps each name to
+    its declaring token and `redeclared` lists tokens of repeated globals.
+    """
+    global_vars = {}
+    functions = set()
+    redeclared = []
+    depth = 0
+    index = 0
+    last = len(code) - 1
+    while index <= last:
+        token = code[index]
+        value = token.value
+        if value == '{':
+            depth += 1
+        elif value == '}':
+            depth -= 1
+        elif depth == 0 and token.kind == IDENT:
+            following = code[index + 1].value if index < last else ''
+            if IDENT_CLASS.get(value) is TYPE and index < last and code[index + 1].kind == IDENT:
+                name_token = code[index + 1]
+                after = code[index + 2].value if index + 1 < last else ''
+                if after == '(':
+                    functions.add(name_token.value)
+                elif after in ('=', ';'):
+                    if name_token.value in global_vars:
+                        redeclared.append(name_token)
+                    else:
+                        global_vars[name_token.value] = name_token
+                index += 2
+                continue
+            if following == '(' and IDENT_CLASS.get(value) is not KEYWORD:
+                functions.add(value)
+        index += 1
+    return global_vars, functions, redeclared
+
+
+class MacroDef:
+    """A #define: `params` is None for object-like macros"""
+    __slots__ = ('name', 'params', 'body')
+
+    def __init__(self, name, params, body):
+        self.name = name
+        self.params = params
+        self.body = body
+
+
+class ParsedHeader:
+    """An #include target, preprocessed once and shared by every includer"""
+    __slots__ = ('path', 'stamp', 'code', 'macros', 'globals', 'functions', 'paths', 'diagnostics',
+                 'names')
+
+    def __init__(self, path, stamp, code, macros, global_vars, functions, paths, diagnostics, names):
+        self.path = path
+        self.code = code
+        self.stamp = stamp
+        self.macros = macros
+        self.globals = global_vars
+        self.functions = functions
+        self.paths = paths
+        self.diagnostics = diagnostics  # (severity, rule, line, message) within the header
+        self.names = names              # Every identifier the header or its includes mention
+
+
+def macro_signature(macro):
+    """Hashable form of a MacroDef, equal for identical definitions"""
+    params = None if macro.params is None else tuple(macro.params)
+    return (macro.name, params, tuple(token.value for token in macro.body))
+
+
+class HeaderCache:
+    """Parsed headers by path, reused while the file on disk is unchanged.
+
+    A header is parsed once on its own, with no macros defined. Includers
+    whose macros the header mentions (e.g. a `#define DEBUG` tested by the
+    header's `#ifdef DEBUG`) get a parse seeded with those macros instead,
+    cached per distinct set of definitions. Entries are also keyed by the
+    include path, which decides how the header's own #includes resolve.
+
+    Safe to share between threads; nested includes re-enter the lock.
+    """
+
+    def __init__(self):
+        self._headers = {}
+        self._lock = threading.RLock()
+
+    def get(self, path, preprocessor, include_stack, macros=None):
+        """ParsedHeader for `path` as seen after `macros`, parsing it on first use"""
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        header = self._parsed((path, preprocessor.include_path), stamp, preprocessor, path,
+                              include_stack, None)
+        context = tuple(sorted(macro_signature(macros[name]) for name in header.names & set(macros or ())))
+        if context:
+            header = self._parsed((path, preprocessor.include_path, context), stamp, preprocessor, path,
+                                  include_stack, macros)
+        return header
+
+    def _parsed(self, key, stamp, preprocessor, path, include_stack, macros):
+        """Cached ParsedHeader under `key`, re-parsed when the stamp changed"""
+        header = self._headers.get(key)
+        if header is None or header.stamp != stamp:
+            with self._lock:
+                header = self._headers.get(key)
+                if header is None or header.stamp != stamp:
+                    header = preprocessor.parse_header(path, stamp, include_stack, macros)
+                    self._headers[key] = header
+        return header
+
+
+# Headers parsed in this process, shared by every validator
+SHARED_HEADERS = HeaderCache()
+
+_DIRECTIVE_RE = re.compile(r'#\s*([A-Za-z_]+)\s*(.*)', re.DOTALL)
+_DEFINE_RE = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)(\([^)]*\))?\s*(.*)', re.DOTALL)
+_CONTINUATION_RE = re.compile(r'\\\r?\n')
+_NAME_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# Binary operator precedence for #if expressions
+_CONDITION_PRECEDENCE = {
+    '||': 1, '&&': 2, '==': 3, '!=': 3, '<': 4, '>': 4, '<=': 4, '>=': 4,
+    '+': 5, '-': 5, '*': 6, '/': 6, '%': 6,
+}
+
+
+class PreprocessResult:
+    """Expanded code plus what the preprocessor learned about a file"""
+
+    def __init__(self):
+        self.code = []
+        self.macros = {}
+        self.headers = []
+        self.diagnostics = []  # (severity, rule, line, message)
+
+
+class Preprocessor:
+    """Firestorm-style preprocessing: #include, #define and conditionals.
+
+    Expanded tokens keep the line and column of the macro invocation, so
+    diagnostics always point into the original file. With `inline_includes`
+    header code is spliced into the output as the viewer does; such headers
+    get their own cache because their code differs.
+    """
+
+    def __init__(self, include_path=(), headers=None, inline_includes=False):
+        self.include_path = tuple(include_path)
+        self.inline_includes = inline_includes
+        if headers is None:
+            headers = HeaderCache() if inline_includes else SHARED_HEADERS
+        self.headers = headers
+
+    def process(self, tokens, filepath):
+        """Preprocess the token stream of `filepath`"""
+        result = PreprocessResult()
+        self._run(tokens, os.path.dirname(filepath) or '.', result, (os.path.normpath(filepath),))
+        return result
+
+    def parse_header(self, path, stamp, include_stack, macros=None):
+        """Preprocess a header, starting from `macros`, and collect the symbols it provides"""
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        tokens = tokenize(content)
+        result = PreprocessResult()
+        result.macros.update(macros or {})
+        self._run(tokens, os.path.dirname(path), result, include_stack + (path,))
+        global_vars, functions, _ = collect_global_symbols(result.code)
+        global_vars = set(global_vars)
+        paths = {path}
+        names = set()
+        for token in tokens:
+            if token.kind == IDENT:
+                names.add(token.value)
+            elif token.kind == PREPROC:
+                names.update(_NAME_RE.findall(token.value))
+        for header in result.headers:
+            global_vars |= header.globals
+            functions |= header.functions
+            paths |= header.paths
+            names |= header.names
+        return ParsedHeader(path, stamp, result.code, result.macros, global_vars, functions, paths,
+                            result.diagnostics, names)
+
+    def _run(self, tokens, from_dir, result, include_stack):
+        """Walk directives in order, expanding active code as we go"""
+        macros = result.macros
+        conditions = []  # (parent_active, branch_taken)
+        active = True
+        pending = []
+        
+        for token in tokens:
+            if token.kind == COMMENT:
+                continue
+            if token.kind != PREPROC:
+                if active:
+                    pending.append(token)
+                continue
+            
+            # Code before a directive sees only the macros defined so far
+            if pending:
+                result.code.extend(self.expand(pending, macros))
+                pending = []
+            
+            match = _DIRECTIVE_RE.match(_CONTINUATION_RE.sub(' ', token.value))
+            if not match:
+                continue
+            directive, rest = match.group(1), match.group(2).strip()
+            line = token.line
+            
+            if directive in ('if', 'ifdef', 'ifndef'):
+                if directive == 'if':
+                    taken = active and self._eval_condition(rest, macros, line, result)
+                else:
+                    defined = self._directive_name(rest) in macros
+                    taken = active and (defined if directive == 'ifdef' else not defined)
+                conditions.append((active, taken))
+                active = taken
+            elif directive in ('elif', 'else'):
+                if not conditions:
+                    result.diagnostics.append(('error', 'preprocessor-error', line, f"#{directive} without #if"))
+                    continue
+                parent, taken = conditions[-1]
+                if directive == 'elif' and not taken:
+                    active = parent and self._eval_condition(rest, macros, line, result)
+                else:
+                    active = parent and not taken
+                conditions[-1] = (parent, taken or active)
+            elif directive == 'endif':
+                if not conditions:
+                    result.diagnostics.append(('error', 'preprocessor-error', line, "#endif without #if"))
+                    continue
+                active = conditions.pop()[0]
+            elif not active:
+                continue
+            elif directive == 'define':
+                macro = self._parse_define(rest)
+                if macro is not None:
+                    macros[macro.name] = macro
+            elif directive == 'undef':
+                macros.pop(self._directive_name(rest), None)
+            elif directive == 'include':
+                self._include(rest, line, from_dir, result, include_stack)
+        
+        if pending:
+            result.code.extend(self.expand(pending, macros))
+        for _ in conditions:
+            result.diagnostics.append(('error', 'preprocessor-error', tokens[-1].line if tokens else 1,
+                                       "Unterminated #if block"))
+
+    def _include(self, rest, line, from_dir, result, include_stack):
+        """Merge the macros and symbols of an included header"""
+        name = rest.strip().strip('"<>').strip()
+        path = resolve_include(name, from_dir, self.include_path)
+        if path is None:
+            result.diagnostics.append(('warning', 'missing-include', line, f"Included file '{name}' not found"))
+            return
+        if path in include_stack:
+            result.diagnostics.append(('error', 'recursive-include', line, f"Recursive #include of '{name}'"))
+            return
+        header = self.headers.get(path, self, include_stack, result.macros)
+        # Problems inside the header surface on the #include line that pulled it in
+        for severity, rule, header_line, message in header.diagnostics:
+            result.diagnostics.append((severity, rule, line,
+                                       f"{message} (in {os.path.basename(path)} line {header_line})"))
+        result.macros.update(header.macros)
+        result.headers.append(header)
+        if self.inline_includes:
+            result.code.extend(header.code)
+
+    @staticmethod
+    def _directive_name(rest):
+        """First identifier in a directive's argument text"""
+        match = _NAME_RE.match(rest)
+        return match.group() if match else ''
+
+    @staticmethod
+    def _parse_define(rest):
+        """MacroDef for the text after `#define`, or None if malformed"""
+        match = _DEFINE_RE.match(rest)
+        if not match:
+            return None
+        name, params, body = match.groups()
+        if params is not None:
+            params = [param.strip() for param in params[1:-1].split(',') if param.strip()]
+        body = [token for token in tokenize(body) if token.kind not in (COMMENT, PREPROC)]
+        return MacroDef(name, params, body)
+
+    def expand(self, tokens, macros, hidden=frozenset()):
+        """Expand macro invocations in `tokens`, relocating bodies to the call site"""
+        out = []
+        index = 0
+        count = len(tokens)
+        while index < count:
+            token = tokens[index]
+            macro = macros.get(token.value) if token.kind == IDENT else None
+            if macro is None or token.value in hidden:
+                out.append(token)
+                index += 1
+                continue
+            
+            if macro.params is None:
+                body = macro.body
+                index += 1
+            else:
+                # A function-like macro name without arguments is left alone
+                if index + 1 >= count or tokens[index + 1].value != '(':
+                    out.append(token)
+                    index += 1
+                    continue
+                args, index = self._collect_args(tokens, index + 1)
+                if args is None:
+                    out.extend(tokens[index:])
+                    break
+                if args == [[]] and not macro.params:
+                    args = []
+                bindings = dict(zip(macro.params, args))
+                body = []
+                for body_token in macro.body:
+                    if body_token.kind == IDENT and body_token.value in bindings:
+                        body.extend(bindings[body_token.value])
+                    else:
+                        body.append(body_token)
+            
+            origin = token.macro or macro.name
+            placed = [Token(body_token.kind, body_token.value, token.line, token.col, origin)
+                      for body_token in body]
+            out.extend(self.expand(placed, macros, hidden | {macro.name}))
+        return out
+
+    @staticmethod
+    def _collect_args(tokens, open_index):
+        """Split a macro call's arguments at top-level commas.
+
+        Returns (args, index after the closing parenthesis), or (None, open_index)
+        when the call is unterminated.
+        """
+        args = [[]]
+        depth = 0
+        index = open_index + 1
+        while index < len(tokens):
+            value = tokens[index].value
+            if tokens[index].kind == OP:
+                if value in ('(', '[', '{'):
+                    depth += 1
+                elif value in (')', ']', '}'):
+                    if depth == 0 and value == ')':
+                        return args, index + 1
+                    depth -= 1
+                elif value == ',' and depth == 0:
+                    args.append([])
+                    index += 1
+                    continue
+            args[-1].append(tokens[index])
+            index += 1
+        return None, open_index
+
+    def _eval_condition(self, text, macros, line, result):
+        """Truth value of an #if/#elif expression; unknown names count as 0"""
+        tokens = [token for token in tokenize(text) if token.kind not in (COMMENT, PREPROC)]
+        resolved = []
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if token.value == 'defined':
+                if index + 1 < len(tokens) and tokens[index + 1].value == '(':
+                    name = tokens[index + 2].value if index + 2 < len(tokens) else ''
+                    index += 4
+                else:
+                    name = tokens[index + 1].value if index + 1 < len(tokens) else ''
+                    index += 2
+                resolved.append(Token(NUMBER, '1' if name in macros else '0', token.line, token.col))
+                continue
+            resolved.append(token)
+            index += 1
+        
+        values = [token.value for token in self.expand(resolved, macros)]
+        try:
+            value, position = self._parse_condition(values, 0, 0)
+            if position != len(values):
+                raise ValueError(text)
+            return bool(value)
+        except (ValueError, IndexError, ZeroDivisionError):
+            result.diagnostics.append(('warning', 'preprocessor-error', line, f"Cannot evaluate #if expression '{text}'"))
+            return False
+
+    def _parse_condition(self, values, position, min_precedence):
+        """Precedence-climbing evaluator over expanded #if tokens"""
+        value, position = self._parse_unary(values, position)
+        while position < len(values):
+            operator = values[position]
+            precedence = _CONDITION_PRECEDENCE.get(operator)
+            if precedence is None or precedence < min_precedence:
+                break
+            right, position = self._parse_condition(values, position + 1, precedence + 1)
+            if operator == '||':
+                value = int(bool(value) or bool(right))
+            elif operator == '&&':
+                value = int(bool(value) and bool(right))
+            elif operator == '==':
+                value = int(value == right)
+            elif operator == '!=':
+                value = int(value != right)
+            elif operator == '<':
+                value = int(value < right)
+            elif operator == '>':
+                value = int(value > right)
+            elif operator == '<=':
+                value = int(value <= right)
+            elif operator == '>=':
+                value = int(value >= right)
+            elif operator == '+':
+                value = value + right
+            elif operator == '-':
+                value = value - right
+            elif operator == '*':
+                value = value * right
+            elif operator == '/':
+                value = value // right if isinstance(value, int) and isinstance(right, int) else value / right
+            else:
+                value = value % right
+        return value, position
+
+    def _parse_unary(self, values, position):
+        """Unary operators, parentheses, numbers and names"""
+        current = values[position]
+        if current == '!':
+            value, position = self._parse_unary(values, position + 1)
+            return int(not value), position
+        if current in ('-', '+'):
+            value, position = self._parse_unary(values, position + 1)
+            return (-value if current == '-' else value), position
+        if current == '(':
+            value, position = self._parse_condition(values, position + 1, 0)
+            if values[position] != ')':
+                raise ValueError(current)
+            return value, position + 1
+        if current == 'TRUE':
+            return 1, position + 1
+        if current[0].isdigit() or current[0] == '.':
+            try:
+                return int(current, 0), position + 1
+            except ValueError:
+                return float(current), position + 1
+        if current[0].isalpha() or current[0] == '_':
+            return 0, position + 1
+        raise ValueError(current)
+
+
+# Rough Mono memory model, in bytes. These approximate the figures on the
+# LSL wiki "LSL Script Memory" page; they are meant for ranking and trend
+# spotting at build time, not for exact accounting.
+SCRIPT_MEMORY_LIMIT = 65536
+MEMORY_BASE = 3072               # Empty Mono script
+MEMORY_GLOBAL = 12               # Slot and metadata per global variable
+MEMORY_FUNCTION = 96             # Per user function, plus 8 per parameter
+MEMORY_PARAMETER = 8
+MEMORY_EVENT = 64                # Per event handler
+MEMORY_STATE = 128               # Per state
+MEMORY_BYTECODE_TOKEN = 8        # Average Mono bytecode per operand/operator token
+MEMORY_STRING = 16               # String header; characters cost 2 bytes (UTF-16)
+MEMORY_LIST = 16                 # List header
+MEMORY_LIST_ELEMENT = 12         # Per element boxing overhead
+MEMORY_VALUE = {
+    'integer': 4, 'float': 4, 'vector': 12, 'rotation': 16,
+    'string': MEMORY_STRING, 'key': MEMORY_STRING, 'list': MEMORY_LIST,
+}
+
+# Punctuation carries no bytecode of its own
+_NO_BYTECODE = frozenset({'(', ')', '{', '}', '[', ']', ';', ','})
+
+
+# Reading a hoisted global costs a bytecode token per use, so only strings
+# whose characters (2 bytes each) outweigh that are worth hoisting
+HOIST_MIN_STRING_CHARS = MEMORY_BYTECODE_TOKEN // 2 + 1
+
+
+def string_literal_size(literal):
+    """Heap bytes for a quoted string literal token"""
+    chars = len(literal) - 2 - literal.count('\\')
+    return MEMORY_STRING + 2 * max(chars, 0)
+
+
+class MemoryEstimate:
+    """Estimated footprint of one script and the symbols that make it up"""
+
     def __init__(self):
+        self.total = MEMORY_BASE
+        self.contributors = []  # (bytes, label, line)
+
+    def add(self, size, label, line):
+        self.total += size
+        self.contributors.append((size, label, line))
+
+    def top(self, count=5):
+        """Largest contributors first"""
+        return sorted(self.contributors, key=lambda item: (-item[0], item[2]))[:count]
+
+
+def estimate_memory(code, headers=(), pairs=None):
+    """Approximate bytecode plus static heap of a script.
+
+    Walks the top level of `code` (and of every included header, since
+    their declarations are compiled into the script) attributing costs to
+    globals, user functions, states and event handlers. `pairs` is the
+    bracket map of `code`, as in LexedSource.pairs.
+    """
+    estimate = MemoryEstimate()
+    for header in headers:
+        _estimate_block(header.code, match_brackets(header.code)[0], estimate,
+                        os.path.basename(header.path) + ':')
+    _estimate_block(code, match_brackets(code)[0] if pairs is None else pairs, estimate, '')
+    return estimate
+
+
+def _estimate_block(code, pairs, estimate, prefix):
+    """Attribute the top-level declarations in `code` to `estimate`"""
+    last = len(code) - 1
+    state = None
+    state_end = -1
+    index = 0
+    while index <= last:
+        token = code[index]
+        value = token.value
+        if index == state_end:
+            state = None
+            index += 1
+            continue
+        
+        # default { ... } / state name { ... }
+        if state is None and (value == 'default' or value == 'state') and token.kind == IDENT:
+            name_index = index if value == 'default' else index + 1
+            brace = name_index + 1
+            if brace <= last and code[brace].value == '{':
+                state = code[name_index].value
+                state_end = pairs.get(brace, last)
+                estimate.add(MEMORY_STATE, f"{prefix}state {state}", token.line)
+                index = brace + 1
+                continue
+        
+        # [type] name ( params ) { body }
+        start = index
+        if IDENT_CLASS.get(value) is TYPE and index < last and code[index + 1].kind == IDENT:
+            index += 1
+        if code[index].kind == IDENT and index < last and code[index + 1].value == '(':
+            close = pairs.get(index + 1, last)
+            if close < last and code[close + 1].value == '{':
+                end = pairs.get(close + 1, last)
+                params = sum(1 for i in range(index + 2, close) if code[i].kind == IDENT
+                             and IDENT_CLASS.get(code[i].value) is not TYPE)
+                if state is None:
+                    size = MEMORY_FUNCTION + MEMORY_PARAMETER * params
+                    label = f"{prefix}{code[index].value}()"
+                else:
+                    size = MEMORY_EVENT
+                    label = f"{prefix}{state}.{code[index].value}"
+                size += _body_size(code, close + 2, end)
+                estimate.add(size, label, code[start].line)
+                index = end + 1
+                continue
+        
+        # type name [= value] ;
+        if state is None and start != index and index < last and code[index + 1].value in ('=', ';'):
+            end = index + 1
+            while end <= last and code[end].value != ';':
+                end += 1
+            size = MEMORY_GLOBAL + _value_size(code[start].value, code, index + 2, end, pairs)
+            estimate.add(size, f"{prefix}{code[index].value}", code[start].line)
+            index = end + 1
+            continue
+        index = start + 1
+
+
+def _value_size(type_name, code, start, end, pairs):
+    """Heap bytes of a global of `type_name` initialised with tokens code[start:end]"""
+    if type_name == 'list':
+        size = MEMORY_LIST
+        if start < end and code[start].value == '[':
+            for element in _list_elements(code, start, pairs):
+                size += MEMORY_LIST_ELEMENT + _element_size(element)
+        return size
+    if type_name in ('string', 'key'):
+        literals = [token.value for token in code[start:end] if token.kind == STRING]
+        return sum(string_literal_size(literal) for literal in literals) or MEMORY_STRING
+    return MEMORY_VALUE.get(type_name, 4)
+
+
+def _element_size(tokens):
+    """Heap bytes of one list element expression"""
+    if not tokens:
+        return 0
+    if tokens[0].kind == STRING:
+        return string_literal_size(tokens[0].value)
+    if tokens[0].value == '<':
+        commas = sum(1 for token in tokens if token.value == ',')
+        return MEMORY_VALUE['rotation'] if commas >= 3 else MEMORY_VALUE['vector']
+    return 4
+
+
+def _list_elements(code, open_index, pairs):
+    """Element token lists of the `[ ... ]` literal opening at `code[open_index]`"""
+    close = pairs.get(open_index)
+    if close is None:
+        return []
+    elements = [[]]
+    index = open_index + 1
+    while index < close:
+        value = code[index].value
+        end = index
+        if value in LexedSource.OPENERS:
+            end = pairs.get(index, close - 1)
+        elif value == '<' and _opens_vector(code, index):
+            end = _vector_end(code, index, pairs, close)
+        elif value == ',':
+            elements.append([])
+            index += 1
+            continue
+        elements[-1].extend(code[index:end + 1])
+        index = end + 1
+    return [element for element in elements if element]
+
+
+def _opens_vector(code, index):
+    """True if the '<' at `index` starts a vector or rotation rather than comparing"""
+    previous = code[index - 1]
+    return previous.kind == OP and previous.value not in (')', ']')
+
+
+def _vector_end(code, open_index, pairs, stop):
+    """Index of the '>' closing the vector opened at `open_index`, or `open_index`
+    if there is none before `stop`"""
+    commas = 0
+    index = open_index + 1
+    while index < stop:
+        value = code[index].value
+        if value in LexedSource.OPENERS and index in pairs:
+            index = pairs[index] + 1
+            continue
+        if value == '<' and _opens_vector(code, index):
+            index = _vector_end(code, index, pairs, stop) + 1
+            continue
+        if value == ',':
+            commas += 1
+        elif value == '>' and commas >= 2:
+            return index
+        index += 1
+    return open_index
+
+
+def _body_size(code, start, end):
+    """Bytecode plus literal storage of a function or event body"""
+    size = 0
+    for index in range(start, end):
+        token = code[index]
+        if token.kind == STRING:
+            size += string_literal_size(token.value)
+        elif token.value not in _NO_BYTECODE:
+            size += MEMORY_BYTECODE_TOKEN
+    return size
+
+
+# Length calls that should be hoisted out of a loop condition
+LENGTH_FUNCTIONS = frozenset({'llGetListLength', 'llStringLength'})
+
+# llList2* calls per iteration before a loop is reported
+LIST_ACCESS_LIMIT = 4
+
+# Timer intervals (seconds) below this keep the script scheduled most frames
+FAST_TIMER_INTERVAL = 0.5
+
+# llListen name/key/message arguments that filter nothing
+EMPTY_FILTERS = frozenset({'""', 'NULL_KEY'})
+
+
+def numeric_value(tokens):
+    """Float value of a signed int or float literal, or None"""
+    values = [token.value for token in tokens]
+    while len(values) >= 2 and values[0] == '(' and values[-1] == ')':
+        values = values[1:-1]
+    sign = 1
+    if values and values[0] in ('-', '+'):
+        sign = -1 if values[0] == '-' else 1
+        values = values[1:]
+    if len(values) != 1 or not values[0][:1].isdigit() and values[0][:1] != '.':
+        return None
+    try:
+        return sign * float(int(values[0], 0) if values[0][:2].lower() == '0x' else values[0])
+    except ValueError:
+        return None
+
+
+class Loop:
+    """A for/while/do loop located from the token and bracket structure.
+
+    `start`..`end` is the region executed on every iteration (a for loop's
+    initializer is excluded); `header` is the (open, close) parenthesis pair.
+    """
+    __slots__ = ('kind', 'line', 'start', 'end', 'header', 'depth')
+
+    def __init__(self, kind, line, start, end, header):
+        self.kind = kind
+        self.line = line
+        self.start = start
+        self.end = end
+        self.header = header
+        self.depth = 1
+
+    def per_iteration_header(self):
+        """Indices of header tokens evaluated on every iteration"""
+        if self.header is None:
+            return range(0)
+        open_index, close = self.header
+        if self.kind == 'for':
+            return range(self.start + 1, close)
+        return range(open_index + 1, close)
+
+
+def find_loops(source):
+    """All loops in `source`, outermost first, with their nesting depth"""
+    code = source.code
+    loops = []
+    do_headers = set()
+    for index, token in enumerate(code):
+        if token.kind != IDENT or token.value not in ('for', 'while', 'do'):
+            continue
+        value = token.value
+        if value == 'do':
+            body_end = source.statement_end(index + 1)
+            header = None
+            if source.value_at(body_end + 1) == 'while' and body_end + 2 in source.pairs:
+                header = (body_end + 2, source.pairs[body_end + 2])
+            end = header[1] if header else body_end
+            do_headers.add(header)
+            loops.append(Loop(value, token.line, index, end, header))
+            continue
+        if source.value_at(index + 1) != '(' or index + 1 not in source.pairs:
+            continue
+        if value == 'while' and (index + 1, source.pairs[index + 1]) in do_headers:
+            continue  # Trailing condition of a do-while
+        header = (index + 1, source.pairs[index + 1])
+        start = header[0]
+        if value == 'for':
+            # Skip the initializer: it runs once
+            for cursor in range(header[0] + 1, header[1]):
+                if code[cursor].value == ';':
+                    start = cursor
+                    break
+        loops.append(Loop(value, token.line, start, source.statement_end(index), header))
+    
+    # Loops nest or are disjoint, so a stack of enclosing ends gives the depth
+    enclosing = []
+    for loop in sorted(loops, key=lambda loop: (loop.start, -loop.end)):
+        while enclosing and enclosing[-1] < loop.end:
+            enclosing.pop()
+        enclosing.append(loop.end)
+        loop.depth = len(enclosing)
+    return loops
+
+
+ASSIGNMENT_OPS = frozenset({'=', '+=', '-=', '*=', '/=', '%='})
+
+
+class Symbol:
+    """A declared name: global, function, parameter, local or state"""
+    __slots__ = ('name', 'kind', 'token', 'owner', 'reads', 'writes')
+
+    def __init__(self, name, kind, token, owner=None):
+        self.name = name
+        self.kind = kind
+        self.token = token
+        self.owner = owner      # Function or handler that declares a parameter/local
+        self.reads = 0
+        self.writes = 0
+
+
+class SymbolTable:
+    """Declarations, references, calls and state changes of one script.
+
+    Built from the bracket structure in a single walk: globals, user
+    functions and their parameters, states, event handlers and nested block
+    scopes. Handlers are named "state.event"; calls and `state` statements
+    are recorded per function or handler to form the call graph.
+    """
+
+    def __init__(self, source):
+        self.globals = {}        # name -> Symbol
+        self.functions = {}      # name -> Symbol
+        self.states = {}         # name -> Symbol
+        self.handlers = {}       # "state.event" -> state name
+        self.bodies = {}         # function or handler -> (index of '{', index of '}')
+        self.calls = {}          # function or handler -> {callee: first call token}
+        self.call_sites = {}     # user function -> code indices of every call to it in a body
+        self.transitions = {}    # function or handler -> {state: first token}
+        self.duplicates = []     # tokens redeclaring a name in the same block
+        self.shadowing = []      # (token, shadowed Symbol)
+        self.unresolved = []     # (token, previous value, following value)
+        self.header_globals = set()
+        self.header_functions = set()
+        for header in source.preprocessed.headers:
+            self.header_globals |= header.globals
+            self.header_functions |= header.functions
+        self._collect_top_level(source)
+        self._walk(source)
+        # Bodies never nest, so sorted starts locate the owner of any index
+        spans = sorted((start, end, owner) for owner, (start, end) in self.bodies.items())
+        self._body_starts = [span[0] for span in spans]
+        self._body_spans = spans
+
+    def _collect_top_level(self, source):
+        """Globals, functions and states may be used before they are declared"""
+        code = source.code
+        index = 0
+        count = len(code)
+        while index < count:
+            token = code[index]
+            value = token.value
+            if value == '{' or value == '(':
+                index = source.pairs.get(index, index) + 1
+                continue
+            if token.kind != IDENT:
+                index += 1
+                continue
+            if value == 'default' or (value == 'state' and index + 1 < count and code[index + 1].kind == IDENT):
+                name_token = token if value == 'default' else code[index + 1]
+                self.states.setdefault(name_token.value, Symbol(name_token.value, 'state', name_token))
+                index += 1 if value == 'default' else 2
+                continue
+            name_index = index
+            if IDENT_CLASS.get(value) is TYPE and index + 1 < count and code[index + 1].kind == IDENT:
+                name_index = index + 1
+            name_token = code[name_index]
+            following = source.value_at(name_index + 1)
+            if following == '(' and IDENT_CLASS.get(name_token.value) is not KEYWORD:
+                self.functions.setdefault(name_token.value, Symbol(name_token.value, 'function', name_token))
+            elif following in ('=', ';') and name_index != index:
+                self.globals.setdefault(name_token.value, Symbol(name_token.value, 'global', name_token))
+            index = name_index + 1
+
+    def _walk(self, source):
+        code = source.code
+        scopes = []              # Stack of {name: Symbol} for the current function/handler
+        closers = {}             # index of '}' -> what it closes ('state', 'body', 'block')
+        state = None
+        owner = None
+        pending = None           # (owner, [(name token)]) for the next body '{'
+        reported = set()
+
+        for index, token in enumerate(code):
+            value = token.value
+            if token.kind == OP:
+                if value == '{':
+                    previous = source.value_at(index - 1)
+                    if not scopes and (previous == 'default' or source.value_at(index - 2) == 'state'):
+                        state = previous
+                        closers[source.pairs.get(index)] = 'state'
+                    elif pending is not None:
+                        owner, params = pending
+                        pending = None
+                        self.bodies[owner] = (index, source.pairs.get(index, len(code) - 1))
+                        scope = {}
+                        for param in params:
+                            self._declare(scope, scopes, param, 'parameter', owner)
+                        scopes.append(scope)
+                        closers[source.pairs.get(index)] = 'body'
+                    else:
+                        scopes.append({})
+                        closers[source.pairs.get(index)] = 'block'
+                elif value == '}':
+                    closed = closers.pop(index, None)
+                    if closed == 'state':
+                        state = None
+                    elif closed is not None and scopes:
+                        scopes.pop()
+                        if closed == 'body':
+                            owner = None
+                elif value == '(' and not scopes:
+                    # Parameter list of a function, or of an event inside a state
+                    close = source.pairs.get(index)
+                    name = source.value_at(index - 1)
+                    if close is not None and source.value_at(close + 1) == '{':
+                        params = [code[i] for i in range(index + 1, close)
+                                  if code[i].kind == IDENT and IDENT_CLASS.get(code[i - 1].value) is TYPE]
+                        if state is not None:
+                            handler = f"{state}.{name}"
+                            self.handlers[handler] = state
+                            pending = (handler, params)
+                        else:
+                            pending = (name, params)
+                continue
+            if token.kind != IDENT:
+                continue
+
+            previous = source.value_at(index - 1)
+            following = source.value_at(index + 1)
+            if previous == '.' or previous in ('@', 'jump'):
+                continue
+            if previous == 'state':
+                if owner is not None:
+                    self.transitions.setdefault(owner, {}).setdefault(value, token)
+                continue
+
+            # Local declaration: type name [= ...] ;
+            if scopes and IDENT_CLASS.get(previous) is TYPE and code[index - 1].kind == IDENT:
+                if following in ('=', ';'):
+                    self._declare(scopes[-1], scopes[:-1], token, 'local', owner)
+                continue
+            if not scopes:
+                continue
+
+            if following == '(':
+                if value in self.functions and owner is not None:
+                    self.calls.setdefault(owner, {}).setdefault(value, token)
+                    self.call_sites.setdefault(value, []).append(index)
+                continue
+            symbol = self.resolve(value, scopes)
+            if symbol is None:
+                if value not in IDENT_CLASS and (token.line, value) not in reported:
+                    reported.add((token.line, value))
+                    self.unresolved.append((token, previous, following))
+                continue
+            if following in ASSIGNMENT_OPS and previous not in ('++', '--'):
+                symbol.writes += 1
+            else:
+                symbol.reads += 1
+
+    def _declare(self, scope, enclosing, token, kind, owner):
+        name = token.value
+        if name in scope:
+            self.duplicates.append(token)
+        else:
+            shadowed = self.resolve(name, enclosing)
+            if shadowed is not None:
+                self.shadowing.append((token, shadowed))
+        scope[name] = Symbol(name, kind, token, owner)
+
+    def resolve(self, name, scopes):
+        """Innermost visible declaration of `name`, or None"""
+        for scope in reversed(scopes):
+            symbol = scope.get(name)
+            if symbol is not None:
+                return symbol
+        return self.globals.get(name)
+
+    def owner_of(self, index):
+        """Function or handler whose body holds code token `index`, or None"""
+        position = bisect.bisect_left(self._body_starts, index) - 1
+        if position >= 0:
+            _, end, owner = self._body_spans[position]
+            if index < end:
+                return owner
+        return None
+
+    def reachable_functions(self, roots):
+        """User functions called, directly or not, from `roots`"""
+        seen = set()
+        pending = list(roots)
+        while pending:
+            caller = pending.pop()
+            for callee in self.calls.get(caller, ()):
+                if callee not in seen:
+                    seen.add(callee)
+                    pending.append(callee)
+        return seen
+
+    def reachable_states(self):
+        """States entered from `default` through `state X` in handlers or the functions they call"""
+        targets = {}
+        for handler, state in self.handlers.items():
+            owners = self.reachable_functions([handler]) | {handler}
+            for owner in owners:
+                targets.setdefault(state, set()).update(self.transitions.get(owner, ()))
+        seen = {'default'}
+        pending = ['default']
+        while pending:
+            for target in targets.get(pending.pop(), ()):
+                if target not in seen:
+                    seen.add(target)
+                    pending.append(target)
+        return seen
+
+
+ERROR = 'error'
+WARNING = 'warning'
+INFO = 'info'
+
+# Stable rule IDs for machine-readable output: id -> (default severity, description)
+RULES = {
+    'unterminated-string': (ERROR, "String literal is not closed"),
+    'unterminated-comment': (ERROR, "Block comment is not closed"),
+    'unexpected-character': (ERROR, "Character that cannot start an LSL token"),
+    'unmatched-brace': (ERROR, "Opening and closing braces do not balance"),
+    'forbidden-keyword': (ERROR, "Keyword that LSL does not support"),
+    'missing-semicolon': (WARNING, "Line ends after ')' without ending its statement"),
+    'multiple-statements': (WARNING, "More than one statement on a line"),
+    'preprocessor-error': (ERROR, "Malformed or unevaluable preprocessor directive"),
+    'missing-include': (WARNING, "#include target not found on the include path"),
+    'recursive-include': (ERROR, "Header includes itself"),
+    'duplicate-global': (ERROR, "Global variable declared twice"),
+    'duplicate-local': (ERROR, "Local variable declared twice in one scope"),
+    'unused-global': (WARNING, "Global variable that is never read"),
+    'unused-function': (WARNING, "User function not reachable from any event handler"),
+    'unreachable-state': (WARNING, "State never entered from default"),
+    'shadowed-variable': (INFO, "Parameter or local hides a global or outer declaration"),
+    'undefined-variable': (WARNING, "Identifier that is not declared in any visible scope"),
+    'line-too-long': (WARNING, "Line longer than 120 characters"),
+    'tabs': (INFO, "Line indented with tabs"),
+    'debug-message': (INFO, "Debug llOwnerSay left in the script"),
+    'loop-length-condition': (WARNING, "List or string length re-evaluated in a loop condition"),
+    'loop-list-growth': (WARNING, "List grown by copying inside a loop"),
+    'loop-csv': (WARNING, "CSV conversion inside a loop"),
+    'loop-parse': (WARNING, "String parsing inside a loop"),
+    'loop-sleep': (WARNING, "llSleep inside a loop"),
+    'loop-list-access': (INFO, "Many llList2* lookups per loop iteration"),
+    'listen-leak': (WARNING, "llListen reopened or discarded without llListenRemove on every path"),
+    'listen-unfiltered': (INFO, "llListen with no name, key or message filter"),
+    'listen-public-channel': (WARNING, "llListen on the public chat channel 0"),
+    'timer-fast': (WARNING, "llSetTimerEvent interval shorter than half a second"),
+    'timer-never-stopped': (INFO, "Timer started but llSetTimerEvent(0) is never called"),
+    'sensor-repeat': (WARNING, "Repeating sensor sweep with llSensorRepeat"),
+    'memory-estimate': (INFO, "Estimated Mono memory against the 64 KB limit"),
+    'memory-contributor': (INFO, "Largest contributors to the memory estimate"),
+    'memory-monitoring': (INFO, "Script monitors its free memory"),
+    'flood-protection': (INFO, "Script has flood protection"),
+    'io-error': (ERROR, "File could not be read or validated"),
+}
+
+
+class Diagnostic:
+    """One finding: rule ID, severity, message and 1-based line / 0-based column.
+
+    Renders as the text report line, so reports read as before.
+    """
+    __slots__ = ('rule', 'severity', 'message', 'line', 'col')
+
+    def __init__(self, rule, severity, message, line=None, col=None):
+        self.rule = rule
+        self.severity = severity
+        self.message = message
+        self.line = line
+        self.col = col
+
+    def __str__(self):
+        if self.line is None:
+            return self.message
+        return f"Line {self.line}: {self.message}"
+
+    def __repr__(self):
+        return f"Diagnostic({self.rule}, {self.severity}, {str(self)!r})"
+
+    def to_dict(self):
+        return {'rule': self.rule, 'severity': self.severity, 'message': self.message,
+                'line': self.line, 'col': self.col}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['rule'], data['severity'], data['message'], data['line'], data['col'])
+
+
+class LSLValidator:
+    def __init__(self, include_path=(), memory_thresholds=(0.8, 0.9)):
         self.errors = []
         self.warnings = []
         self.info = []
         
-        # Common LSL functions and constants for basic validation
-        self.lsl_functions = {
-            # State management
-            'default', 'state_entry', 'state_exit', 'on_rez',
-            # Events
-            'touch_start', 'touch_end', 'listen', 'timer', 'link_message',
-            'collision_start', 'collision', 'collision_end', 'http_response',
-            'sensor', 'no_sensor', 'control', 'land_collision_start', 'land_collision', 
-            'land_collision_end', 'at_target', 'not_at_target', 'at_rot_target', 
-            'not_at_rot_target', 'money', 'email', 'run_time_permissions', 'changed', 
-            'attach', 'dataserver', 'moving_start', 'moving_end', 'transaction_result', 
-            'path_update', 'remote_data',
-            # String functions
-            'llStringLength', 'llGetSubString', 'llSubStringIndex', 'llToUpper', 'llToLower',
-            'llMD5String', 'llSHA1String', 'llEscapeURL', 'llUnescapeURL',
-            # List functions  
-            'llGetListLength', 'llList2String', 'llList2Integer', 'llList2Float', 'llList2Key',
-            'llList2Vector', 'llList2Rot', 'llDeleteSubList', 'llListReplaceList',
-            'llListFindList', 'llListInsertList', 'llCSV2List', 'llList2CSV',
-            'llParseString2List', 'llDumpList2String', 'llParseStringKeepNulls',
-            # Communication
-            'llSay', 'llWhisper', 'llShout', 'llRegionSay', 'llOwnerSay',
-            'llListen', 'llListenRemove', 'llDialog', 'llMessageLinked',
-            # Object functions
-            'llSetText', 'llSetTexture', 'llGetTexture', 'llSetAlpha', 'llGetAlpha',
-            'llSetColor', 'llGetColor', 'llSetScale', 'llGetScale',
-            'llSetPos', 'llGetPos', 'llSetRot', 'llGetRot',
-            # Avatar functions
-            'llKey2Name', 'llGetDisplayName', 'llRequestDisplayName',
-            'llGetOwner', 'llDetectedKey', 'llDetectedName', 'llGetAgentSize',
-            # Time functions
-            'llGetUnixTime', 'llGetTimestamp', 'llSleep', 'llSetTimerEvent',
-            # Memory functions
-            'llGetUsedMemory', 'llGetFreeMemory', 'llResetScript',
-            # Math functions
-            'llAbs', 'llCeil', 'llFloor', 'llRound', 'llSqrt', 'llPow',
-            'llSin', 'llCos', 'llTan', 'llAsin', 'llAcos', 'llAtan2',
-            'llFrand', 'llGenerateKey',
-            # Type conversion
-            '(string)', '(integer)', '(float)', '(key)', '(vector)', '(rotation)',
-        }
-        
-        self.lsl_constants = {
-            'TRUE', 'FALSE', 'NULL_KEY', 'EOF', 'ZERO_VECTOR', 'ZERO_ROTATION',
-            'PI', 'PI_BY_TWO', 'TWO_PI', 'DEG_TO_RAD', 'RAD_TO_DEG',
-            'LINK_ROOT', 'LINK_SET', 'LINK_ALL_OTHERS', 'LINK_ALL_CHILDREN', 'LINK_THIS',
-        }
-        
-        # Keywords that are definitely forbidden in LSL (conservative list)
-        self.forbidden_keywords = {
-            'break', 'continue', 'switch', 'case', 'goto', 
-            'class', 'struct', 'enum', 'union', 'namespace'
-        }
-        
-        # LSL data types
-        self.lsl_types = {
-            'integer', 'float', 'string', 'key', 'vector', 'rotation', 'list'
-        }
+        # Rule tables are shared module-level constants, built once at import
+        self.lsl_functions = LSL_FUNCTIONS
+        self.lsl_constants = LSL_CONSTANTS
+        self.forbidden_keywords = FORBIDDEN_KEYWORDS
+        self.lsl_types = LSL_TYPES
         
         # Scope tracking for variables
         self.global_vars = set()  # Global variables
-        self.local_vars = []      # Stack of local scopes
-        self.current_function = None
+        self.functions = set()    # User-defined functions
+        
+        # Fractions of the 64 KB limit that trigger a warning / an error
+        self.memory_warning, self.memory_critical = memory_thresholds
+        
+        # Includes and macros are resolved before any rule runs
+        self.preprocessor = Preprocessor(include_path)
+        
+        # Rules run in order over the shared token stream
+        self.rules = [
+            self._check_syntax,
+            self._check_style,
+            self._check_scope,
+            self._check_symbols,
+            self._check_performance,
+            self._check_sim_load,
+            self._check_memory_usage,
+        ]
 
     def validate_file(self, filepath):
         """Validate a single LSL file"""
@@ -92,393 +1410,1982 @@ class LSLValidator:
         self.info = []
         
         try:
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                lines = content.split('\n')
-                
-            self._check_syntax(lines, filepath)
-            self._check_style(lines, filepath)
-            self._check_scope(lines, filepath)
-            self._check_performance(content, filepath)
-            self._check_memory_usage(content, filepath)
-            
-            return self._generate_report(filepath)
+            with open(filepath, 'rb') as f:
+                raw = f.read()
+            return self.validate_content(raw.decode('utf-8', errors='ignore'), filepath, len(raw))
             
         except FileNotFoundError:
             return f"❌ ERROR: File not found: {filepath}"
         except Exception as e:
             return f"❌ ERROR: Failed to validate {filepath}: {str(e)}"
 
-    def _check_syntax(self, lines, filepath):
+    def validate_content(self, content, filepath, size=None):
+        """Validate LSL source that has already been read; raises on failure"""
+        self.analyze(content, filepath, size)
+        return self._generate_report(filepath)
+
+    def analyze(self, content, filepath, size=None):
+        """Run every rule over `content`, refilling errors, warnings, info and stats.
+
+        Returns the LexedSource the rules ran on.
+        """
+        self.errors = []
+        self.warnings = []
+        self.info = []
+        self.stats = file_stats(content, size)
+        
+        # Tokenize once; every rule consumes the same stream
+        source = self._lex(content, filepath)
+        for rule in self.rules:
+            rule(source, filepath)
+        return source
+
+    def _lex(self, content, filepath):
+        """Preprocess and tokenize `content` into the shared LexedSource"""
+        return LexedSource(content, self.preprocessor, filepath)
+
+    def enable_profiling(self, profiler, filepath):
+        """Route the lexer, every rule and the hot helpers through `profiler`"""
+        whole_file = lambda source, *rest: range(1, len(source.lines) + 1)
+        at_index = lambda source, index: (source.code[index].line,)
+        self._lex = profiler.wrap(self, filepath, '_lex', self._lex,
+                                  lambda content, *rest: range(1, content.count('\n') + 2))
+        self.rules = [profiler.wrap(self, filepath, rule.__name__, rule, whole_file) for rule in self.rules]
+        self._check_variable_usage = profiler.wrap(self, filepath, '_check_variable_usage',
+                                                   self._check_variable_usage,
+                                                   lambda token, *rest: (token.line,))
+        self._symbol_table = profiler.wrap(self, filepath, '_symbol_table', self._symbol_table, whole_file)
+        for name in ('_missing_semicolon_after', '_grows_list'):
+            setattr(self, name, profiler.wrap(self, filepath, name, getattr(self, name), at_index))
+
+    def _report(self, severity, rule, message, token=None, line=None):
+        """Record a diagnostic at `token` (or just `line`) under its severity list"""
+        col = None
+        if token is not None:
+            line, col = token.line, token.col
+        target = self.errors if severity == ERROR else self.warnings if severity == WARNING else self.info
+        target.append(Diagnostic(rule, severity, message, line, col))
+
+    def _check_syntax(self, source, filepath):
         """Check for basic syntax errors"""
-        brace_count = 0
-        paren_count = 0
-        in_string = False
-        in_comment = False
-        
-        for line_num, line in enumerate(lines, 1):
-            original_line = line
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
+        code = source.code
+        
+        for token in source.tokens:
+            if token.kind == BAD:
+                if token.value.startswith('"'):
+                    self._report(ERROR, 'unterminated-string', "Unterminated string literal", token)
+                elif token.value.startswith('/*'):
+                    self._report(ERROR, 'unterminated-comment', "Unterminated block comment", token)
+                else:
+                    self._report(ERROR, 'unexpected-character', f"Unexpected character '{token.value}'", token)
+        
+        for severity, rule, line_num, message in source.preprocessed.diagnostics:
+            self._report(severity, rule, message, line=line_num)
+        
+        # Brace balance comes straight from the bracket pairing
+        for index in source.unmatched_close:
+            if code[index].value == '}':
+                self._report(ERROR, 'unmatched-brace', "Unmatched closing brace", code[index])
+        excess = sum(1 for index in source.unmatched_open if code[index].value == '{')
+        missing = sum(1 for index in source.unmatched_close if code[index].value == '}')
+        if excess:
+            self._report(ERROR, 'unmatched-brace', f"Unmatched braces: {excess} excess opening braces")
+        elif missing:
+            self._report(ERROR, 'unmatched-brace', f"{missing} missing opening braces")
+        
+        paren_depth = 0
+        statements_on_line = {}
+        for index, token in enumerate(code):
+            value = token.value
+            if token.kind == IDENT:
+                # Check for forbidden LSL keywords
+                if IDENT_CLASS.get(value) is FORBIDDEN:
+                    self._report(ERROR, 'forbidden-keyword', f"'{value}' is not supported in LSL", token)
+                continue
+            if token.kind != OP:
+                continue
+            if value == '(':
+                paren_depth += 1
+            elif value == ')':
+                paren_depth = max(paren_depth - 1, 0)
+                if (paren_depth == 0 and token.macro is None and
+                    self._missing_semicolon_after(source, index)):
+                    self._report(WARNING, 'missing-semicolon', "Possible missing semicolon", token)
+            elif value == ';' and paren_depth == 0 and token.macro is None:
+                # for(;;) headers sit inside parentheses and are not counted
+                statements_on_line[token.line] = statements_on_line.get(token.line, 0) + 1
+        
+        for line_num, count in sorted(statements_on_line.items()):
+            if count > 1:
+                self._report(WARNING, 'multiple-statements', "Multiple statements on one line", line=line_num)
+
+    def _missing_semicolon_after(self, source, index):
+        """True if the ')' at `index` ends a line but not its statement"""
+        code = source.code
+        if index + 1 >= len(code) or code[index + 1].line == code[index].line:
+            return False
+        
+        # Operators, literals and blocks on the next line continue the statement
+        if code[index + 1].kind != IDENT:
+            return False
+        opener = source.pairs.get(index)
+        if opener is None:
+            return False
+        
+        # if/while/for headers are followed by their body statement
+        if source.value_at(opener - 1) in ('if', 'while', 'for'):
+            return False
+        
+        # Casts such as (string) apply to the next line
+        if opener + 2 == index and IDENT_CLASS.get(source.value_at(opener + 1)) is TYPE:
+            return False
+        return True
+    
+    def _check_scope(self, source, filepath):
+        """Check for variable scope issues"""
+        code = source.code
+        
+        # First pass: globals and user functions may be referenced before
+        # their declaration, so collect them up front. Included headers
+        # contribute theirs too.
+        self.global_vars = set()
+        self.functions = set()
+        for header in source.preprocessed.headers:
+            self.global_vars |= header.globals
+            self.functions |= header.functions
+        
+        global_vars, functions, redeclared = collect_global_symbols(code)
+        for name, token in global_vars.items():
+            if name in self.global_vars:
+                redeclared.append(token)
+        for token in sorted(redeclared, key=lambda t: (t.line, t.col)):
+            self._report(ERROR, 'duplicate-global', f"Global variable '{token.value}' already declared", token)
+        self.global_vars.update(global_vars)
+        self.functions |= functions
+        
+        # Second pass: block scopes, resolved through the symbol table
+        table = self._symbol_table(source)
+        for token in table.duplicates:
+            self._report(ERROR, 'duplicate-local', f"Variable '{token.value}' already declared in this scope", token)
+        labels = {code[i + 1].value for i in range(len(code) - 1)
+                  if code[i].value in ('@', 'jump') and code[i + 1].kind == IDENT}
+        reported = set()
+        for token, previous, following in table.unresolved:
+            self._check_variable_usage(token, previous, following, labels, reported)
+    
+    def _symbol_table(self, source):
+        """The SymbolTable for `source`, built once and shared by the rules"""
+        if source.symbols is None:
+            source.symbols = SymbolTable(source)
+        return source.symbols
+    
+    def _check_variable_usage(self, token, previous, following, labels, reported):
+        """Check for usage of undefined variables (conservative approach)"""
+        name = token.value
+        
+        # Calls, members, labels and state names are not variables
+        if following == '(' or previous in ('.', '@', 'jump', 'state') or name in labels:
+            return
+        
+        # Keywords, types, built-ins and ALL_CAPS constants/macros
+        if name in IDENT_CLASS or name.startswith('ll') or name.upper() == name:
+            return
+        
+        if name in self.global_vars or name in self.functions:
+            return
+        
+        if (token.line, name) not in reported:
+            reported.add((token.line, name))
+            self._report(WARNING, 'undefined-variable', f"Variable '{name}' may not be defined", token)
+
+    def _check_symbols(self, source, filepath):
+        """Unused globals and functions, unreachable states and shadowed names"""
+        table = self._symbol_table(source)
+        
+        for symbol in sorted(table.globals.values(), key=lambda s: s.token.line):
+            if symbol.reads:
+                continue
+            if symbol.writes:
+                message = f"Global '{symbol.name}' is assigned but never read"
+            else:
+                message = f"Global '{symbol.name}' is never used"
+            self._report(WARNING, 'unused-global', message + " - it still costs script memory", symbol.token)
+        
+        reachable = table.reachable_functions(table.handlers)
+        called = {callee for callees in table.calls.values() for callee in callees}
+        for symbol in sorted(table.functions.values(), key=lambda s: s.token.line):
+            if symbol.name in reachable:
+                continue
+            how = "only called from unused functions" if symbol.name in called else "never called"
+            self._report(WARNING, 'unused-function', f"Function '{symbol.name}()' is {how}", symbol.token)
+        
+        entered = table.reachable_states()
+        for symbol in sorted(table.states.values(), key=lambda s: s.token.line):
+            if symbol.name not in entered:
+                self._report(WARNING, 'unreachable-state',
+                             f"State '{symbol.name}' is never entered from default", symbol.token)
+        
+        for token, shadowed in table.shadowing:
+            where = ("global" if shadowed.kind == 'global' else
+                     f"{shadowed.kind} in an enclosing scope")
+            self._report(INFO, 'shadowed-variable',
+                         f"'{token.value}' shadows the {where} declared on line {shadowed.token.line}", token)
+
+    def _check_style(self, source, filepath):
+        """Check for style and best practice issues"""
+        line_first = source.line_first
+        
+        for line_num, line in enumerate(source.lines, 1):
+            # Skip comments and empty lines
+            if line_first.get(line_num, COMMENT) == COMMENT:
                 continue
                 
-            # Track multi-line comments
-            if '/*' in line and '*/' not in line:
-                in_comment = True
+            # Check for very long lines
+            if len(line) > 120:
+                self._report(WARNING, 'line-too-long', f"Line too long ({len(line)} characters)", line=line_num)
+                
+            # Check for tabs vs spaces (LSL prefers spaces)
+            if '\t' in line:
+                self._report(INFO, 'tabs', "Contains tabs (LSL prefers spaces)", line=line_num)
+        
+        # Check for deprecated or problematic patterns
+        debug_lines = set()
+        for token in source.code:
+            if token.value == 'llOwnerSay' and 'DEBUG' in source.lines[token.line - 1].upper():
+                if token.line not in debug_lines:
+                    debug_lines.add(token.line)
+                    self._report(INFO, 'debug-message', "Debug message found - consider removing for production", token)
+
+    def _check_performance(self, source, filepath):
+        """Check for costly patterns inside loops, with their nesting depth"""
+        code = source.code
+        loops = find_loops(source)
+        if not loops:
+            return
+        
+        # Loop depth of every token: +1 where an iterated region starts, -1 after it ends
+        depth = [0] * (len(code) + 1)
+        for loop in loops:
+            depth[loop.start] += 1
+            depth[loop.end + 1] -= 1
+        for index in range(1, len(depth)):
+            depth[index] += depth[index - 1]
+        
+        list_vars = {code[i + 1].value for i in range(len(code) - 1)
+                     if code[i].value == 'list' and code[i + 1].kind == IDENT}
+        flagged = set()
+        
+        def flag(token, rule, message):
+            if (token.line, message) not in flagged:
+                flagged.add((token.line, message))
+                self._report(WARNING, rule, message, token)
+        
+        for loop in loops:
+            for index in loop.per_iteration_header():
+                token = code[index]
+                if token.value in LENGTH_FUNCTIONS and source.value_at(index + 1) == '(':
+                    flag(token, 'loop-length-condition', f"{token.value}() in loop condition is re-evaluated every iteration "
+                                f"(loop depth {depth[index]}) - cache it before the loop")
+        
+        for index, token in enumerate(code):
+            if not depth[index] or token.kind != IDENT:
                 continue
-            elif '*/' in line and in_comment:
-                in_comment = False
+            value = token.value
+            where = f"(loop depth {depth[index]})"
+            if value in ('llList2CSV', 'llCSV2List'):
+                flag(token, 'loop-csv', f"Expensive CSV operation in loop {where}")
+            elif value in ('llParseString2List', 'llParseStringKeepNulls'):
+                flag(token, 'loop-parse', f"String parsing in loop may be expensive {where}")
+            elif value == 'llSleep':
+                flag(token, 'loop-sleep', f"llSleep in loop stalls the whole script {where}")
+            elif value in list_vars and self._grows_list(source, index):
+                flag(token, 'loop-list-growth', f"List '{value}' grows by copying inside loop (quadratic) {where}")
+        
+        # Random access: many llList2* lookups per iteration of the innermost loop
+        for loop in loops:
+            inner = [i for i in range(loop.start, loop.end + 1)
+                     if depth[i] == loop.depth and code[i].value.startswith('llList2')
+                     and code[i].value not in ('llList2CSV', 'llList2List')]
+            if len(inner) >= LIST_ACCESS_LIMIT:
+                self._report(INFO, 'loop-list-access',
+                             f"{len(inner)} llList2* lookups per iteration "
+                             f"(loop depth {loop.depth}) - consider strided lists or caching",
+                             line=loop.line)
+
+    def _check_sim_load(self, source, filepath):
+        """Listener lifecycles, timers and sensors that cost region script time"""
+        code = source.code
+        table = self._symbol_table(source)
+        constants = self._constant_globals(source, table)
+        
+        def number(arg):
+            if len(arg) == 1 and arg[0].value in constants:
+                return constants[arg[0].value]
+            return numeric_value(arg)
+        
+        timer_starts = []
+        timer_stopped = False
+        release_sites = {}  # listen handle -> where each body releases it, shared by every llListen
+        for index, token in enumerate(code):
+            value = token.value
+            if token.kind != IDENT or source.value_at(index + 1) != '(' or not value.startswith('ll'):
                 continue
-            elif in_comment:
+            args = call_arguments(source, index + 1)
+            if value == 'llListen' and len(args) == 4:
+                channel = number(args[0])
+                channel = f"{channel:g}" if channel is not None else code_label(args[0])
+                if channel in ('0', 'PUBLIC_CHANNEL'):
+                    self._report(WARNING, 'listen-public-channel',
+                                 "llListen on channel 0 hears all public chat in range - use a private channel", token)
+                if all(len(arg) == 1 and arg[0].value in EMPTY_FILTERS for arg in args[1:]):
+                    self._report(INFO, 'listen-unfiltered',
+                                 f"Unfiltered llListen on channel {channel} - filter by key so other chatter does not wake the script", token)
+                leak = self._listen_leak(source, table, index, release_sites)
+                if leak is not None:
+                    self._report(WARNING, 'listen-leak', leak, token)
+            elif value == 'llSetTimerEvent':
+                seconds = number(args[0]) if len(args) == 1 else None
+                if seconds == 0:
+                    timer_stopped = True
+                elif seconds is not None and seconds < FAST_TIMER_INTERVAL:
+                    self._report(WARNING, 'timer-fast',
+                                 f"llSetTimerEvent({seconds:g}) fires {1 / seconds:.0f} times a second - "
+                                 f"use {FAST_TIMER_INTERVAL:g}s or more", token)
+                if seconds != 0:
+                    timer_starts.append(token)
+            elif value == 'llSensorRepeat':
+                seconds = number(args[-1]) if args else None
+                every = f" every {seconds:g}s" if seconds else ""
+                self._report(WARNING, 'sensor-repeat',
+                             f"llSensorRepeat sweeps{every} until the state changes - prefer one-shot llSensor calls", token)
+        
+        if timer_starts and not timer_stopped:
+            self._report(INFO, 'timer-never-stopped',
+                         "Timer is never stopped with llSetTimerEvent(0) - it keeps firing while idle",
+                         timer_starts[0])
+    
+    @staticmethod
+    def _constant_globals(source, table):
+        """Numeric value of globals initialised with a literal and never assigned"""
+        constants = {}
+        for index, token in enumerate(source.code):
+            symbol = table.globals.get(token.value)
+            if symbol is None or symbol.token is not token or symbol.writes:
                 continue
+            if source.value_at(index + 1) == '=':
+                value = numeric_value(source.code[index + 2:source.statement_end(index)])
+                if value is not None:
+                    constants[symbol.name] = value
+        return constants
+    
+    def _listen_leak(self, source, table, index, release_sites):
+        """Why the llListen at `index` can leave a listener open, or None"""
+        code = source.code
+        handle = None
+        if source.value_at(index - 1) == '=' and code[index - 2].kind == IDENT:
+            handle = code[index - 2].value
+            if table.globals.get(handle) is None or IDENT_CLASS.get(source.value_at(index - 3)) is TYPE:
+                handle = None       # A local handle is lost when the body returns
+        sites = release_sites.get(handle)
+        if sites is None:
+            sites = release_sites[handle] = self._release_sites(source, table, handle)
+        root = self._unreleased_root(source, table, index, handle, sites, set())
+        if root is None:
+            return None
+        owner = table.owner_of(index)
+        where = f"{owner.rsplit('.', 1)[-1]}()"
+        if owner != root:
+            where += f" (reached from {root.rsplit('.', 1)[-1]}())"
+        if handle is None:
+            return f"llListen handle is not kept in {where} - every call leaves another listener open"
+        return (f"'{handle}' is reopened in {where} without llListenRemove({handle}) first - "
+                f"the previous listener stays open")
+    
+    @staticmethod
+    def _release_sites(source, table, handle):
+        """{function or handler: ascending indices of llListenRemove(handle) or calls to
+        functions that reach it}"""
+        if handle is None:
+            return {}
+        code = source.code
+        removals = [index for index, token in enumerate(code)
+                    if token.value == 'llListenRemove' and source.value_at(index + 2) == handle]
+        direct = {table.owner_of(index) for index in removals} & set(table.functions)
+        # Walk the call graph backwards from the direct releasers
+        callers = {}
+        for caller, callees in table.calls.items():
+            for callee in callees:
+                callers.setdefault(callee, []).append(caller)
+        releasers = set(direct)
+        pending = list(direct)
+        while pending:
+            for caller in callers.get(pending.pop(), ()):
+                if caller in table.functions and caller not in releasers:
+                    releasers.add(caller)
+                    pending.append(caller)
+        sites = {}
+        for index in sorted(removals + [call for name in releasers for call in table.call_sites.get(name, ())]):
+            sites.setdefault(table.owner_of(index), []).append(index)
+        return sites
+    
+    def _unreleased_root(self, source, table, index, handle, sites, seen):
+        """Handler from which the code at `index` runs with `handle` possibly still open"""
+        owner = table.owner_of(index)
+        if owner is None or owner in seen:
+            return None
+        seen.add(owner)
+        if self._released_before(source, table, index, handle, sites):
+            return None
+        if owner in table.handlers:
+            # Every listener is closed when a state is entered
+            return None if owner.endswith('.state_entry') else owner
+        for call_index in table.call_sites.get(owner, ()):
+            root = self._unreleased_root(source, table, call_index, handle, sites, seen)
+            if root is not None:
+                return root
+        return None
+    
+    @staticmethod
+    def _released_before(source, table, index, handle, sites):
+        """True if every path to `index` in its body first releases `handle`"""
+        if handle is None:
+            return False
+        code = source.code
+        owner = table.owner_of(index)
+        start, _ = table.bodies[owner]
+        
+        def guarded(opener):
+            # Statement or block controlled by `if (... handle ...)`
+            if source.value_at(opener) != ')':
+                return False
+            condition = source.pairs.get(opener, opener)
+            return (source.value_at(condition - 1) == 'if' and
+                    any(code[i].value == handle for i in range(condition, opener)))
+        
+        for cursor in sites.get(owner, ()):
+            if cursor >= index:
+                break
+            # Every block holding the release but not `index` must be a handle guard
+            dominates = True
+            for block in range(cursor - 1, start, -1):
+                if code[block].value != '{' or source.pairs.get(block, 0) < cursor:
+                    continue
+                if source.pairs[block] > index:
+                    break
+                if not guarded(block - 1):
+                    dominates = False
+                    break
+            # A braceless `if (...) llListenRemove(h);`
+            if dominates and source.value_at(cursor - 1) in (')', 'else'):
+                dominates = guarded(cursor - 1)
+            if dominates:
+                return True
+        return False
+
+    @staticmethod
+    def _grows_list(source, index):
+        """True if the list variable at `index` is appended to in place"""
+        name = source.code[index].value
+        following = source.value_at(index + 1)
+        if following == '+=':
+            return True
+        if following != '=' or source.value_at(index - 1) == '.':
+            return False
+        end = source.statement_end(index)
+        right = source.code[index + 2:end]
+        return (any(token.value == name for token in right) and
+                any(token.value == '+' for token in right))
+
+    def _check_memory_usage(self, source, filepath):
+        """Estimate script memory against the 64 KB Mono limit"""
+        estimate = estimate_memory(source.code, source.preprocessed.headers, source.pairs)
+        ratio = estimate.total / SCRIPT_MEMORY_LIMIT
+        summary = (f"Estimated memory {estimate.total:,} / {SCRIPT_MEMORY_LIMIT:,} bytes "
+                   f"({ratio:.0%})")
+        
+        if ratio >= self.memory_critical:
+            self._report(ERROR, 'memory-estimate',
+                         f"{summary} - above {self.memory_critical:.0%} critical threshold, "
+                         "split or slim this script")
+        elif ratio >= self.memory_warning:
+            self._report(WARNING, 'memory-estimate',
+                         f"{summary} - above {self.memory_warning:.0%} warning threshold")
+        else:
+            self._report(INFO, 'memory-estimate', f"🧠 {summary}")
+        
+        self._report(INFO, 'memory-contributor', "Top memory contributors:")
+        for size, label, line in estimate.top():
+            self._report(INFO, 'memory-contributor', f"   {size:>7,} bytes  {label} (line {line})")
+            
+        # Check for memory monitoring
+        if any(token.value == 'llGetFreeMemory' for token in source.code):
+            self._report(INFO, 'memory-monitoring', "✅ Memory monitoring detected")
+            
+        # Check for flood protection
+        content = source.content.lower()
+        if 'cooldown' in content or 'flood' in content:
+            self._report(INFO, 'flood-protection', "✅ Flood protection detected")
+
+    def _generate_report(self, filepath):
+        """Generate validation report"""
+        return format_report(filepath, self.errors, self.warnings, self.info, self.stats)
+
+
+def file_stats(content, size=None):
+    """Line, character and byte counts of already-read file content"""
+    if size is None:
+        size = len(content.encode('utf-8'))
+    return {'lines': content.count('\n') + 1, 'chars': len(content), 'size': size}
+
+
+def format_report(filepath, errors, warnings, info, stats):
+    """Render the human-readable report for one file"""
+    filename = os.path.basename(filepath)
+    report = [f"\n🔍 LSL Validation Report: {filename}"]
+    report.append("=" * 60)
+    
+    if not errors and not warnings:
+        report.append("✅ No issues found!")
+    else:
+        if errors:
+            report.append(f"\n❌ ERRORS ({len(errors)}):")
+            for error in errors:
+                report.append(f"   {error}")
+                
+        if warnings:
+            report.append(f"\n⚠️  WARNINGS ({len(warnings)}):")
+            for warning in warnings:
+                report.append(f"   {warning}")
                 
-            # Skip single-line comments
-            if line.startswith('//'):
+    if info:
+        report.append(f"\nℹ️  INFO ({len(info)}):")
+        for item in info:
+            report.append(f"   {item}")
+            
+    # File stats
+    if stats:
+        report.append(f"\n📊 FILE STATS:")
+        report.append(f"   Lines: {stats['lines']}")
+        report.append(f"   Characters: {stats['chars']:,}")
+        report.append(f"   Size: {stats['size']:,} bytes")
+        
+    return '\n'.join(report)
+
+
+# Bump when rule behaviour changes in a way the source digest would not show
+RULESET_VERSION = '1'
+
+_INCLUDE_RE = re.compile(r'^[ \t]*#[ \t]*include[ \t]+["<]([^">]+)[">]', re.MULTILINE)
+
+
+def resolve_include(name, from_dir, include_path=()):
+    """Find an #include target on disk, or return None.
+
+    Each directory (the including file's first, then `include_path`) is tried
+    with the name as written and then with its basename, so
+    "peril/Peril_Constants.lsl" also resolves to a flat checkout.
+    """
+    for directory in (from_dir,) + tuple(include_path):
+        for candidate in (name, os.path.basename(name)):
+            path = os.path.join(directory, candidate)
+            if os.path.isfile(path):
+                return os.path.normpath(path)
+    return None
+
+
+def include_closure(filepath, include_path=(), missing=None):
+    """Absolute paths of every header `filepath` includes, directly or not.
+
+    When a set is passed as `missing`, it collects the absolute paths an
+    unresolved #include would have matched, e.g. those of a deleted header.
+    """
+    headers = set()
+    pending = [os.path.abspath(filepath)]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(current, 'r', encoding='utf-8', errors='ignore') as f:
+                names = _INCLUDE_RE.findall(f.read())
+        except OSError:
+            continue
+        for name in names:
+            path = resolve_include(name, os.path.dirname(current), include_path)
+            if path is not None:
+                path = os.path.abspath(path)
+                if path not in headers:
+                    headers.add(path)
+                    pending.append(path)
+            elif missing is not None:
+                for directory in (os.path.dirname(current),) + tuple(include_path):
+                    for candidate in (name, os.path.basename(name)):
+                        missing.add(os.path.abspath(os.path.join(directory, candidate)))
+    return headers
+
+
+# Disk space the result cache may use before old entries are evicted
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class ResultCache:
+    """On-disk diagnostics cache keyed by content, rule set and included headers.
+
+    One JSON file per entry; writes are atomic so worker processes can share
+    the directory. Least recently used entries are evicted once the entries
+    together take more than `max_bytes` on disk.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES, include_path=(), settings=()):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.include_path = tuple(include_path)
+        # Options that change diagnostics are part of every key
+        self.ruleset = f"{RULESET_VERSION}:{_ruleset_digest()}:{settings!r}"
+        self._header_digests = {}
+
+    def key_for(self, filepath, raw):
+        """Cache key for file bytes `raw` read from `filepath`"""
+        digest = hashlib.sha256()
+        digest.update(self.ruleset.encode())
+        digest.update(b'\0')
+        digest.update(raw)
+        for header, header_digest in self._include_digests(raw, os.path.dirname(filepath) or '.', set()):
+            digest.update(f"\0{header}\0{header_digest}".encode())
+        return digest.hexdigest()
+
+    def _include_digests(self, raw, from_dir, seen):
+        """(name, digest) for every header reachable through #include"""
+        text = raw.decode('utf-8', errors='ignore')
+        for name in _INCLUDE_RE.findall(text):
+            path = resolve_include(name, from_dir, self.include_path)
+            if path is None:
+                yield name, 'missing'
+                continue
+            if path in seen:
+                continue
+            seen.add(path)
+            # Memoized per on-disk version so long-running sessions see edits
+            stat = os.stat(path)
+            memo_key = (path, stat.st_mtime_ns, stat.st_size)
+            if memo_key not in self._header_digests:
+                with open(path, 'rb') as f:
+                    header_raw = f.read()
+                self._header_digests[memo_key] = (hashlib.sha256(header_raw).hexdigest(), header_raw)
+            header_digest, header_raw = self._header_digests[memo_key]
+            yield name, header_digest
+            yield from self._include_digests(header_raw, os.path.dirname(path), seen)
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """Cached entry for `key`, or None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # Mark as recently used for eviction
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, entry):
+        """Store `entry` for `key`, ignoring an unwritable cache directory"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        """Evict least recently used entries until the cache fits in `max_bytes`"""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError:
+            return
+        entries = []
+        total = 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def _ruleset_digest():
+    """Digest of this module's source so edited rules never serve stale results"""
+    try:
+        with open(__file__, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return 'unknown'
+
+
+# Calls that string-parse a link_message payload
+PAYLOAD_PARSERS = frozenset({
+    'llParseString2List', 'llParseStringKeepNulls', 'llCSV2List',
+    'llJson2List', 'llJsonGetValue',
+})
+
+# llMessageLinked targets that deliver to every script in the linkset
+BROADCAST_TARGETS = frozenset({'LINK_SET', 'LINK_ALL_OTHERS', 'LINK_ALL_CHILDREN'})
+
+
+def constant_value(tokens):
+    """Integer value of a (macro-expanded) constant expression, or None"""
+    values = [token.value for token in tokens]
+    while len(values) >= 2 and values[0] == '(' and values[-1] == ')':
+        values = values[1:-1]
+    sign = 1
+    if values and values[0] in ('-', '+'):
+        sign = -1 if values[0] == '-' else 1
+        values = values[1:]
+    if len(values) == 1 and values[0][:1].isdigit():
+        try:
+            return sign * int(values[0], 0)
+        except ValueError:
+            return None
+    return None
+
+
+def code_label(tokens):
+    """Source-level spelling of a code expression (macro name when expanded)"""
+    if tokens and tokens[0].macro and all(token.macro == tokens[0].macro for token in tokens):
+        return tokens[0].macro
+    return ' '.join(token.value for token in tokens)
+
+
+class LinkSend:
+    """One llMessageLinked call site"""
+    __slots__ = ('script', 'line', 'target', 'code', 'label')
+
+    def __init__(self, script, line, target, code, label):
+        self.script = script
+        self.line = line
+        self.target = target
+        self.code = code
+        self.label = label
+
+
+class LinkHandler:
+    """What one script's link_message handlers test for"""
+    __slots__ = ('script', 'line', 'codes', 'parsing_codes', 'accepts_all', 'parses_first', 'labels')
+
+    def __init__(self, script, line):
+        self.script = script
+        self.line = line
+        self.codes = set()           # Codes compared with == / !=
+        self.parsing_codes = set()   # Codes whose branch string-parses the payload
+        self.accepts_all = False     # No num filter, or a range/variable test
+        self.parses_first = False    # Parses the payload before any num test
+        self.labels = {}
+
+
+class LinkGraph:
+    """Cross-script index of llMessageLinked senders and link_message handlers"""
+
+    def __init__(self, include_path=()):
+        self.preprocessor = Preprocessor(include_path)
+        self.sends = []
+        self.handlers = {}
+        self.labels = {}
+
+    def add_file(self, filepath):
+        """Index the sends and handlers of one script"""
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            source = LexedSource(f.read(), self.preprocessor, filepath)
+        self.add_source(os.path.basename(filepath), source)
+
+    def add_source(self, script, source):
+        """Index an already-lexed script under the name `script`"""
+        code = source.code
+        for index, token in enumerate(code):
+            if token.kind != IDENT or source.value_at(index + 1) != '(':
                 continue
-                
-            # Check for common syntax errors
-            if line.endswith(';') and line.count(';') > 1:
-                if not any(keyword in line for keyword in ['for', 'if', 'while']):
-                    self.warnings.append(f"Line {line_num}: Multiple statements on one line")
-                    
-            # Check brace balance
-            brace_count += line.count('{') - line.count('}')
-            if brace_count < 0:
-                self.errors.append(f"Line {line_num}: Unmatched closing brace")
-                
-            # Check parentheses balance  
-            paren_count += line.count('(') - line.count(')')
-            
-            # Check for missing semicolons (basic check)
-            if (line.endswith(')') and not line.startswith('if') and not line.startswith('while') 
-                and not line.startswith('for') and not line.endswith(');') and '{' not in line 
-                and '}' not in line and not line.startswith('state') and not line.startswith('default')):
-                self.warnings.append(f"Line {line_num}: Possible missing semicolon")
-                
-            # Check for forbidden LSL keywords
-            self._check_forbidden_keywords(line, line_num)
-                
-        # Final brace balance check
-        if brace_count != 0:
-            self.errors.append(f"Unmatched braces: {brace_count} excess opening braces" if brace_count > 0 else f"{-brace_count} missing opening braces")
-    
-    def _check_forbidden_keywords(self, line, line_num):
-        """Check for keywords that are forbidden in LSL"""
-        # Skip comments
-        if '//' in line:
-            line = line[:line.index('//')]
-        
-        # Remove strings to avoid false positives
-        # Simple approach: remove content between quotes
-        import re
-        line_no_strings = re.sub(r'"[^"]*"', '""', line)
-        
-        # Check each forbidden keyword
-        for keyword in self.forbidden_keywords:
-            # Use word boundaries to avoid matching substrings
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, line_no_strings):
-                self.errors.append(f"Line {line_num}: '{keyword}' is not supported in LSL")
-    
-    def _check_scope(self, lines, filepath):
-        """Check for variable scope issues"""
-        # Reset scope tracking
-        self.global_vars = set()
-        self.local_vars = []
-        self.current_function = None
+            if token.value == 'llMessageLinked':
+                args = call_arguments(source, index + 1)
+                if len(args) >= 2:
+                    target = ' '.join(t.value for t in args[0])
+                    value = constant_value(args[1])
+                    label = code_label(args[1])
+                    self.sends.append(LinkSend(script, token.line, target,
+                                               value if value is not None else label, label))
+                    self.labels.setdefault(value if value is not None else label, set()).add(label)
+            elif token.value == 'link_message' and source.value_at(index - 1) not in ('.',):
+                close = source.pairs.get(index + 1)
+                if close is not None and source.value_at(close + 1) == '{':
+                    self._index_handler(script, source, index, close)
+
+    def _index_handler(self, script, source, name_index, close):
+        """Record the codes a link_message body tests and where it parses"""
+        code = source.code
+        params = [code[i].value for i in range(name_index + 2, close)
+                  if code[i].kind == IDENT and IDENT_CLASS.get(code[i].value) is not TYPE]
+        if len(params) < 2:
+            return
+        num = params[1]
+        body_start = close + 1
+        body_end = source.pairs.get(body_start, len(code) - 1)
         
-        in_function = False
-        brace_depth = 0
+        handler = self.handlers.get(script)
+        if handler is None:
+            handler = self.handlers[script] = LinkHandler(script, code[name_index].line)
         
-        for line_num, line in enumerate(lines, 1):
-            original_line = line
-            line = line.strip()
-            
-            # Skip empty lines and comments
-            if not line or line.startswith('//') or line.startswith('/*'):
+        first_test = None
+        tested = False
+        for index in range(body_start, body_end):
+            token = code[index]
+            if token.kind != IDENT or token.value != num:
                 continue
-            
-            # Remove comments from line
-            if '//' in line:
-                line = line[:line.index('//')]
-                line = line.strip()
-            
-            # Track brace depth for scope management
-            open_braces = line.count('{')
-            close_braces = line.count('}')
-            
-            # Check for function definitions
-            if not in_function and ('(' in line and ')' in line and '{' in line):
-                # This might be a function definition
-                if any(event in line for event in ['state_entry', 'touch_start', 'listen', 'timer', 'on_rez', 'link_message', 'http_response']):
-                    in_function = True
-                    self.local_vars.append(set())  # New local scope
-            
-            # Handle scope changes
-            if open_braces > 0:
-                for _ in range(open_braces):
-                    brace_depth += 1
-                    if in_function and brace_depth > 1:  # Nested scope within function
-                        self.local_vars.append(set())
-            
-            # Check for variable declarations
-            self._check_variable_declaration(line, line_num, in_function)
-            
-            # Check for variable usage
-            self._check_variable_usage(line, line_num)
-            
-            # Handle closing braces
-            if close_braces > 0:
-                for _ in range(close_braces):
-                    brace_depth -= 1
-                    if in_function and len(self.local_vars) > 1:
-                        self.local_vars.pop()  # Exit nested scope
-                    elif brace_depth == 0 and in_function:
-                        # Exiting function
-                        in_function = False
-                        self.local_vars.clear()
-    
-    def _check_variable_declaration(self, line, line_num, in_function):
-        """Check for variable declarations"""
-        import re
-        
-        # Remove string literals to avoid false matches
-        line_no_strings = re.sub(r'"[^"]*"', '""', line)
-        
-        # Pattern to match LSL variable declarations: type varname;
-        for lsl_type in self.lsl_types:
-            # Handle special case of for loop declarations: for(integer i = 0; ...)
-            for_loop_pattern = rf'for\s*\(\s*{lsl_type}\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*='
-            for_matches = re.findall(for_loop_pattern, line_no_strings)
-            
-            for var_name in for_matches:
-                if var_name.startswith('ll') or var_name in self.lsl_functions:
-                    continue
-                # For loop variables are always local and shouldn't conflict with globals
-                if len(self.local_vars) > 0:
-                    self.local_vars[-1].add(var_name)
+            tested = True
+            if first_test is None:
+                first_test = index
+            value, label = self._compared_constant(source, index)
+            if value is None:
+                handler.accepts_all = True
                 continue
-            
-            # Regular variable declarations: type identifier; or type identifier =
-            # Skip for loop variable declarations by checking the line content
-            if 'for(' not in line_no_strings.replace(' ', '') and 'for (' not in line_no_strings:
-                pattern = rf'\b{lsl_type}\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*[;=]'
-                matches = re.findall(pattern, line_no_strings)
+            handler.codes.add(value)
+            handler.labels.setdefault(value, set()).add(label)
+            self.labels.setdefault(value, set()).add(label)
+            branch = self._branch_of(source, index, body_start)
+            if branch is not None and self._parses(code, *branch):
+                handler.parsing_codes.add(value)
+        
+        if not tested:
+            handler.accepts_all = True
+        stop = first_test if first_test is not None else body_end
+        if self._parses(code, body_start, stop):
+            handler.parses_first = True
+
+    @staticmethod
+    def _compared_constant(source, index):
+        """(value, label) when `num` at `index` is compared with ==/!= to a constant"""
+        code = source.code
+        operand = []
+        if source.value_at(index + 1) in ('==', '!='):
+            cursor = index + 2
+            if source.value_at(cursor) in ('-', '+'):
+                operand.append(code[cursor])
+                cursor += 1
+            if cursor < len(code) and code[cursor].kind == NUMBER:
+                operand.append(code[cursor])
             else:
-                matches = []
-            
-            for var_name in matches:
-                # Skip LSL built-in functions that might match the pattern
-                if var_name.startswith('ll') or var_name in self.lsl_functions:
-                    continue
-                    
-                # Skip common parameter names that aren't real declarations
-                if var_name in {'total_number', 'sender', 'num', 'str', 'id', 'start_param', 
-                               'channel', 'name', 'msg', 'message', 'request_id', 'status', 'metadata', 'body'}:
-                    continue
-                
-                if in_function:
-                    # Check if already declared in current local scope
-                    if len(self.local_vars) > 0 and var_name in self.local_vars[-1]:
-                        self.errors.append(f"Line {line_num}: Variable '{var_name}' already declared in this scope")
-                    else:
-                        # Add to current local scope
-                        if len(self.local_vars) > 0:
-                            self.local_vars[-1].add(var_name)
-                else:
-                    # Global variable - only flag if it's a real redeclaration
-                    if var_name in self.global_vars:
-                        # Only error if this looks like a real declaration line
-                        if ';' in line or '=' in line:
-                            self.errors.append(f"Line {line_num}: Global variable '{var_name}' already declared")
-                    else:
-                        self.global_vars.add(var_name)
-    
-    def _check_variable_usage(self, line, line_num):
-        """Check for usage of undefined variables (conservative approach)"""
-        import re
+                operand = []
+        elif source.value_at(index - 1) in ('==', '!=') and index >= 2 and code[index - 2].kind == NUMBER:
+            operand = [code[index - 2]]
+            sign = index - 3
+            if source.value_at(sign) in ('-', '+') and (sign == 0 or code[sign - 1].kind == OP and
+                                                       code[sign - 1].value not in (')', ']')):
+                operand.insert(0, code[sign])
+        value = constant_value(operand)
+        if value is None:
+            return None, None
+        return value, code_label(operand)
+
+    @staticmethod
+    def _branch_of(source, index, body_start):
+        """(start, end) of the statement guarded by the `if` whose condition holds `index`"""
+        cursor = index
+        while cursor > body_start:
+            cursor -= 1
+            if source.value_at(cursor) == '(' and source.pairs.get(cursor, -1) > index:
+                if source.value_at(cursor - 1) == 'if':
+                    close = source.pairs[cursor]
+                    return close + 1, source.statement_end(close + 1)
+        return None
+
+    @staticmethod
+    def _parses(code, start, end):
+        """True if any payload parser is called in code[start:end + 1]"""
+        for index in range(start, min(end + 1, len(code))):
+            if code[index].kind == IDENT and code[index].value in PAYLOAD_PARSERS:
+                return True
+        return False
+
+    def _label(self, value):
+        names = sorted(self.labels.get(value, ()))
+        symbolic = [name for name in names if not name.lstrip('-+')[:1].isdigit()]
+        return ' / '.join(symbolic or names) if names else str(value)
+
+    def report(self):
+        """Human-readable routing, fan-out and waste report"""
+        receivers = {}
+        for handler in self.handlers.values():
+            for value in handler.codes:
+                receivers.setdefault(value, set()).add(handler.script)
+        catch_all = sorted(h.script for h in self.handlers.values() if h.accepts_all)
+        sends_by_code = {}
+        for send in self.sends:
+            sends_by_code.setdefault(send.code, []).append(send)
+        listening = len(self.handlers)
         
-        # Skip variable declarations and function definitions
-        if any(lsl_type in line for lsl_type in self.lsl_types):
-            return
-            
-        # Skip comments and string literals
-        if line.strip().startswith('//') or line.strip().startswith('/*') or '"' in line:
-            return
+        report = [f"\n📡 LINK MESSAGE GRAPH: {len({s.script for s in self.sends} | set(self.handlers))} scripts, "
+                  f"{len(self.sends)} send sites, {len(sends_by_code)} codes, "
+                  f"{listening} scripts with link_message"]
+        report.append("=" * 80)
         
-        # Skip lines that are clearly not variable usage
-        if (line.startswith('state') or line.startswith('#') or line.strip() == 'default' or
-            'llOwnerSay' in line or 'llSay' in line or 'llMessageLinked' in line or
-            ('{' in line and '}' in line and line.count('{') == line.count('}'))):
-            return
+        # Fan-out: every send wakes all listening scripts; the useful part is receivers
+        report.append(f"\n📊 FAN-OUT BY CODE (sends x receivers):")
+        report.append(f"   {'Code':>8}  {'Sends':>5}  {'Recv':>4}  {'Wasted wakes':>12}  Name")
+        rows = []
+        for value, sends in sends_by_code.items():
+            handled_by = receivers.get(value, set())
+            broadcasts = [s for s in sends if s.target in BROADCAST_TARGETS]
+            wasted = len(broadcasts) * max(listening - len(handled_by | set(catch_all)), 0)
+            rows.append((len(sends) * max(len(handled_by), 1), wasted, value, len(sends), len(handled_by)))
+        for _, wasted, value, count, received in sorted(rows, key=lambda r: (-r[1], -r[0], str(r[2]))):
+            report.append(f"   {str(value):>8}  {count:>5}  {received:>4}  {wasted:>12}  {self._label(value)}")
         
-        # Only check very specific patterns where we're confident it's a variable usage
-        # Pattern 1: variable assignment: varname = something
-        assignment_vars = re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=', line)
+        report.append(f"\n📢 BROADCASTS WAKING SCRIPTS WITHOUT A HANDLER:")
+        found = False
+        for send in sorted(self.sends, key=lambda s: (s.script, s.line)):
+            if send.target not in BROADCAST_TARGETS:
+                continue
+            idle = sorted(h.script for h in self.handlers.values()
+                          if not h.accepts_all and send.code not in h.codes)
+            if idle:
+                found = True
+                handled_by = ', '.join(sorted(receivers.get(send.code, ()))) or 'nobody'
+                report.append(f"   {send.script}:{send.line} {send.target} {self._label(send.code)} "
+                              f"-> {len(idle)} idle wake(s), handled by {handled_by}")
+        if not found:
+            report.append("   ✅ None")
         
-        # Pattern 2: variable in arithmetic: something + varname or varname + something  
-        arithmetic_vars = re.findall(r'(?:^|[+\-*/=\s])([a-zA-Z_][a-zA-Z0-9_]*)(?:\s*[+\-*/]|\s*;|$)', line)
+        report.append(f"\n👻 ORPHAN CODES (sent, no handler tests them):")
+        orphans = sorted((value for value in sends_by_code
+                          if value not in receivers and not isinstance(value, str)))
+        for value in orphans:
+            sites = sorted(sends_by_code[value], key=lambda s: (s.script, s.line))
+            where = ', '.join(f"{s.script}:{s.line}" for s in sites[:3])
+            if len(sites) > 3:
+                where += f" and {len(sites) - 3} more"
+            reach = f" - reaches only catch-all handlers" if catch_all else ""
+            report.append(f"   {self._label(value)}: {len(sites)} send(s) at {where}{reach}")
+        if not orphans:
+            report.append("   ✅ None")
         
-        # Combine patterns
-        potential_vars = set(assignment_vars + arithmetic_vars)
+        report.append(f"\n💤 DEAD HANDLERS (handled, never sent):")
+        dead = sorted((script, value) for value, scripts in receivers.items()
+                      if value not in sends_by_code for script in scripts)
+        for script, value in dead:
+            report.append(f"   {script}: {self._label(value)}")
+        if not dead:
+            report.append("   ✅ None")
         
-        for var_name in potential_vars:
-            # Skip LSL functions, constants, keywords, and common false positives
-            if (var_name in self.lsl_functions or var_name in self.lsl_constants or
-                var_name in self.lsl_types or var_name.startswith('ll') or
-                var_name in {'if', 'else', 'for', 'while', 'do', 'return', 'jump', 'state', 'default',
-                           'total_number', 'sender', 'num', 'str', 'id', 'start_param', 'channel',
-                           'name', 'msg', 'message', 'request_id', 'status', 'metadata', 'body',
-                           # Common English words that show up in strings/comments
-                           'the', 'and', 'or', 'not', 'has', 'been', 'with', 'from', 'this', 'that',
-                           'will', 'can', 'may', 'all', 'any', 'some', 'new', 'old', 'get', 'set'} or
-                var_name.isdigit() or len(var_name) <= 2):
-                continue
-            
-            # Check if variable is defined
-            is_defined = var_name in self.global_vars
-            
-            # Check local scopes (from innermost to outermost)
-            if not is_defined:
-                for scope in reversed(self.local_vars):
-                    if var_name in scope:
-                        is_defined = True
-                        break
-            
-            # Only warn for very likely variable usage patterns
-            if not is_defined:
-                # Must be lowercase and used in assignment or arithmetic context
-                if (var_name.islower() and 
-                    (var_name in assignment_vars or 
-                     (var_name in arithmetic_vars and any(op in line for op in ['+', '-', '*', '/'])))):
-                    self.warnings.append(f"Line {line_num}: Variable '{var_name}' may not be defined")
-
-    def _check_style(self, lines, filepath):
-        """Check for style and best practice issues"""
-        for line_num, line in enumerate(lines, 1):
-            stripped = line.strip()
-            
-            # Skip comments and empty lines
-            if not stripped or stripped.startswith('//') or stripped.startswith('/*'):
-                continue
-                
-            # Check for very long lines
-            if len(line) > 120:
-                self.warnings.append(f"Line {line_num}: Line too long ({len(line)} characters)")
-                
-            # Check for tabs vs spaces (LSL prefers spaces)
-            if '\t' in line:
-                self.info.append(f"Line {line_num}: Contains tabs (LSL prefers spaces)")
-                
-            # Check for deprecated or problematic patterns
-            if 'llOwnerSay' in stripped and 'DEBUG' in stripped.upper():
-                self.info.append(f"Line {line_num}: Debug message found - consider removing for production")
-
-    def _check_performance(self, content, filepath):
-        """Check for performance issues"""
-        # Check for expensive operations in loops
-        lines = content.split('\n')
-        in_loop = False
-        loop_indent = 0
-        
-        for line_num, line in enumerate(lines, 1):
-            stripped = line.strip()
-            current_indent = len(line) - len(line.lstrip())
-            
-            # Detect loop start
-            if any(keyword in stripped for keyword in ['for', 'while', 'do']):
-                in_loop = True
-                loop_indent = current_indent
-                
-            # Detect loop end
-            elif in_loop and stripped == '}' and current_indent <= loop_indent:
-                in_loop = False
-                
-            # Check for expensive operations in loops
-            elif in_loop:
-                if 'llList2CSV' in stripped or 'llCSV2List' in stripped:
-                    self.warnings.append(f"Line {line_num}: Expensive CSV operation in loop")
-                if 'llParseString2List' in stripped:
-                    self.warnings.append(f"Line {line_num}: String parsing in loop may be expensive")
-
-    def _check_memory_usage(self, content, filepath):
-        """Check for potential memory issues"""
-        # Count string operations
-        csv_ops = content.count('llList2CSV') + content.count('llCSV2List')
-        if csv_ops > 10:
-            self.warnings.append(f"High number of CSV operations ({csv_ops}) - may impact memory")
-            
-        # Check for large string concatenations
-        if content.count(' + ') > 50:
-            self.warnings.append("High number of string concatenations - consider optimizing")
-            
-        # Check for memory monitoring
-        if 'llGetFreeMemory' in content:
-            self.info.append("✅ Memory monitoring detected")
-            
-        # Check for flood protection
-        if 'cooldown' in content.lower() or 'flood' in content.lower():
-            self.info.append("✅ Flood protection detected")
+        report.append(f"\n🧵 HANDLERS THAT STRING-PARSE PAYLOADS:")
+        found = False
+        for script in sorted(self.handlers):
+            handler = self.handlers[script]
+            if handler.parses_first:
+                found = True
+                report.append(f"   {script}:{handler.line} parses before testing num "
+                              f"(runs on every wake)")
+            for value in sorted(handler.parsing_codes):
+                found = True
+                report.append(f"   {script}: {self._label(value)}")
+        if not found:
+            report.append("   ✅ None")
+        
+        if catch_all:
+            report.append(f"\nℹ️  Handlers without a constant num filter: {', '.join(catch_all)}")
+        return '\n'.join(report)
 
-    def _generate_report(self, filepath):
-        """Generate validation report"""
-        filename = os.path.basename(filepath)
-        report = [f"\n🔍 LSL Validation Report: {filename}"]
-        report.append("=" * 60)
+    def to_dot(self):
+        """Graphviz routing graph: script -> script edges labelled with codes"""
+        receivers = {}
+        for handler in self.handlers.values():
+            for value in handler.codes:
+                receivers.setdefault(value, set()).add(handler.script)
+        edges = {}
+        for send in self.sends:
+            for receiver in receivers.get(send.code, ()):
+                edges.setdefault((send.script, receiver), set()).add(self._label(send.code))
+        lines = ['digraph link_messages {', '    rankdir=LR;', '    node [shape=box];']
+        for (sender, receiver), labels in sorted(edges.items()):
+            label = '\\n'.join(sorted(labels))
+            lines.append(f'    "{sender}" -> "{receiver}" [label="{label}"];')
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+
+class Literal:
+    """One string or list literal occurrence"""
+    __slots__ = ('script', 'line', 'text', 'size', 'elements', 'constant', 'macro')
+
+    def __init__(self, script, line, text, size, elements=0, constant=True, macro=None):
+        self.script = script
+        self.line = line
+        self.text = text
+        self.size = size
+        self.elements = elements
+        self.constant = constant      # Only literals of constants can be hoisted
+        self.macro = macro            # #define the literal was expanded from
+
+
+class LiteralIndex:
+    """Cross-script index of string and list literals with their byte cost.
+
+    Every occurrence of a literal is compiled into the script on its own, so
+    a literal used n times costs n copies. Hoisting it into a global keeps
+    one copy plus a variable reference per use; a #define does not help, as
+    it expands back into n literals.
+    """
+
+    def __init__(self, include_path=()):
+        self.preprocessor = Preprocessor(include_path)
+        self.strings = []
+        self.lists = []
+        self.scripts = set()
+
+    def add_file(self, filepath):
+        """Index the literals of one script"""
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            source = LexedSource(f.read(), self.preprocessor, filepath)
+        self.add_source(os.path.basename(filepath), source)
+
+    def add_source(self, script, source):
+        """Index an already-lexed script under the name `script`"""
+        self.scripts.add(script)
+        code = source.code
+        for index, token in enumerate(code):
+            if token.kind == STRING:
+                self.strings.append(Literal(script, token.line, token.value,
+                                            string_literal_size(token.value), macro=token.macro))
+            elif token.value == '[' and index in source.pairs:
+                close = source.pairs[index]
+                tokens = code[index:close + 1]
+                elements = _list_elements(code, index, source.pairs)
+                if not elements:
+                    continue
+                size = MEMORY_LIST + sum(MEMORY_LIST_ELEMENT + _element_size(e) for e in elements)
+                constant = all(t.kind in (STRING, NUMBER, OP) or t.value in LSL_CONSTANTS
+                               or t.value.upper() == t.value for t in tokens)
+                text = ''.join(t.value + ' ' if t.value == ',' else t.value for t in tokens)
+                self.lists.append(Literal(script, token.line, text, size,
+                                          len(elements), constant, token.macro))
+
+    @staticmethod
+    def _groups(literals, min_size=0):
+        """{(script, text): [occurrences]} for hoistable literals of at least `min_size` bytes"""
+        groups = {}
+        for literal in literals:
+            if literal.constant and literal.size >= min_size:
+                groups.setdefault((literal.script, literal.text), []).append(literal)
+        return groups
+
+    @staticmethod
+    def reclaimable(occurrences):
+        """Bytes saved by replacing `occurrences` of one literal with a global"""
+        count = len(occurrences)
+        size = occurrences[0].size
+        return count * size - (size + MEMORY_GLOBAL + count * MEMORY_BYTECODE_TOKEN)
+
+    @staticmethod
+    def _short(text, width=40):
+        return text if len(text) <= width else text[:width - 3] + '...'
+
+    @staticmethod
+    def _lines(occurrences, count=4):
+        lines = sorted({literal.line for literal in occurrences})
+        where = ', '.join(str(line) for line in lines[:count])
+        if len(lines) > count:
+            where += f" and {len(lines) - count} more"
+        return where
+
+    def report(self, top=15):
+        """Human-readable duplicate, reclaimable-memory and largest-list report"""
+        # "" or "|" cost less inline than a global read would
+        string_groups = self._groups(self.strings, MEMORY_STRING + 2 * HOIST_MIN_STRING_CHARS)
+        list_groups = self._groups(self.lists)
+        savings = {}
+        duplicates = []
+        for kind, groups in (('strings', string_groups), ('lists', list_groups)):
+            for (script, text), occurrences in groups.items():
+                saved = self.reclaimable(occurrences) if len(occurrences) > 1 else 0
+                if saved > 0:
+                    duplicates.append((saved, script, text, occurrences))
+                    row = savings.setdefault(script, {'strings': 0, 'lists': 0, 'count': 0})
+                    row[kind] += saved
+                    row['count'] += 1
         
-        if not self.errors and not self.warnings:
-            report.append("✅ No issues found!")
+        report = [f"\n📝 LITERAL INDEX: {len(self.scripts)} scripts, "
+                  f"{len(self.strings):,} string literals ({sum(l.size for l in self.strings):,} bytes), "
+                  f"{len(self.lists):,} list literals ({sum(l.size for l in self.lists):,} bytes)"]
+        report.append("=" * 80)
+        
+        report.append(f"\n💾 RECLAIMABLE BY HOISTING DUPLICATES INTO GLOBALS (per script):")
+        if savings:
+            width = max(len(script) for script in savings)
+            report.append(f"   {'Script':<{width}}  {'Literals':>8}  {'Strings':>9}  {'Lists':>9}")
+            for script, row in sorted(savings.items(), key=lambda item: -(item[1]['strings'] + item[1]['lists'])):
+                report.append(f"   {script:<{width}}  {row['count']:>8}  {row['strings']:>9,}  {row['lists']:>9,}")
+            report.append(f"   {'Total':<{width}}  {sum(r['count'] for r in savings.values()):>8}  "
+                          f"{sum(r['strings'] for r in savings.values()):>9,}  "
+                          f"{sum(r['lists'] for r in savings.values()):>9,}")
         else:
-            if self.errors:
-                report.append(f"\n❌ ERRORS ({len(self.errors)}):")
-                for error in self.errors:
-                    report.append(f"   {error}")
-                    
-            if self.warnings:
-                report.append(f"\n⚠️  WARNINGS ({len(self.warnings)}):")
-                for warning in self.warnings:
-                    report.append(f"   {warning}")
-                    
-        if self.info:
-            report.append(f"\nℹ️  INFO ({len(self.info)}):")
-            for info in self.info:
-                report.append(f"   {info}")
-                
-        # File stats
+            report.append("   ✅ None")
+        
+        report.append(f"\n🔁 TOP DUPLICATES WITHIN A SCRIPT:")
+        for saved, script, text, occurrences in sorted(duplicates, key=lambda d: (-d[0], d[1], d[2]))[:top]:
+            macro = f" via {occurrences[0].macro}" if occurrences[0].macro else ""
+            report.append(f"   {saved:>6,} bytes  {script}: {self._short(text)} x{len(occurrences)}{macro} "
+                          f"(lines {self._lines(occurrences)})")
+        if not duplicates:
+            report.append("   ✅ None")
+        
+        # Every script has its own memory, so only duplicates inside one script can be reclaimed
+        report.append(f"\n🌐 LITERALS REPEATED ACROSS SCRIPTS (reclaimable counts within-script duplicates only):")
+        shared = {}
+        for (script, text), occurrences in list(string_groups.items()) + list(list_groups.items()):
+            shared.setdefault(text, []).append(occurrences)
+        rows = []
+        for text, per_script in shared.items():
+            if len(per_script) < 2:
+                continue
+            total = sum(occurrences[0].size * len(occurrences) for occurrences in per_script)
+            saved = sum(max(self.reclaimable(occurrences), 0) for occurrences in per_script if len(occurrences) > 1)
+            scripts = sorted((occurrences[0].script, len(occurrences)) for occurrences in per_script)
+            rows.append((total, saved, text, scripts))
+        if rows:
+            report.append(f"   {'Bytes':>6}  {'Reclaimable':>11}  {'Uses':>4}  {'Scripts':>7}  Literal")
+        for total, saved, text, scripts in sorted(rows, key=lambda r: (-r[0], r[2]))[:top]:
+            names = ', '.join(f"{script} x{count}" for script, count in scripts[:3])
+            if len(scripts) > 3:
+                names += f" and {len(scripts) - 3} more"
+            uses = sum(count for _, count in scripts)
+            report.append(f"   {total:>6,}  {saved:>11,}  {uses:>4}  {len(scripts):>7}  "
+                          f"{self._short(text)} ({names})")
+        if not rows:
+            report.append("   ✅ None")
+        
+        report.append(f"\n📦 LARGEST LIST LITERALS:")
+        for literal in sorted(self.lists, key=lambda l: (-l.size, l.script, l.line))[:top]:
+            report.append(f"   {literal.size:>6,} bytes  {literal.script}:{literal.line} "
+                          f"{literal.elements} elements  {self._short(literal.text)}")
+        if not self.lists:
+            report.append("   ✅ None")
+        return '\n'.join(report)
+
+
+class CountingPattern:
+    """Compiled-regex stand-in that counts engine runs for the profiler.
+
+    finditer counts one run per match produced; other methods count one per call.
+    """
+    __slots__ = ('pattern', 'profiler')
+
+    def __init__(self, pattern, profiler):
+        self.pattern = pattern
+        self.profiler = profiler
+
+    def finditer(self, *args):
+        for match in self.pattern.finditer(*args):
+            self.profiler.regex_calls += 1
+            yield match
+
+    def __getattr__(self, name):
+        method = getattr(self.pattern, name)
+        if not callable(method):
+            return method
+        def counted(*args, **kwargs):
+            self.profiler.regex_calls += 1
+            return method(*args, **kwargs)
+        return counted
+
+
+class RuleProfile:
+    """Accumulated cost of one rule or helper on one file"""
+    __slots__ = ('calls', 'seconds', 'lines', 'regex', 'diagnostics')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.lines = set()
+        self.regex = 0
+        self.diagnostics = 0
+
+
+class RuleProfiler:
+    """Per-file, per-rule wall time, lines visited, regex runs and diagnostics.
+
+    Times are inclusive: a helper such as _check_variable_usage is also
+    counted in the rule that calls it.
+    """
+
+    def __init__(self):
+        self.records = {}   # (filepath, name) -> RuleProfile
+        self.regex_calls = 0
+        self._saved_patterns = {}
+
+    def install(self):
+        """Swap this module's compiled patterns for counting proxies"""
+        module = sys.modules[__name__]
+        for name, value in vars(module).items():
+            if isinstance(value, re.Pattern):
+                self._saved_patterns[name] = value
+        for name, value in self._saved_patterns.items():
+            setattr(module, name, CountingPattern(value, self))
+
+    def uninstall(self):
+        module = sys.modules[__name__]
+        for name, value in self._saved_patterns.items():
+            setattr(module, name, value)
+        self._saved_patterns = {}
+
+    def wrap(self, validator, filepath, name, func, lines_of):
+        """`func` instrumented under `name`; `lines_of(*args)` gives the lines it visits"""
+        record = self.records.setdefault((filepath, name), RuleProfile())
+
+        def profiled(*args):
+            diagnostics = len(validator.errors) + len(validator.warnings) + len(validator.info)
+            regex = self.regex_calls
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                record.seconds += time.perf_counter() - start
+                record.calls += 1
+                record.regex += self.regex_calls - regex
+                record.diagnostics += (len(validator.errors) + len(validator.warnings) +
+                                       len(validator.info) - diagnostics)
+                record.lines.update(lines_of(*args))
+        return profiled
+
+    def report(self, top=10):
+        """Summary table by rule, then the most expensive file/rule pairs"""
+        totals = {}
+        for (filepath, name), record in self.records.items():
+            total = totals.setdefault(name, RuleProfile())
+            total.calls += record.calls
+            total.seconds += record.seconds
+            total.regex += record.regex
+            total.diagnostics += record.diagnostics
+            total.lines.update((filepath, line) for line in record.lines)
+        files = {filepath for filepath, _ in self.records}
+        # Only top-level stages add up to the wall time; helpers are nested
+        wall = sum(record.seconds for name, record in totals.items()
+                   if name == '_lex' or name.startswith('_check_') and name != '_check_variable_usage')
+        wall = wall or 1.0
+
+        lines = [f"\n⏱️  PROFILE: {len(files)} files, {wall:.3f}s in rules (times include nested helpers)"]
+        lines.append("=" * 96)
+        lines.append(f"{'Rule':<28}{'Calls':>9}{'Seconds':>10}{'Share':>8}{'Lines':>10}"
+                     f"{'Regex':>10}{'Diags':>8}{'µs/line':>11}")
+        for name, total in sorted(totals.items(), key=lambda item: -item[1].seconds):
+            per_line = total.seconds / len(total.lines) * 1e6 if total.lines else 0.0
+            lines.append(f"{name:<28}{total.calls:>9,}{total.seconds:>10.3f}{total.seconds / wall:>8.0%}"
+                         f"{len(total.lines):>10,}{total.regex:>10,}{total.diagnostics:>8,}{per_line:>11.2f}")
+
+        lines.append(f"\n🐢 Slowest file/rule pairs:")
+        ranked = sorted(self.records.items(), key=lambda item: -item[1].seconds)[:top]
+        for (filepath, name), record in ranked:
+            lines.append(f"   {record.seconds:>8.3f}s  {name:<28}{os.path.basename(filepath)} "
+                         f"({len(record.lines):,} lines, {record.regex:,} regex, "
+                         f"{record.diagnostics} diagnostics)")
+        return '\n'.join(lines)
+
+
+class FileResult:
+    """Diagnostics for one validated file; the text report is rendered on first use"""
+    __slots__ = ('filepath', 'errors', 'warnings', 'info', 'stats', '_report')
+
+    def __init__(self, filepath, errors, warnings, info, report=None, stats=None):
+        self.filepath = filepath
+        self.errors = errors
+        self.warnings = warnings
+        self.info = info
+        self.stats = stats
+        self._report = report
+
+    @property
+    def report(self):
+        if self._report is None:
+            self._report = format_report(self.filepath, self.errors, self.warnings, self.info, self.stats)
+        return self._report
+
+    @property
+    def ok(self):
+        """True when there are no errors"""
+        return not self.errors
+
+    def diagnostics(self):
+        """All diagnostics, errors first"""
+        return self.errors + self.warnings + self.info
+
+
+def validate_path(filepath, cache=None, include_path=(), memory_thresholds=(0.8, 0.9), profiler=None):
+    """Validate one file with a fresh validator and return its FileResult.
+
+    Module-level so it can be shipped to worker processes. With a cache,
+    unchanged files are answered from disk without tokenizing. A RuleProfiler
+    instruments the run and bypasses the cache.
+    """
+    if profiler is not None:
+        cache = None
+    try:
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return FileResult(filepath, [Diagnostic('io-error', ERROR, "File not found")], [], [],
+                          f"❌ ERROR: File not found: {filepath}")
+    
+    key = None
+    if cache is not None:
+        key = cache.key_for(filepath, raw)
+        entry = cache.get(key)
+        if entry is not None:
+            errors, warnings, info = ([Diagnostic.from_dict(d) for d in entry[name]]
+                                      for name in ('errors', 'warnings', 'info'))
+            return FileResult(filepath, errors, warnings, info, stats=entry['stats'])
+    
+    validator = LSLValidator(include_path, memory_thresholds)
+    if profiler is not None:
+        validator.enable_profiling(profiler, filepath)
+    try:
+        validator.analyze(raw.decode('utf-8', errors='ignore'), filepath, len(raw))
+    except Exception as e:
+        return FileResult(filepath, [Diagnostic('io-error', ERROR, f"Failed to validate: {e}")], [], [],
+                          f"❌ ERROR: Failed to validate {filepath}: {str(e)}")
+    
+    if cache is not None:
+        entry = {name: [d.to_dict() for d in getattr(validator, name)]
+                 for name in ('errors', 'warnings', 'info')}
+        entry['stats'] = validator.stats
+        cache.put(key, entry)
+    return FileResult(filepath, validator.errors, validator.warnings, validator.info,
+                      stats=validator.stats)
+
+
+# Per-thread validators for validate_source, one per settings tuple
+_thread_state = threading.local()
+
+
+def _thread_validator(include_path, memory_thresholds):
+    """This thread's validator for the given settings, created on first use"""
+    validators = getattr(_thread_state, 'validators', None)
+    if validators is None:
+        validators = _thread_state.validators = {}
+    settings = (include_path, memory_thresholds)
+    validator = validators.get(settings)
+    if validator is None:
+        validator = validators[settings] = LSLValidator(include_path, memory_thresholds)
+    return validator
+
+
+def validate_source(text, filename='<buffer>', include_path=(), memory_thresholds=(0.8, 0.9)):
+    """Validate LSL source held in memory and return its FileResult.
+
+    Nothing is read from disk except #include targets, resolved next to
+    `filename` and on `include_path`. Safe to call from many threads at once:
+    each thread reuses its own validator, while rule tables and parsed
+    headers are shared read-only.
+    """
+    validator = _thread_validator(tuple(include_path), tuple(memory_thresholds))
+    validator.analyze(text, filename)
+    return FileResult(filename, validator.errors, validator.warnings, validator.info,
+                      stats=validator.stats)
+
+
+def iter_validate_paths(filepaths, jobs=1, cache=None, include_path=(), memory_thresholds=(0.8, 0.9),
+                        profiler=None):
+    """Yield FileResults in the order of `filepaths` as soon as each is ready.
+
+    Fans out across `jobs` processes when > 1; callers can stream output
+    instead of waiting for the whole run. Profiling always runs in-process.
+    """
+    if jobs <= 1 or len(filepaths) <= 1 or profiler is not None:
+        for filepath in filepaths:
+            yield validate_path(filepath, cache, include_path, memory_thresholds, profiler)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # Larger chunks amortize pickling across many small scripts
+            chunksize = max(1, len(filepaths) // (jobs * 4))
+            yield from pool.map(partial(validate_path, cache=cache, include_path=include_path,
+                                        memory_thresholds=memory_thresholds), filepaths, chunksize=chunksize)
+    
+    if cache is not None:
+        cache.prune()
+
+
+def validate_paths(filepaths, jobs=1, cache=None, include_path=(), memory_thresholds=(0.8, 0.9)):
+    """Validate files in order, fanning out across `jobs` processes when > 1.
+
+    Results always come back in the order of `filepaths`.
+    """
+    return list(iter_validate_paths(filepaths, jobs, cache, include_path, memory_thresholds))
+
+
+CACHE_DIR_NAME = '.lsl_validator_cache'
+
+
+def make_cache(args):
+    """ResultCache for the parsed arguments, or None with --no-cache"""
+    if args.no_cache:
+        return None
+    cache_dir = args.cache_dir
+    if cache_dir is None:
+        base = args.target if os.path.isdir(args.target) else os.path.dirname(args.target)
+        cache_dir = os.path.join(base or '.', CACHE_DIR_NAME)
+    return ResultCache(cache_dir, max_bytes=max(int(args.cache_size * 1024 * 1024), 1),
+                       include_path=args.include_path,
+                       settings=args.memory_thresholds)
+
+
+def parse_args(argv):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        prog='lsl_validator.py',
+        description='Syntax and style checker for LSL files')
+    parser.add_argument('target', help='LSL file or directory of .lsl files')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='validate directory files in N worker processes (0 = one per CPU)')
+    parser.add_argument('-I', '--include-path', action='append', default=[], metavar='DIR',
+                        help='directory searched for #include files (repeatable)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always revalidate; do not read or write the result cache')
+    parser.add_argument('--cache-dir', default=None,
+                        help=f'result cache location (default: <target dir>/{CACHE_DIR_NAME})')
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_CACHE_BYTES / (1024 * 1024), metavar='MB',
+                        help='disk space the result cache may use, in megabytes '
+                             f'(default: {DEFAULT_CACHE_BYTES // (1024 * 1024)})')
+    parser.add_argument('--memory-warning', type=float, default=0.8, metavar='FRACTION',
+                        help='warn when estimated memory exceeds this fraction of 64 KB (default: 0.8)')
+    parser.add_argument('--memory-critical', type=float, default=0.9, metavar='FRACTION',
+                        help='error when estimated memory exceeds this fraction of 64 KB (default: 0.9)')
+    parser.add_argument('--link-graph', action='store_true',
+                        help='analyze link_message traffic across all scripts in the directory')
+    parser.add_argument('--link-graph-dot', metavar='FILE',
+                        help='with --link-graph, also write the routing graph in Graphviz format')
+    parser.add_argument('--literals', action='store_true',
+                        help='report duplicate string/list literals and the memory hoisting them would save')
+    parser.add_argument('--watch', action='store_true',
+                        help='stay resident and revalidate changed files and their #include dependents')
+    parser.add_argument('--poll', action='store_true',
+                        help='with --watch, poll for changes instead of using inotify')
+    parser.add_argument('--poll-interval', type=float, default=1.0, metavar='SECONDS',
+                        help='polling interval for --watch --poll (default: 1.0)')
+    parser.add_argument('--format', choices=('text', 'json', 'sarif'), default='text',
+                        help='report format; json streams one record per file (default: text)')
+    parser.add_argument('--profile', action='store_true',
+                        help='time every rule per file (serial, uncached) and print a summary to stderr')
+    parser.add_argument('--profile-out', metavar='FILE',
+                        help='with --profile, also dump cProfile stats for pstats / snakeviz')
+    parser.add_argument('--since', metavar='REF',
+                        help='only validate .lsl files changed since git REF and scripts including a changed header')
+    parser.add_argument('--changed-lines', action='store_true',
+                        help='with --since, only report diagnostics on changed lines of changed scripts')
+    args = parser.parse_args(argv)
+    if args.changed_lines and args.since is None:
+        parser.error('--changed-lines requires --since')
+    args.memory_thresholds = (args.memory_warning, args.memory_critical)
+    args.profiler = RuleProfiler() if args.profile else None
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.jobs < 0:
+        parser.error('--jobs must be >= 0')
+    return args
+
+
+class PollingWatcher:
+    """Detects changed files by comparing modification stamps"""
+
+    def __init__(self, directories, interval=1.0):
+        self.directories = list(directories)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        stamps = {}
+        for directory in self.directories:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.abspath(os.path.join(directory, name))
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def wait(self):
+        """Block until something changes; return the changed paths"""
+        while True:
+            time.sleep(self.interval)
+            current = self._scan()
+            changed = {path for path in current.keys() | self.snapshot.keys()
+                       if current.get(path) != self.snapshot.get(path)}
+            self.snapshot = current
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify through libc, so no extra packages are needed"""
+
+    # inotify event masks from <sys/inotify.h>
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    EVENT_HEADER = 16  # struct inotify_event without its name
+    SETTLE_SECONDS = 0.1
+
+    def __init__(self, directories):
+        if ctypes is None or not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux with ctypes")
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = (self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO |
+                self.IN_CREATE | self.IN_DELETE)
+        self.directories = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+            self.directories[wd] = directory
+
+    def _read(self):
+        changed = set()
         try:
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                lines = len(content.split('\n'))
-                chars = len(content)
-                
-            report.append(f"\n📊 FILE STATS:")
-            report.append(f"   Lines: {lines}")
-            report.append(f"   Characters: {chars:,}")
-            report.append(f"   Size: {os.path.getsize(filepath):,} bytes")
-            
-        except:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset + self.EVENT_HEADER <= len(data):
+            wd, _, _, length = struct.unpack_from('iIII', data, offset)
+            name = data[offset + self.EVENT_HEADER:offset + self.EVENT_HEADER + length]
+            offset += self.EVENT_HEADER + length
+            name = os.fsdecode(name.rstrip(b'\0'))
+            if wd in self.directories and name:
+                changed.add(os.path.normpath(os.path.join(self.directories[wd], name)))
+        return changed
+
+    def wait(self):
+        """Block until something changes; return the changed paths"""
+        while True:
+            select.select([self.fd], [], [])
+            changed = self._read()
+            # Editors save in bursts; let them settle into one update
+            while select.select([self.fd], [], [], self.SETTLE_SECONDS)[0]:
+                changed |= self._read()
+            if changed:
+                return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(directories, poll=False, interval=1.0):
+    """inotify when available, polling otherwise"""
+    if not poll:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
             pass
-            
-        return '\n'.join(report)
+    return PollingWatcher(directories, interval)
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 lsl_validator.py <file.lsl|directory>")
-        sys.exit(1)
-        
-    target = sys.argv[1]
-    validator = LSLValidator()
+
+class WatchSession:
+    """Resident validator that revalidates along the #include graph"""
+
+    def __init__(self, target, args, cache=None):
+        self.target = target
+        self.args = args
+        self.cache = cache
+        self.directory = target if os.path.isdir(target) else (os.path.dirname(target) or '.')
+        self.results = {}
+        self.dependencies = {}   # script -> headers it includes (transitively)
+
+    def scripts(self):
+        """Scripts currently being watched"""
+        if os.path.isdir(self.target):
+            return {os.path.abspath(path) for path in glob.glob(os.path.join(self.target, "*.lsl"))}
+        return {os.path.abspath(self.target)} if os.path.isfile(self.target) else set()
+
+    def affected(self, changed):
+        """Scripts to revalidate for a set of changed paths"""
+        scripts = self.scripts()
+        affected = {path for path in changed if path in scripts}
+        for script, headers in self.dependencies.items():
+            if headers & changed and script in scripts:
+                affected.add(script)
+        # Forget scripts that were deleted
+        for path in list(self.results):
+            if path not in scripts:
+                del self.results[path]
+                self.dependencies.pop(path, None)
+        return affected
+
+    def revalidate(self, paths):
+        for path in sorted(paths):
+            self.results[path] = validate_path(path, self.cache, self.args.include_path,
+                                               self.args.memory_thresholds)
+            self.dependencies[path] = include_closure(path, self.args.include_path)
+
+    def watched_directories(self):
+        directories = {os.path.abspath(self.directory)}
+        directories.update(os.path.abspath(d) for d in self.args.include_path if os.path.isdir(d))
+        for headers in self.dependencies.values():
+            directories.update(os.path.dirname(os.path.abspath(h)) for h in headers)
+        return sorted(directories)
+
+    def render(self, updated, clear):
+        """Redraw all results (terminal) or print just the updated ones (log)"""
+        if clear:
+            print("\033[2J\033[H", end='')
+            shown = sorted(self.results)
+        else:
+            shown = sorted(updated)
+        for path in shown:
+            print(self.results[path].report)
+        total_errors = sum(len(r.errors) for r in self.results.values())
+        total_warnings = sum(len(r.warnings) for r in self.results.values())
+        print("\n" + "=" * 80)
+        print(f"📋 SUMMARY: {len(self.results)} files, {total_errors} errors, {total_warnings} warnings "
+              f"({len(updated)} revalidated)")
+        print(f"👀 Watching {self.directory} - Ctrl+C to stop")
+        sys.stdout.flush()
+
+
+def run_watch(args, cache):
+    """Validate once, then keep revalidating changed files and their dependents"""
+    session = WatchSession(args.target, args, cache)
+    initial = session.scripts()
+    if not initial:
+        print(f"❌ No .lsl files found in {args.target}")
+        return 1
+    session.revalidate(initial)
+    clear = sys.stdout.isatty()
+    session.render(initial, clear)
+    
+    watcher = make_watcher(session.watched_directories(), args.poll, args.poll_interval)
+    try:
+        while True:
+            # Changed headers are re-parsed on demand: SHARED_HEADERS checks stamps
+            changed = {os.path.abspath(path) for path in watcher.wait()}
+            affected = session.affected(changed)
+            if affected:
+                session.revalidate(affected)
+                session.render(affected, clear)
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+        return 0
+    finally:
+        watcher.close()
+
+
+_HUNK_RE = re.compile(r'^@@ -\S+ \+(\d+)(?:,(\d+))? @@')
+
+
+class GitChanges:
+    """Files and lines changed between a git ref and the working tree"""
+
+    def __init__(self, root):
+        self.root = root
+        self.lines = {}     # absolute path -> changed line numbers, None for untracked files
+
+    def add_names(self, name_status):
+        """Record every changed, added, renamed or deleted file of `git diff --name-status -z`"""
+        fields = name_status.split('\0')
+        index = 0
+        while index < len(fields) and fields[index]:
+            status = fields[index]
+            # Renames and copies list the old path and then the new one
+            count = 2 if status[0] in 'RC' else 1
+            for path in fields[index + 1:index + 1 + count]:
+                self.lines.setdefault(os.path.abspath(os.path.join(self.root, path)), set())
+            index += 1 + count
+
+    def add_diff(self, diff):
+        """Record the changed lines of `git diff --unified=0` output for files already named"""
+        current = None
+        for line in diff.splitlines():
+            if line.startswith('+++ '):
+                # git appends a tab to paths containing spaces
+                path = line[4:].rstrip('\t')
+                current = None
+                if path != '/dev/null':
+                    current = os.path.abspath(os.path.join(self.root, path[2:]))
+                    self.lines.setdefault(current, set())
+            elif line.startswith('@@') and current is not None:
+                match = _HUNK_RE.match(line)
+                if match is None:
+                    continue
+                start = int(match.group(1))
+                count = int(match.group(2) or 1)
+                if count == 0:
+                    # Pure deletion: `start` is the line before the removed ones
+                    self.lines[current].update((start, start + 1))
+                else:
+                    self.lines[current].update(range(start, start + count))
+
+
+def git_changes(ref, directory='.'):
+    """GitChanges since `ref`, including untracked files; raises ValueError when git fails"""
+
+    def git(*argv):
+        try:
+            process = subprocess.run(['git', '-C', directory, '-c', 'core.quotePath=false', *argv],
+                                     capture_output=True, text=True)
+        except OSError as e:
+            raise ValueError(f"cannot run git: {e}")
+        if process.returncode != 0:
+            raise ValueError(process.stderr.strip() or f"git {argv[0]} failed")
+        return process.stdout
+
+    changes = GitChanges(git('rev-parse', '--show-toplevel').strip())
+    changes.add_names(git('diff', '--name-status', '-z', '--no-renames', ref, '--'))
+    changes.add_diff(git('diff', '--unified=0', '--no-color', '--no-ext-diff',
+                         '--src-prefix=a/', '--dst-prefix=b/', ref, '--'))
+    for path in git('ls-files', '--others', '--exclude-standard', '--full-name').splitlines():
+        changes.lines[os.path.abspath(os.path.join(changes.root, path))] = None
+    return changes
+
+
+def since_scope(lsl_files, changes, include_path=()):
+    """Scripts affected by `changes` -> lines to report (None reports every line)"""
+    scope = {}
+    changed = set(changes.lines)
+    for path in lsl_files:
+        full = os.path.abspath(path)
+        missing = set()
+        if (include_closure(full, include_path, missing) | missing) & changed:
+            # A changed or deleted header can break any line of the script
+            scope[path] = None
+        elif full in changed:
+            scope[path] = changes.lines[full]
+    return scope
+
+
+def restrict_result(result, lines):
+    """`result` keeping only diagnostics on `lines` (file-level ones always stay)"""
+    if lines is None:
+        return result
+
+    def keep(diagnostics):
+        return [d for d in diagnostics if d.line is None or d.line in lines]
+
+    return FileResult(result.filepath, keep(result.errors), keep(result.warnings), keep(result.info),
+                      stats=result.stats)
+
+
+def run_since(args, cache):
+    """Validate only the scripts changed since `args.since`; returns the exit code"""
+    target = args.target
+    if os.path.isdir(target):
+        directory = target
+        lsl_files = sorted(glob.glob(os.path.join(target, "*.lsl")))
+    elif os.path.isfile(target) and target.endswith('.lsl'):
+        directory = os.path.dirname(target) or '.'
+        lsl_files = [target]
+    else:
+        print(f"❌ ERROR: {target} is not an .lsl file or directory")
+        return 1
+    
+    try:
+        changes = git_changes(args.since, directory)
+    except ValueError as e:
+        print(f"❌ ERROR: --since {args.since}: {e}")
+        return 1
+    scope = since_scope(lsl_files, changes, args.include_path)
+    if not args.changed_lines:
+        scope = dict.fromkeys(scope)
+    selected = sorted(scope)
+    
+    if args.format != 'text':
+        return run_structured(args, cache, selected, scope)
+    
+    if not selected:
+        print(f"✅ No LSL files changed since {args.since}")
+        return 0
+    
+    print(f"🔍 Validating {len(selected)} of {len(lsl_files)} LSL files changed since {args.since}")
+    print("=" * 80)
+    
+    total_errors = 0
+    total_warnings = 0
+    for result in iter_validate_paths(selected, args.jobs, cache, args.include_path,
+                                      args.memory_thresholds, args.profiler):
+        result = restrict_result(result, scope[result.filepath])
+        print(result.report)
+        total_errors += len(result.errors)
+        total_warnings += len(result.warnings)
+    
+    print("\n" + "=" * 80)
+    print(f"📋 SUMMARY: {len(selected)} files validated")
+    print(f"   Total Errors: {total_errors}")
+    print(f"   Total Warnings: {total_warnings}")
+    return 1 if total_errors else 0
+
+
+def diagnostic_record(diagnostic):
+    """JSON-ready form of a Diagnostic; columns are 1-based like the lines"""
+    return {'rule': diagnostic.rule, 'severity': diagnostic.severity,
+            'line': diagnostic.line,
+            'column': diagnostic.col + 1 if diagnostic.col is not None else None,
+            'message': diagnostic.message.strip()}
+
+
+def json_record(result):
+    """One NDJSON line describing a FileResult"""
+    return json.dumps({'type': 'file', 'file': result.filepath, 'stats': result.stats,
+                       'errors': len(result.errors), 'warnings': len(result.warnings),
+                       'diagnostics': [diagnostic_record(d) for d in result.diagnostics()]},
+                      ensure_ascii=False)
+
+
+SARIF_LEVELS = {ERROR: 'error', WARNING: 'warning', INFO: 'note'}
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+
+class SarifWriter:
+    """Streams a SARIF 2.1.0 log: one run, results written as files finish"""
+
+    def __init__(self, stream, base_dir='.'):
+        self.stream = stream
+        self.base_dir = base_dir
+        self.rule_index = {rule: index for index, rule in enumerate(RULES)}
+        self.written = 0
+
+    def begin(self):
+        rules = [{'id': rule, 'shortDescription': {'text': description},
+                  'defaultConfiguration': {'level': SARIF_LEVELS[severity]}}
+                 for rule, (severity, description) in RULES.items()]
+        driver = {'name': 'lsl_validator', 'rules': rules}
+        self.stream.write(f'{{"$schema": "{SARIF_SCHEMA}", "version": "2.1.0", "runs": [{{'
+                          f'"tool": {{"driver": {json.dumps(driver)}}}, "results": [\n')
+
+    def add(self, result):
+        uri = os.path.relpath(result.filepath, self.base_dir).replace(os.sep, '/')
+        for diagnostic in result.diagnostics():
+            location = {'artifactLocation': {'uri': uri}}
+            if diagnostic.line is not None:
+                location['region'] = {'startLine': diagnostic.line}
+                if diagnostic.col is not None:
+                    location['region']['startColumn'] = diagnostic.col + 1
+            record = {'ruleId': diagnostic.rule, 'ruleIndex': self.rule_index[diagnostic.rule],
+                      'level': SARIF_LEVELS[diagnostic.severity],
+                      'message': {'text': diagnostic.message.strip()},
+                      'locations': [{'physicalLocation': location}]}
+            self.stream.write((',\n' if self.written else '') + json.dumps(record, ensure_ascii=False))
+            self.written += 1
+        self.stream.flush()
+
+    def end(self):
+        self.stream.write('\n]}]}\n')
+        self.stream.flush()
+
+
+def run_structured(args, cache, lsl_files, scope=None):
+    """Stream results as NDJSON or SARIF; returns the exit code"""
+    total_errors = 0
+    total_warnings = 0
+    results = iter_validate_paths(lsl_files, args.jobs, cache, args.include_path, args.memory_thresholds,
+                                  args.profiler)
+    if scope is not None:
+        results = (restrict_result(result, scope[result.filepath]) for result in results)
+
+    if args.format == 'json':
+        for result in results:
+            print(json_record(result), flush=True)
+            total_errors += len(result.errors)
+            total_warnings += len(result.warnings)
+        print(json.dumps({'type': 'summary', 'files': len(lsl_files),
+                          'errors': total_errors, 'warnings': total_warnings}))
+    else:
+        base_dir = args.target if os.path.isdir(args.target) else (os.path.dirname(args.target) or '.')
+        writer = SarifWriter(sys.stdout, base_dir)
+        writer.begin()
+        for result in results:
+            writer.add(result)
+            total_errors += len(result.errors)
+        writer.end()
+
+    return 1 if total_errors and os.path.isdir(args.target) else 0
+
+
+def run_link_graph(args):
+    """Whole-project link_message analysis; returns the exit code"""
+    if os.path.isdir(args.target):
+        lsl_files = sorted(glob.glob(os.path.join(args.target, "*.lsl")))
+    else:
+        lsl_files = [args.target]
+    if not lsl_files:
+        print(f"❌ No .lsl files found in {args.target}")
+        return 1
+    
+    graph = LinkGraph(args.include_path)
+    for lsl_file in lsl_files:
+        graph.add_file(lsl_file)
+    print(graph.report())
+    
+    if args.link_graph_dot:
+        with open(args.link_graph_dot, 'w', encoding='utf-8') as f:
+            f.write(graph.to_dot())
+        print(f"\n🗺️  Routing graph written to {args.link_graph_dot}")
+    return 0
+
+
+def run_literals(args):
+    """Whole-project duplicate literal analysis; returns the exit code"""
+    if os.path.isdir(args.target):
+        lsl_files = sorted(glob.glob(os.path.join(args.target, "*.lsl")))
+    else:
+        lsl_files = [args.target]
+    if not lsl_files:
+        print(f"❌ No .lsl files found in {args.target}")
+        return 1
+    
+    index = LiteralIndex(args.include_path)
+    for lsl_file in lsl_files:
+        index.add_file(lsl_file)
+    print(index.report())
+    return 0
+
+
+def run_validate(args, cache):
+    """Validate a file or directory and print the reports; returns the exit code"""
+    target = args.target
+    profiler = args.profiler
+    
+    if args.since is not None:
+        return run_since(args, cache)
     
     if os.path.isfile(target):
         # Single file validation
         if not target.endswith('.lsl'):
             print("❌ ERROR: File must have .lsl extension")
-            sys.exit(1)
+            return 1
+        
+        if args.format != 'text':
+            return run_structured(args, cache, [target])
             
-        result = validator.validate_file(target)
-        print(result)
+        result = validate_path(target, cache, args.include_path, args.memory_thresholds, profiler)
+        print(result.report)
         
     elif os.path.isdir(target):
         # Directory validation
@@ -486,7 +3393,10 @@ def main():
         
         if not lsl_files:
             print(f"❌ No .lsl files found in {target}")
-            sys.exit(1)
+            return 1
+        
+        if args.format != 'text':
+            return run_structured(args, cache, sorted(lsl_files))
             
         print(f"🔍 Validating {len(lsl_files)} LSL files in {target}")
         print("=" * 80)
@@ -494,12 +3404,12 @@ def main():
         total_errors = 0
         total_warnings = 0
         
-        for lsl_file in sorted(lsl_files):
-            result = validator.validate_file(lsl_file)
-            print(result)
+        for result in iter_validate_paths(sorted(lsl_files), args.jobs, cache, args.include_path,
+                                          args.memory_thresholds, profiler):
+            print(result.report)
             
-            total_errors += len(validator.errors)
-            total_warnings += len(validator.warnings)
+            total_errors += len(result.errors)
+            total_warnings += len(result.warnings)
             
         print("\n" + "=" * 80)
         print(f"📋 SUMMARY: {len(lsl_files)} files validated")
@@ -507,11 +3417,58 @@ def main():
         print(f"   Total Warnings: {total_warnings}")
         
         if total_errors > 0:
-            sys.exit(1)
+            return 1
             
     else:
         print(f"❌ ERROR: {target} is not a file or directory")
-        sys.exit(1)
+        return 1
+    return 0
+
+
+def run_profiled(args):
+    """Validate uncached and in-process with per-rule instrumentation; returns the exit code"""
+    profiler = args.profiler
+    profile = None
+    if args.profile_out:
+        profile = cProfile.Profile()
+    
+    profiler.install()
+    try:
+        if profile is not None:
+            profile.enable()
+        status = run_validate(args, None)
+    finally:
+        if profile is not None:
+            profile.disable()
+        profiler.uninstall()
+    
+    sys.stdout.flush()
+    # stderr keeps the reports on stdout unchanged (and parseable with --format)
+    print(profiler.report(), file=sys.stderr)
+    if profile is not None:
+        profile.dump_stats(args.profile_out)
+        print(f"\n💾 cProfile stats written to {args.profile_out} "
+              f"(python3 -m pstats {args.profile_out})", file=sys.stderr)
+    return status
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    cache = make_cache(args)
+    
+    if args.link_graph:
+        sys.exit(run_link_graph(args))
+    
+    if args.literals:
+        sys.exit(run_literals(args))
+    
+    if args.watch:
+        sys.exit(run_watch(args, cache))
+    
+    if args.profile:
+        sys.exit(run_profiled(args))
+    
+    sys.exit(run_validate(args, cache))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()